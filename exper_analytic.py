@@ -0,0 +1,232 @@
+import math
+import numpy as np
+from scipy.optimize import brentq
+from scipy.special import gammainc, gammaln, logsumexp
+from exper_client import client_enabled, client_results
+from exper_events import EventLog, EventBins, ARRIVAL, SERVICE_START, SERVICE_END, DROPPED_QUEUE_FULL, DROPPED_REJECT
+from exper_stats import QUANTILES, quantile_name
+
+# Аналитический движок: стационарные характеристики марковских моделей при
+# экспоненциальных интервалах и временах обработки (FIFO, c серверов):
+#   reject                  - M/M/c/c, вероятность отказа по формуле Эрланга B;
+#   queue, queue_size=None  - M/M/c, вероятность ожидания по формуле Эрланга C;
+#   queue, queue_size=q     - M/M/c/K, K = c + q (вместимость как в модели).
+# Средние - по формуле Литтла, дисперсия и квантили времени отклика - по
+# распределению числа запросов, которое застает допущенный запрос (PASTA):
+# застав n >= c, запрос ждет Эрланга(n - c + 1, c*mu), затем обслуживается Exp(mu).
+# Результат - стационарный режим; прогон модели начинается с пустой системы.
+
+SUPPORTED_STRATEGIES = ("queue", "reject")
+
+
+def supported(cfg):
+    return (cfg["strategy"] in SUPPORTED_STRATEGIES
+            and not cfg.get("tiers")
+            and not client_enabled(cfg)
+            and not cfg.get("classes")
+            and cfg["arrival_dist"] == "exponential"
+            and cfg["service_dist"] == "exponential")
+
+
+def check_supported(cfg):
+    if cfg["strategy"] not in SUPPORTED_STRATEGIES:
+        raise ValueError(f"engine='analytic' не поддерживает стратегию {cfg['strategy']!r}")
+    if cfg["arrival_dist"] != "exponential" or cfg["service_dist"] != "exponential":
+        raise ValueError("engine='analytic' требует экспоненциальных интервалов и времен обработки")
+    if client_enabled(cfg):
+        raise ValueError("engine='analytic' не поддерживает таймауты и повторы клиента")
+    if cfg.get("classes"):
+        raise ValueError("engine='analytic' не поддерживает классы запросов")
+
+
+# Вероятность отказа M/M/c/c (рекуррентная формула, устойчива при больших c)
+def erlang_b(c, a):
+    b = 1.0
+    for k in range(1, int(c) + 1):
+        b = a * b / (k + a * b)
+    return b
+
+
+# Вероятность ожидания M/M/c; при a >= c очередь неустойчива и ждут все
+def erlang_c(c, a):
+    if a >= c:
+        return 1.0
+    b = erlang_b(c, a)
+    return c * b / (c - a * (1.0 - b))
+
+
+# Стационарное распределение числа запросов в M/M/c/K (в логарифмах, без переполнения)
+def mmck_probs(c, K, a):
+    n = np.arange(K + 1)
+    if a <= 0:
+        p = np.zeros(K + 1)
+        p[0] = 1.0
+        return p
+    log_p = np.where(n <= c,
+                     n * math.log(a) - gammaln(n + 1),
+                     c * math.log(a) - gammaln(c + 1) + (n - c) * math.log(a / c))
+    return np.exp(log_p - logsumexp(log_p))
+
+
+# Функция распределения суммы Эрланга(k, rate) и Exp(mu) при rate = c*mu >= mu
+# для массивов k и t: P(E_k <= t) - e^{-mu t} (rate/(rate-mu))^k P(Erlang(k, rate-mu) <= t).
+# Вычитаемое не больше уменьшаемого, степень считается в логарифмах.
+def _erlang_exp_cdf(k, rate, mu, t):
+    k = np.asarray(k, dtype=float)[:, None]
+    t = np.asarray(t, dtype=float)[None, :]
+    if rate - mu <= 1e-12 * rate:
+        return gammainc(k + 1, mu * t)
+    with np.errstate(divide="ignore"):
+        log_tail = -mu * t + k * math.log(rate / (rate - mu)) + np.log(gammainc(k, (rate - mu) * t))
+    return gammainc(k, rate * t) - np.exp(log_tail)
+
+
+# Стационарные характеристики и функция распределения времени отклика.
+# Возвращает словарь метрик; "cdf" - функция от массива t.
+def solve(cfg):
+    check_supported(cfg)
+    lam = max(0.0, float(cfg["arrival_rate"]))
+    mu = 1.0 / max(1e-9, float(cfg["service_mean"]))
+    c = max(1, int(cfg["num_servers"]))
+    a = lam / mu
+
+    if cfg["strategy"] == "reject" or cfg["queue_size"] is not None:
+        K = c if cfg["strategy"] == "reject" else c + int(cfg["queue_size"])
+        p = mmck_probs(c, K, a)
+        n = np.arange(K + 1)
+        p_block = float(p[K])
+        throughput = lam * (1.0 - p_block)
+        busy = float(np.sum(np.minimum(n, c) * p))
+        Lq = float(np.sum(np.maximum(n - c, 0) * p))
+        L = float(np.sum(n * p))
+        # Число запросов, которое застает допущенный запрос; ожидание - Эрланг(k, c*mu)
+        seen = p[:K] / (1.0 - p_block) if p_block < 1.0 else np.zeros(K)
+        k = np.arange(1, K - c + 1)
+        w_k = seen[c:]
+        p_free = float(seen[:c].sum())
+        cmu = c * mu
+        mean = float(np.sum(w_k * k) / cmu) + 1.0 / mu
+        second = float(np.sum(w_k * k * (k + 1)) / cmu ** 2) + 2.0 * float(np.sum(w_k * k)) / (cmu * mu) + 2.0 / mu ** 2
+
+        def cdf(t):
+            t = np.atleast_1d(np.asarray(t, dtype=float))
+            out = p_free * (1.0 - np.exp(-mu * t))
+            if len(k):
+                out = out + w_k @ _erlang_exp_cdf(k, cmu, mu, t)
+            return np.clip(out, 0.0, 1.0)
+
+    else:
+        p_block = 0.0
+        throughput = lam
+        C = erlang_c(c, a)
+        busy = min(a, float(c))
+        if a >= c:
+            L = Lq = mean = second = math.inf
+            cdf = lambda t: np.zeros(np.shape(np.atleast_1d(t)))
+        else:
+            delta = c * mu - lam
+            Lq = C * a / (c - a)
+            mean = C / delta + 1.0 / mu
+            L = lam * mean
+            second = 2.0 * C / delta ** 2 + 2.0 * C / (delta * mu) + 2.0 / mu ** 2
+
+            # Ожидание: 0 с вероятностью 1 - C, иначе Exp(delta)
+            def cdf(t):
+                t = np.atleast_1d(np.asarray(t, dtype=float))
+                if abs(delta - mu) <= 1e-12 * mu:
+                    hypo = (1.0 + mu * t) * np.exp(-mu * t)
+                else:
+                    hypo = (mu * np.exp(-delta * t) - delta * np.exp(-mu * t)) / (mu - delta)
+                return 1.0 - ((1.0 - C) * np.exp(-mu * t) + C * hypo)
+
+    var = second - mean * mean if math.isfinite(mean) else math.inf
+    return {
+        "arrival_rate": lam,
+        "p_block": p_block,
+        "throughput": throughput,
+        "mean_system": L,
+        "mean_queue": Lq,
+        "mean_busy": busy,
+        "utilization": busy / c,
+        "mean_response": mean,
+        "response_std": math.sqrt(max(0.0, var)) if math.isfinite(var) else math.inf,
+        "cdf": cdf,
+    }
+
+
+# Квантиль времени отклика: корень cdf(t) = q
+def response_quantile(sol, q):
+    if not math.isfinite(sol["mean_response"]):
+        return math.inf
+    cdf = sol["cdf"]
+    hi = max(1e-9, sol["mean_response"])
+    while cdf(hi)[0] < q:
+        hi *= 2.0
+    return brentq(lambda t: cdf(t)[0] - q, 0.0, hi, xtol=1e-12 * hi)
+
+
+# Результаты в формате model_env: ожидаемые значения за sim_time в стационарном режиме.
+# Журнала событий и временных рядов нет, гистограмма - ожидаемое число запросов в интервалах.
+def model_analytic(cfg, instr=None):
+    sol = solve(cfg)
+    T = float(cfg["sim_time"])
+    quantiles = {quantile_name(q): response_quantile(sol, q) for q in QUANTILES}
+    processed = sol["throughput"] * T
+
+    bins = int(cfg.get("hist_bins", 64))
+    top = response_quantile(sol, 0.999)
+    edges = np.linspace(0.0, top, bins + 1) if math.isfinite(top) and top > 0 else np.zeros(0)
+    counts = np.diff(sol["cdf"](edges)) * processed if len(edges) else np.zeros(0)
+
+    aggregates = None
+    if cfg.get("plot_bins"):
+        drop_code = DROPPED_REJECT if cfg["strategy"] == "reject" else DROPPED_QUEUE_FULL
+        event_bins = EventBins.from_rates(T, cfg["plot_bins"], {
+            ARRIVAL: sol["arrival_rate"],
+            drop_code: sol["arrival_rate"] * sol["p_block"],
+            SERVICE_START: sol["throughput"],
+            SERVICE_END: sol["throughput"],
+        })
+        aggregates = {
+            **event_bins.to_dict(),
+            "queue": {"mean": [sol["mean_queue"]] * event_bins.bins, "max": []},
+            "busy": {"mean": [sol["mean_busy"]] * event_bins.bins, "max": []},
+            "servers": {"mean": [float(cfg["num_servers"])] * event_bins.bins, "max": []},
+        }
+
+    results = {
+        "total_arrivals": sol["arrival_rate"] * T,
+        "processed": processed,
+        "dropped": sol["arrival_rate"] * sol["p_block"] * T,
+        "avg_response_time": sol["mean_response"],
+        "response_std": sol["response_std"],
+        "response_quantiles": quantiles,
+        "response_hist": {"edges": edges.tolist(), "counts": counts.tolist()},
+        "utilization": sol["utilization"],
+        "mean_queue_len": sol["mean_queue"],
+        "max_queue_len": None,
+        "mean_busy_servers": sol["mean_busy"],
+        "max_busy_servers": None,
+        "queue_time_series": [],
+        "server_busy_time_series": [],
+        "queue_history": (np.empty(0), np.empty(0, dtype=np.int64)),
+        "busy_history": (np.empty(0), np.empty(0, dtype=np.int64)),
+        "servers_time_series": [],
+        "servers_history": (np.empty(0), np.empty(0, dtype=np.int64)),
+        "mean_servers": float(cfg["num_servers"]),
+        "server_seconds": float(cfg["num_servers"]) * T,
+        "scaling_events": [],
+        **client_results(sol["arrival_rate"] * T, processed, processed, sol["arrival_rate"] * sol["p_block"] * T,
+                         0, 0, T),
+        "response_times": [],
+        "events": EventLog(enabled=False),
+        "aggregates": aggregates,
+        "controls": {
+            "service_mean": float(cfg["service_mean"]),
+            "arrivals": sol["arrival_rate"] * T,
+        },
+        "config": cfg,
+    }
+    if instr is not None:
+        instr.lap("run")
+    return results
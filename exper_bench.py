@@ -0,0 +1,200 @@
+import argparse
+import json
+import multiprocessing as mp
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+import simpy
+import exper_cloud as mdl
+import exper_numpy
+import exper_analytic
+
+# Матрица сценариев: стратегия x нагрузка x длительность.
+# Нагрузка задается долей от пропускной способности num_servers / service_mean.
+BASE = {
+    "num_servers": 2,
+    "service_mean": 0.08,
+    "queue_size": 50,
+    "seed": 1234,
+}
+STRATEGIES = ("queue", "reject", "rate_limit")
+LOADS = {"light": 0.5, "saturation": 0.95, "overload": 3.0}
+LENGTHS = {"short": 60.0, "long": 600.0}
+
+
+def scenarios(engines=mdl.ENGINES, lengths=tuple(LENGTHS)):
+    capacity = BASE["num_servers"] / BASE["service_mean"]
+    for strategy in STRATEGIES:
+        for load, rho in LOADS.items():
+            for length in lengths:
+                cfg = {
+                    **BASE,
+                    "strategy": strategy,
+                    "arrival_rate": rho * capacity,
+                    "rate_limit_rps": capacity,
+                    "sim_time": LENGTHS[length],
+                }
+                for engine in engines:
+                    if engine == "numpy" and strategy not in exper_numpy.SUPPORTED_STRATEGIES:
+                        continue
+                    if engine == "analytic" and not exper_analytic.supported({**mdl.DEFAULTS, **cfg}):
+                        continue
+                    yield f"{strategy}-{load}-{length}", engine, cfg
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдает КБ, macOS - байты
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+# Замер одного сценария; выполняется в отдельном процессе,
+# чтобы пиковый RSS относился только к нему
+def measure(name, engine, cfg, repeat=3, memory=True):
+    rss_before = _peak_rss_mb()
+    walls = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        res = mdl.model_env(cfg, engine=engine)
+        walls.append(time.perf_counter() - t0)
+    wall = min(walls)
+    rss_after = _peak_rss_mb()
+
+    arrivals = max(1, res["total_arrivals"])
+    # События модели: поступление, отказ, начало и окончание обслуживания.
+    # Аналитический движок ничего не моделирует, его счетчики - ожидаемые
+    # значения, поэтому события и запросы в секунду для него не считаются
+    simulated = engine != "analytic" and wall > 0
+    events = res["total_arrivals"] + res["dropped"] + 2 * res["processed"]
+    out = {
+        "scenario": name,
+        "engine": engine,
+        "wall_time": wall,
+        "wall_per_sim_sec": wall / cfg["sim_time"],
+        "events_per_sec": events / wall if simulated else None,
+        "requests_per_sec": res["total_arrivals"] / wall if simulated else None,
+        "total_arrivals": res["total_arrivals"],
+        "dropped": res["dropped"],
+        "peak_rss_mb": rss_after,
+        "rss_growth_mb": (rss_after - rss_before) if rss_after is not None else None,
+    }
+
+    # Пик памяти Python (tracemalloc) за прогон - наибольший объем, занятый
+    # одновременно. Выделения - число блоков, выделенных за прогон и еще живых
+    # к его концу (результаты, журнал событий, сводки): сумма count по статистике
+    # снимка tracemalloc без блоков, существовавших до прогона
+    if memory:
+        tracemalloc.start()
+        own = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        before = tracemalloc.take_snapshot().filter_traces(own)
+        res = mdl.model_env(cfg, engine=engine)
+        current, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot().filter_traces(own)
+        tracemalloc.stop()
+        blocks = sum(max(0, s.count_diff) for s in after.compare_to(before, "traceback"))
+        del res
+        out["peak_bytes_per_request"] = peak / arrivals
+        out["allocations_per_request"] = blocks / arrivals
+    return out
+
+
+def _measure_job(args):
+    return measure(*args)
+
+
+def run(engines=mdl.ENGINES, lengths=tuple(LENGTHS), only=None, repeat=3, memory=True, progress=None):
+    jobs = [(name, engine, cfg, repeat, memory)
+            for name, engine, cfg in scenarios(engines, lengths)
+            if only is None or only in name]
+    results = []
+    # Каждый сценарий - в новом процессе (maxtasksperchild=1)
+    ctx = mp.get_context("spawn")
+    with ctx.Pool(processes=1, maxtasksperchild=1) as pool:
+        for out in pool.imap(_measure_job, jobs):
+            results.append(out)
+            if progress:
+                progress(out)
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "simpy": simpy.__version__,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+# Сравнение с сохраненным прогоном: отношение времени к базовому
+def compare(report, baseline, tolerance=0.2):
+    base = {(r["scenario"], r["engine"]): r for r in baseline["results"]}
+    rows = []
+    for r in report["results"]:
+        b = base.get((r["scenario"], r["engine"]))
+        if b is None:
+            continue
+        ratio = r["wall_time"] / b["wall_time"] if b["wall_time"] > 0 else float("inf")
+        rows.append({
+            "scenario": r["scenario"],
+            "engine": r["engine"],
+            "baseline_wall_time": b["wall_time"],
+            "wall_time": r["wall_time"],
+            "ratio": ratio,
+            "regression": ratio > 1.0 + tolerance,
+        })
+    return rows
+
+
+def _print_row(r):
+    print(f"{r['scenario']:<28} {r['engine']:<6} wall={r['wall_time']:.3f}s "
+          + (f"events/s={r['events_per_sec']:.0f} " if r["events_per_sec"] is not None else "events/s=N/A ")
+          + f"wall/sim_s={r['wall_per_sim_sec'] * 1000:.2f}ms rss={r['peak_rss_mb'] or 0:.0f}MB"
+          + (f" peak/req={r['peak_bytes_per_request']:.0f}B allocs/req={r['allocations_per_request']:.2f}"
+             if "peak_bytes_per_request" in r else ""),
+          flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк производительности model_env")
+    parser.add_argument("--engines", default=",".join(mdl.ENGINES), help="движки через запятую")
+    parser.add_argument("--quick", action="store_true", help="только короткие сценарии")
+    parser.add_argument("--only", help="подстрока имени сценария")
+    parser.add_argument("--repeat", type=int, default=3, help="повторов на сценарий (берется минимум)")
+    parser.add_argument("--no-memory", "--no-alloc", dest="no_memory", action="store_true",
+                        help="не замерять пик памяти tracemalloc")
+    parser.add_argument("--output", help="файл для результатов в JSON")
+    parser.add_argument("--baseline", help="JSON предыдущего прогона для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустимое замедление (доля)")
+    args = parser.parse_args(argv)
+
+    lengths = ("short",) if args.quick else tuple(LENGTHS)
+    report = run(args.engines.split(","), lengths, args.only, args.repeat, not args.no_memory, progress=_print_row)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(report, baseline, args.tolerance)
+        print()
+        for r in rows:
+            mark = "  РЕГРЕССИЯ" if r["regression"] else ""
+            print(f"{r['scenario']:<28} {r['engine']:<6} {r['baseline_wall_time']:.3f}s -> {r['wall_time']:.3f}s "
+                  f"(x{r['ratio']:.2f}){mark}")
+        if any(r["regression"] for r in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
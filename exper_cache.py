@@ -0,0 +1,176 @@
+import glob
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import closing, contextmanager
+import numpy as np
+import exper_cloud as mdl
+import exper_trace
+import exper_load
+
+CACHE_DIR = os.environ.get("EXPER_CACHE_DIR", ".exper_cache")
+MEMORY_ITEMS = 256
+MAX_BYTES = 512 * 1024 * 1024
+
+_version = None
+
+
+# Версия кода модели - хэш исходного кода всех модулей exper_* рядом с exper_cloud.
+# При изменении любого из них ключи меняются, а старые записи удаляются. Список
+# не ведется вручную: лишний сброс кэша дешевле устаревшего результата.
+def model_modules():
+    paths = glob.glob(os.path.join(os.path.dirname(os.path.abspath(mdl.__file__)), "exper_*.py"))
+    return sorted(os.path.basename(p)[:-3] for p in paths)
+
+
+def model_version():
+    global _version
+    if _version is None:
+        h = hashlib.sha256()
+        folder = os.path.dirname(os.path.abspath(mdl.__file__))
+        for name in model_modules():
+            with open(os.path.join(folder, name + ".py"), "rb") as f:
+                h.update(name.encode())
+                h.update(f.read())
+        _version = h.hexdigest()[:16]
+    return _version
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Значение {value!r} не сериализуется в ключ кэша")
+
+
+# Канонический ключ: объединенная конфигурация (DEFAULTS + переопределения),
+# движок, набор возвращаемых ключей и версия кода модели.
+# None - прогон не кэшируется (seed не задан, конфигурация не сериализуется
+# или запрошена диагностика, которая описывает конкретный запуск).
+def config_key(config, engine="simpy", keys=None):
+    cfg = mdl.DEFAULTS.copy()
+    if config:
+        cfg.update(config)
+    if cfg.get("seed") is None or cfg.get("instrument") or cfg.get("profile"):
+        return None
+    try:
+        payload = json.dumps({
+            "config": cfg,
+            "engine": engine,
+            "keys": list(keys) if keys is not None else None,
+            "version": model_version(),
+            # Журнал трассы мог измениться при том же пути
+            "trace": exper_trace.trace_signature(cfg) if cfg.get("arrival_dist") == "trace" else None,
+            "load": exper_load.load_signature(cfg) if cfg.get("arrival_dist") == "profile" else None,
+        }, sort_keys=True, default=_json_default, allow_nan=True)
+    except (TypeError, OSError):
+        return None
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# Двухуровневый кэш: LRU в памяти и SQLite на диске с вытеснением
+# давно не использованных записей при превышении max_bytes. В памяти хранится
+# сериализованный результат, поэтому каждый get возвращает независимую копию:
+# изменение результата вызывающим кодом не портит кэш.
+class ResultCache:
+    def __init__(self, path=None, memory_items=MEMORY_ITEMS, max_bytes=MAX_BYTES):
+        if path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            path = os.path.join(CACHE_DIR, "results.sqlite")
+        self.path = path
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        with self._connect() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS results ("
+                       "key TEXT PRIMARY KEY, version TEXT, size INTEGER, accessed REAL, value BLOB)")
+            db.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results(accessed)")
+            db.execute("DELETE FROM results WHERE version != ?", (model_version(),))
+
+    # Транзакция на отдельном соединении: контекст sqlite3 только фиксирует
+    # изменения, поэтому соединение закрывается явно
+    @contextmanager
+    def _connect(self):
+        with closing(sqlite3.connect(self.path, timeout=30)) as db:
+            with db:
+                yield db
+
+    def _remember(self, key, data):
+        with self._lock:
+            self._memory[key] = data
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        if key is None:
+            return None
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+        if data is not None:
+            return pickle.loads(data)
+        with self._connect() as db:
+            row = db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key))
+        data = zlib.decompress(row[0])
+        self._remember(key, data)
+        return pickle.loads(data)
+
+    def put(self, key, value):
+        if key is None:
+            return
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self._remember(key, data)
+        blob = zlib.compress(data)
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                       (key, model_version(), len(blob), time.time(), blob))
+            self._evict(db)
+
+    def _evict(self, db):
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in db.execute("SELECT key, size FROM results ORDER BY accessed").fetchall():
+            db.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        with self._connect() as db:
+            db.execute("DELETE FROM results")
+
+
+_default = None
+
+
+def default_cache():
+    global _default
+    if _default is None:
+        _default = ResultCache()
+    return _default
+
+
+def cached_model_env(config=None, engine="simpy", keys=None, cache=None):
+    cache = default_cache() if cache is None else cache
+    key = config_key(config, engine, keys)
+    res = cache.get(key)
+    if res is None:
+        res = mdl.model_env(config, engine=engine)
+        if keys is not None:
+            res = {k: res[k] for k in keys}
+        cache.put(key, res)
+    return res
@@ -0,0 +1,135 @@
+import numpy as np
+from exper_random import STREAMS, interarrival_sampler, service_sampler
+from exper_stats import ResponseStats, TimeWeighted
+
+# Классы запросов (cfg["classes"]): интерактивные, пакетные, фоновые и т.п.
+# Каждый класс - словарь:
+#   name        - имя класса (обязательно);
+#   arrival_dist, arrival_rate, ... - собственный поток поступления (ключи как
+#                 в основной конфигурации, кроме трассы "trace");
+#   service_dist, service_mean, service_std - время обработки;
+#   priority    - приоритет при class_scheduling "priority" и "preemptive" (меньше - важнее);
+#   weight      - вес при "wfq";
+#   queue_quota - наибольшее число ожидающих в очереди запросов класса (None - без квоты),
+#                 сверх квоты - DROPPED_QUEUE_FULL;
+#   slo         - {метрика: порог} для проверки по показателям класса (см. exper_search.SLO_METRICS).
+# Не заданные параметры берутся из общей конфигурации. Первый класс использует
+# потоки случайных чисел основной модели, поэтому один класс дает те же результаты.
+# Порядок обслуживания class_scheduling:
+#   fifo       - общая очередь в порядке поступления;
+#   priority   - строгий приоритет без прерывания обслуживания;
+#   preemptive - строгий приоритет с прерыванием: прерванный запрос возвращается
+#                в очередь и дообслуживается оставшееся время;
+#   wfq        - взвешенное справедливое обслуживание (SCFQ): запрос получает метку
+#                max(V, метка предыдущего запроса класса) + service_mean / weight,
+#                V - метка последнего начавшего обслуживание запроса; первой
+#                обслуживается наименьшая метка. Размер запроса заранее неизвестен,
+#                поэтому в метке - среднее время обработки класса.
+CLASS_SCHEDULING = ("fifo", "priority", "preemptive", "wfq")
+CLASS_KEYS = ("arrival_dist", "arrival_rate", "arrival_interval", "arrival_low", "arrival_high", "burst_size",
+              "interburst_interval", "service_dist", "service_mean", "service_std", "sampling", "antithetic")
+
+
+def class_config(cfg, cls):
+    return {
+        **{k: cfg[k] for k in CLASS_KEYS},
+        "priority": 0,
+        "weight": 1.0,
+        "queue_quota": None,
+        "slo": {},
+        **cls,
+    }
+
+
+def check_classes(cfg):
+    classes = cfg.get("classes")
+    if not classes:
+        raise ValueError("Список классов запросов не должен быть пустым")
+    if cfg["class_scheduling"] not in CLASS_SCHEDULING:
+        raise ValueError(f"Неизвестный порядок обслуживания классов: {cfg['class_scheduling']!r}, "
+                         f"допустимы {CLASS_SCHEDULING}")
+    if cfg["class_scheduling"] != "fifo" and cfg["strategy"] == "autoscale":
+        raise ValueError("Автомасштабирование поддерживает только порядок обслуживания классов fifo")
+    names = [c.get("name") for c in classes]
+    if None in names or len(set(names)) != len(names):
+        raise ValueError("У каждого класса запросов должно быть уникальное имя name")
+    for cls in classes:
+        c = class_config(cfg, cls)
+        if c["arrival_dist"] == "trace":
+            raise ValueError(f"Класс {c['name']!r}: поток из трассы для классов не поддерживается")
+        if c["weight"] <= 0:
+            raise ValueError(f"Класс {c['name']!r}: вес weight должен быть положительным")
+        if c["queue_quota"] is not None and c["queue_quota"] < 0:
+            raise ValueError(f"Класс {c['name']!r}: квота queue_quota не может быть отрицательной")
+
+
+# Состояние класса и его статистика
+class RequestClass:
+    __slots__ = ("name", "index", "priority", "weight", "quota", "cost", "tag", "queued", "next_interarrival",
+                 "next_service", "config", "response", "queue_level", "busy_level", "arrivals", "dropped",
+                 "processed", "succeeded", "failed", "timeouts", "retries", "preemptions", "service_sum",
+                 "service_count")
+
+    def __init__(self, cfg, c, index, arrival_rng, service_rng, history, wrap=None):
+        self.name = c["name"]
+        self.index = index
+        self.priority = c["priority"]
+        self.weight = float(c["weight"])
+        self.quota = None if c["queue_quota"] is None else int(c["queue_quota"])
+        self.cost = float(c["service_mean"]) / self.weight
+        self.tag = 0.0
+        self.queued = 0
+        ccfg = {**cfg, **c}
+        self.config = ccfg
+        self.next_interarrival = interarrival_sampler(ccfg, arrival_rng, wrap=wrap)
+        self.next_service = service_sampler(ccfg, service_rng, wrap=wrap)
+        self.response = ResponseStats(ccfg)
+        self.queue_level = TimeWeighted(history=history)
+        self.busy_level = TimeWeighted(history=False)
+        self.arrivals = self.dropped = self.processed = self.succeeded = self.failed = 0
+        self.timeouts = self.retries = self.preemptions = self.service_count = 0
+        self.service_sum = 0.0
+
+
+# Классы прогона: первый - на потоках "arrival" и "service" прогона,
+# остальные - на собственных потоках того же seed
+def make_classes(cfg, streams, history, wrap=None):
+    configs = [class_config(cfg, c) for c in cfg["classes"]]
+    children = np.random.SeedSequence(cfg.get("seed", 1234)).spawn(len(STREAMS) + 2 * len(configs))
+    out = []
+    for i, c in enumerate(configs):
+        if i == 0:
+            arrival_rng, service_rng = streams["arrival"], streams["service"]
+        else:
+            arrival_rng = np.random.default_rng(children[len(STREAMS) + 2 * i])
+            service_rng = np.random.default_rng(children[len(STREAMS) + 2 * i + 1])
+        out.append(RequestClass(cfg, c, i, arrival_rng, service_rng, history, wrap))
+    return out
+
+
+# Показатели класса; загруженность - доля серверов, занятых запросами класса
+def class_results(c, sim_time, num_servers):
+    response = c.response.summary()
+    requests = c.arrivals - c.retries
+    return {
+        "total_arrivals": c.arrivals,
+        "processed": c.processed,
+        "dropped": c.dropped,
+        "avg_response_time": response["mean"],
+        "response_std": response["std"],
+        "response_quantiles": response["quantiles"],
+        "response_hist": response["hist"],
+        "utilization": c.busy_level.mean(sim_time) / max(1, num_servers),
+        "mean_queue_len": c.queue_level.mean(sim_time),
+        "max_queue_len": c.queue_level.max,
+        "mean_busy_servers": c.busy_level.mean(sim_time),
+        "requests": requests,
+        "succeeded": c.succeeded,
+        "failed": c.failed,
+        "timeouts": c.timeouts,
+        "retries": c.retries,
+        "preemptions": c.preemptions,
+        "goodput": c.succeeded / sim_time,
+        "throughput": c.processed / sim_time,
+        "retry_amplification": c.arrivals / requests if requests else 1.0,
+    }
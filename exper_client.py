@@ -0,0 +1,101 @@
+import math
+from exper_random import BlockSampler
+
+# Поведение клиента: таймауты и повторы.
+# timeout_queue - клиент ждет начала обслуживания не дольше (сек), затем уходит
+# из очереди и освобождает место; timeout_total - клиент ждет ответа не дольше
+# (сек) от начала попытки. Если таймаут наступил во время обслуживания, сервер
+# дорабатывает запрос впустую: он входит в пропускную способность (throughput),
+# но не в полезную (goodput). Отказ при допуске или таймаут ведут к повтору,
+# пока не исчерпаны retries повторов. Задержка перед n-м повтором -
+# min(retry_backoff_max, retry_backoff * retry_multiplier ** (n - 1)) с разбросом:
+#   none  - без разброса;
+#   full  - равномерно на [0, d];
+#   equal - равномерно на [d / 2, d].
+# retry_budget - бюджет повторов: каждый исходный запрос добавляет retry_budget
+# токенов (не больше retry_budget_burst), повтор расходует один токен. Без
+# токена запрос считается неуспешным. None - без бюджета.
+RETRY_JITTER = ("none", "full", "equal")
+
+
+def client_enabled(cfg):
+    return (cfg.get("timeout_queue") is not None or cfg.get("timeout_total") is not None
+            or int(cfg.get("retries") or 0) > 0)
+
+
+def check_client(cfg):
+    for key in ("timeout_queue", "timeout_total"):
+        if cfg[key] is not None and cfg[key] <= 0:
+            raise ValueError(f"{key} должен быть положительным или None")
+    if int(cfg["retries"]) < 0:
+        raise ValueError("Число повторов retries не может быть отрицательным")
+    if cfg["retry_jitter"] not in RETRY_JITTER:
+        raise ValueError(f"Неизвестный разброс задержки повтора: {cfg['retry_jitter']!r}, допустимы {RETRY_JITTER}")
+    if cfg["retry_backoff"] < 0 or cfg["retry_backoff_max"] < 0 or cfg["retry_multiplier"] < 1:
+        raise ValueError("Нужно retry_backoff >= 0, retry_backoff_max >= 0 и retry_multiplier >= 1")
+    if cfg["retry_budget"] is not None and (cfg["retry_budget"] < 0 or cfg["retry_budget_burst"] < 1):
+        raise ValueError("Нужно retry_budget >= 0 и retry_budget_burst >= 1")
+
+
+# Задержка перед n-м повтором (n с 1)
+def backoff_sampler(cfg, rng):
+    base = float(cfg["retry_backoff"])
+    mult = float(cfg["retry_multiplier"])
+    cap = float(cfg["retry_backoff_max"])
+    jitter = cfg["retry_jitter"]
+    uniform = BlockSampler(rng.random)
+
+    def delay(n):
+        d = min(cap, base * mult ** min(n - 1, 64))
+        if jitter == "full":
+            return d * uniform()
+        if jitter == "equal":
+            return d * (0.5 + 0.5 * uniform())
+        return d
+    return delay
+
+
+# Бюджет повторов. Токены исходных запросов начисляются при проверке по их
+# общему числу, поэтому поступление запроса ничего не стоит.
+class RetryBudget:
+    __slots__ = ("ratio", "burst", "tokens", "seen")
+
+    def __init__(self, ratio, burst):
+        self.ratio = float(ratio)
+        self.burst = float(burst)
+        self.tokens = self.burst
+        self.seen = 0
+
+    @classmethod
+    def from_config(cls, cfg):
+        if cfg.get("retry_budget") is None:
+            return None
+        return cls(cfg["retry_budget"], cfg["retry_budget_burst"])
+
+    # originals - число исходных запросов к этому моменту; True - повтор разрешен
+    def withdraw(self, originals):
+        if originals > self.seen:
+            self.tokens = min(self.burst, self.tokens + (originals - self.seen) * self.ratio)
+            self.seen = originals
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+# Показатели клиента: исходные запросы, успешные (ответ получен до таймаута),
+# неуспешные (исчерпаны повторы или бюджет), таймауты и повторы попыток.
+# goodput - успешных в секунду, throughput - обработанных сервером в секунду,
+# retry_amplification - попыток на один исходный запрос.
+def client_results(arrivals, processed, succeeded, failed, timeouts, retries, sim_time):
+    requests = arrivals - retries
+    return {
+        "requests": requests,
+        "succeeded": succeeded,
+        "failed": failed,
+        "timeouts": timeouts,
+        "retries": retries,
+        "goodput": succeeded / sim_time if sim_time > 0 else math.nan,
+        "throughput": processed / sim_time if sim_time > 0 else math.nan,
+        "retry_amplification": arrivals / requests if requests else 1.0,
+    }
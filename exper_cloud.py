@@ -1,206 +1,785 @@
-import random as rd
 import simpy
 from collections import defaultdict
+import itertools
 import math
+import exper_numpy
+import exper_analytic
+import exper_trace
+import exper_network
+from exper_limiter import make_limiter
+from exper_classes import check_classes, make_classes, class_results
+from exper_instrument import Instrumentation
+from exper_client import client_enabled, check_client, backoff_sampler, RetryBudget, client_results
+from exper_events import (EventLog, EventBins, ARRIVAL, SERVICE_START, SERVICE_END, DROPPED_QUEUE_FULL, DROPPED_RATE,
+                          DROPPED_RATE_TIMEOUT, DROPPED_REJECT, TIMEOUT, RETRY)
+from exper_stats import ResponseStats, TimeWeighted, time_series
+from exper_random import make_streams, interarrival_sampler, service_sampler
 
 # Параметры 
 DEFAULTS = {
     "sim_time": 60.0,           # Время симуляции
-    "arrival_dist": "exponential",  # Распределение входящей нагрузки (экспоненциальное | постоянный поток | равномерное распределение | пуассоновское)
+    "arrival_dist": "exponential",  # Распределение входящей нагрузки (экспоненциальное | постоянный поток | равномерное распределение | пуассоновское | трасса "trace" | профиль "profile")
     "arrival_rate": 10.0,      # Средняя нагрузка (запросы/сек) при экспоненциальном распределении
     "arrival_interval": 0.1,   # Интервал при постоянном потоке
     "arrival_low": 0.05,       # Нижняя граница интервала между запросами  при равномерном распределении
     "arrival_high": 0.2,       # Верхняя граница интервала между запросами  при равномерном распределении
     "burst_size": 20,          # Количество запросов во вспышке при пуассоновском распределении
     "interburst_interval": 5.0,# Количество секунд между вспышками при пуассоновском распределении
+    "trace_path": None,        # Журнал запросов для "trace" (CSV, Parquet или .npy), см. exper_trace
+    "trace_format": None,      # Формат журнала; None - по расширению файла
+    "trace_time_column": "timestamp", # Столбец моментов поступления (секунды или даты)
+    "trace_service_column": None, # Столбец измеренных времен обработки; None - по service_dist
+    "trace_start": None,       # Начало отсчета в журнале; None - первый запрос
+    "trace_offset": 0.0,       # Сдвиг окна воспроизведения от начала отсчета (сек журнала)
+    "trace_rate_scale": 1.0,   # Множитель интенсивности: время журнала сжимается в это число раз
+    "trace_chunk_rows": 262144,# Строк журнала в одной порции чтения
+    "load_profile": "piecewise", # Профиль нагрузки для "profile": ломаная | "spline" | "ramp" | "step" | "sinusoidal" | "flash_crowd" (см. exper_load)
+    "load_points": None,       # Точки профиля [[время, запросов/сек], ...] для ломаной и сплайна
+    "load_path": None,         # CSV с точками профиля вместо load_points
+    "load_time_column": "time",# Столбец времени в CSV профиля (сек)
+    "load_rate_column": "rate",# Столбец интенсивности в CSV профиля (запросов/сек)
+    "load_time_scale": 1.0,    # Время точек профиля сжимается в это число раз
+    "load_rate_scale": 1.0,    # Множитель интенсивности точек профиля
+    "load_period": None,       # Период повторения профиля (сек); None - без повторения
+    "load_peak_rate": 40.0,    # Интенсивность на пике (ramp, step, flash_crowd); базовая - arrival_rate
+    "load_start": 10.0,        # Начало изменения нагрузки (сек)
+    "load_duration": 10.0,     # Длительность роста (ramp), ступени (step) или пика (flash_crowd)
+    "load_amplitude": 5.0,     # Амплитуда синусоиды (запросов/сек)
+    "load_rise": 2.0,          # Время нарастания наплыва (сек)
+    "load_decay": 5.0,         # Постоянная спада наплыва (сек)
+    "load_sampling": "thinning", # Генерация профиля: прореживание | обращение "inversion"
     "service_dist": "exponential", # Распределение времени обработки (экспоненциальное | нормальное | равномерное | постоянное)
     "service_mean": 0.08,      # Среднее время обработки
     "service_std": 0.02,       # Стандартное отклонение времени обработки
     "num_servers": 2,          # Количество серверов
-    "strategy": "queue",       # Стратегия (отклонение | очередь |ограничение скорости)
+    "strategy": "queue",       # Стратегия (отклонение | очередь |ограничение скорости | автомасштабирование "autoscale")
     "queue_size": 50,          # Размер очереди (для стратегии "очередь"); None => бесконечная
     "rate_limit_rps": 20.0,    # Количество запросов в секунду для стратегии ограничения скорости
-    "monitor_interval": 0.5,   
+    "rate_limiter": "token_bucket", # Ограничитель: ведро токенов | "gcra" | дырявое ведро "leaky_bucket" | окно "sliding_window" (см. exper_limiter)
+    "rate_limit_burst": None,  # Емкость ведра (запросов); None - 2 * rate_limit_rps
+    "rate_limit_mode": "police", # Без токена: отклонить "police" | ждать не больше rate_limit_max_delay "shape"
+    "rate_limit_max_delay": 1.0, # Наибольшее ожидание токена при формировании трафика (сек)
+    "rate_limit_window": 1.0,  # Длина окна для "sliding_window" (сек)
+    "autoscale_metric": "utilization", # Сигнал автомасштабирования: загруженность | средняя очередь на сервер "queue"
+    "autoscale_up": 0.8,       # Порог сигнала для добавления серверов
+    "autoscale_down": 0.3,     # Порог сигнала для удаления серверов
+    "autoscale_step": 1,       # Серверов за одно действие
+    "autoscale_min": 1,        # Минимальное число серверов
+    "autoscale_max": 10,       # Максимальное число серверов (вместе с запускаемыми)
+    "autoscale_interval": 5.0, # Период оценки сигнала (сек)
+    "autoscale_delay": 30.0,   # Задержка запуска нового сервера (сек)
+    "autoscale_cooldown": 60.0,# Пауза после действия масштабирования (сек)
+    "timeout_queue": None,     # Клиент ждет в очереди не дольше (сек); None - без ограничения (см. exper_client)
+    "timeout_total": None,     # Клиент ждет ответа не дольше (сек) от начала попытки; None - без ограничения
+    "retries": 0,              # Число повторов после отказа или таймаута
+    "retry_backoff": 0.1,      # Задержка перед первым повтором (сек)
+    "retry_multiplier": 2.0,   # Множитель задержки для каждого следующего повтора
+    "retry_backoff_max": 10.0, # Наибольшая задержка повтора (сек)
+    "retry_jitter": "full",    # Разброс задержки: без разброса "none" | [0, d] "full" | [d/2, d] "equal"
+    "retry_budget": None,      # Токенов бюджета повторов на исходный запрос; None - без бюджета
+    "retry_budget_burst": 10.0,# Наибольший запас токенов бюджета повторов
+    "monitor_interval": 0.5,   # Шаг временных рядов очереди и занятости серверов
+    "state_history": True,     # Хранить историю изменений очереди и занятости
+    "event_log": True,         # Вести журнал событий
+    "event_log_every": 1,      # Журналировать события каждого N-го запроса
+    "keep_response_times": False, # Сохранять все времена отклика (иначе только потоковые оценки)
+    "hist_bins": 64,           # Число интервалов потоковой гистограммы времени отклика
+    "plot_bins": 600,          # Число интервалов сводок для графиков (results["aggregates"]); 0 - не считать
+    "sampling": "direct",      # Генерация случайных величин (штатная | метод обратной функции "inverse")
+    "antithetic": False,       # Антитетический прогон: 1 - U вместо U (метод обратной функции)
+    "instrument": False,       # Диагностика прогона: время этапов и счетчики (results["instrumentation"])
+    "profile": None,           # Захват профиля: None | "cprofile" | "tracemalloc"
+    "tiers": None,             # Сеть сервисов: список уровней (см. exper_network); None - один пул серверов
+    "classes": None,           # Классы запросов: список (см. exper_classes); None - все запросы одинаковы
+    "class_scheduling": "fifo",# Порядок обслуживания классов: fifo | приоритет "priority" | с прерыванием "preemptive" | "wfq"
     "seed": 1234,
 }
 
 
-rd.seed(DEFAULTS["seed"])
+# Автомасштабирование (strategy="autoscale"): каждые autoscale_interval секунд
+# сигнал за прошедший период (загруженность или средняя очередь на сервер)
+# сравнивается с порогами. Выше autoscale_up - запускается autoscale_step серверов,
+# они принимают запросы через autoscale_delay; ниже autoscale_down - серверы
+# выводятся: новые запросы не получают, текущие дорабатывают (draining).
+# После действия autoscale_cooldown секунд новых действий нет. Число серверов
+# с запускаемыми - в [autoscale_min, autoscale_max]. Стоимость - сервер-секунды
+# с учетом запускаемых и дорабатывающих серверов. Очередь ограничена queue_size.
+AUTOSCALE_METRICS = ("utilization", "queue")
+
+
+def check_autoscale(cfg):
+    if cfg["autoscale_metric"] not in AUTOSCALE_METRICS:
+        raise ValueError(f"Неизвестный сигнал автомасштабирования: {cfg['autoscale_metric']!r}, допустимы {AUTOSCALE_METRICS}")
+    if not 1 <= int(cfg["autoscale_min"]) <= int(cfg["autoscale_max"]):
+        raise ValueError("Нужно 1 <= autoscale_min <= autoscale_max")
+    if cfg["autoscale_interval"] <= 0 or int(cfg["autoscale_step"]) < 1:
+        raise ValueError("autoscale_interval и autoscale_step должны быть положительными")
+    if cfg["autoscale_down"] >= cfg["autoscale_up"]:
+        raise ValueError("Порог удаления autoscale_down должен быть меньше порога добавления autoscale_up")
+
+
+# Ресурс с изменяемым числом серверов: при увеличении ждущие запросы сразу
+# получают сервер, при уменьшении занятые серверы дорабатывают текущие запросы
+class ScalableResource(simpy.Resource):
+    def set_capacity(self, capacity):
+        added = capacity - self._capacity
+        self._capacity = capacity
+        for _ in range(max(0, added)):
+            self._trigger_put(None)
+
+
+# Строгий приоритет с прерыванием обслуживания. В отличие от simpy.PreemptiveResource
+# вытесненной заявке приходит событие preempted, а не прерывание процесса: заявки
+# создаются при поступлении запроса, а не в процессе его обслуживания.
+class PreemptingResource(simpy.PriorityResource):
+    def request(self, priority=0):
+        req = super().request(priority=priority, preempt=True)
+        req.preempted = self._env.event()
+        return req
+
+    def _do_put(self, event):
+        if len(self.users) >= self.capacity:
+            victim = max(self.users, key=lambda r: r.key)
+            if victim.key > event.key:
+                self.users.remove(victim)
+                victim.preempted.succeed()
+        return super()._do_put(event)
+
+
+# Состояние допущенного запроса: номер, момент поступления, заявка на сервер
+# и время обработки из трассы (None - генерируется при начале обслуживания)
+# first - момент первой попытки исходного запроса, attempt - номер повтора (0 - исходная),
+# k - номер класса запроса, late - назначен уход клиента по таймауту во время обслуживания
+class Request:
+    __slots__ = ("id", "arrival", "slot", "service", "first", "attempt", "k", "late")
+
+    def __init__(self, req_id, arrival, slot, service=None, first=None, attempt=0, k=0):
+        self.id = req_id
+        self.arrival = arrival
+        self.slot = slot
+        self.service = service
+        self.first = arrival if first is None else first
+        self.attempt = attempt
+        self.k = k
+        self.late = False
+
+
+# Движки моделирования: "simpy" - событийная модель, "numpy" - векторизованная
+# рекурсия Линдли/Кифера-Вольфовица для стратегий queue и reject,
+# "analytic" - формулы M/M/c, M/M/c/K и Эрланга для экспоненциальных распределений
+ENGINES = ("simpy", "numpy", "analytic")
+
+# При заданных cfg["tiers"] моделируется сеть сервисов (exper_network.model_network)
+# собственным календарем событий; такой конфигурации нужен движок "simpy".
+# hooks - подписчики на события {"ARRIVAL" | "SERVICE_START" | "SERVICE_END" | "DROP" | "TIMEOUT" | "RETRY": fn
+# или список fn}, fn(время, "СОБЫТИЕ", id); поддерживаются только движком simpy.
+# При instrument, profile или hooks в results["instrumentation"] - диагностика прогона.
+def model_env(config=None, engine="simpy", hooks=None):
+    cfg = DEFAULTS.copy()
+    if config:
+        cfg.update(config)
+    if engine not in ENGINES:
+        raise ValueError(f"Неизвестный движок моделирования: {engine!r}")
+    if hooks and engine != "simpy":
+        raise ValueError(f"engine={engine!r} не поддерживает подписку на события")
+    run = {"numpy": exper_numpy.model_numpy, "analytic": exper_analytic.model_analytic}.get(engine, _model_simpy)
+    if cfg.get("tiers"):
+        if engine != "simpy" or hooks:
+            raise ValueError("Сеть сервисов (tiers) моделируется только движком simpy и без подписки на события")
+        if client_enabled(cfg):
+            raise ValueError("Таймауты и повторы клиента не поддерживаются сетью сервисов (tiers)")
+        if cfg.get("classes"):
+            raise ValueError("Классы запросов не поддерживаются сетью сервисов (tiers)")
+        run = exper_network.model_network
+
+    instr = Instrumentation.from_config(cfg, hooks)
+    if instr is None:
+        results = run(cfg)
+        results["instrumentation"] = None
+        return results
+    with instr.capture():
+        results = run(cfg, instr)
+    results["instrumentation"] = instr.report()
+    return results
 
-def sample_interarrival(config):
-    d = config["arrival_dist"]
-    if d == "exponential":
-        lam = max(1e-9, config["arrival_rate"])
-        return rd.expovariate(lam)
-    elif d == "deterministic":
-        return config["arrival_interval"]
-    elif d == "uniform":
-        return rd.uniform(config["arrival_low"], config["arrival_high"])
-    elif d == "poisson_burst":
-        return None  
-    else:
-        return rd.expovariate(max(1e-9, config["arrival_rate"]))
-
-def sample_service(config):
-    d = config["service_dist"]
-    if d == "exponential":
-        mean = max(1e-9, config["service_mean"])
-        return max(0.0, rd.expovariate(1.0/mean))
-    elif d == "deterministic":
-        return config["service_mean"]
-    elif d == "normal":
-        s = rd.gauss(config["service_mean"], config["service_std"])
-        return max(0.0, s)
-    elif d == "uniform":
-        low = max(0.0, config["service_mean"] - config["service_std"])
-        high = config["service_mean"] + config["service_std"]
-        return rd.uniform(low, high)
-    else:
-        return max(0.0, rd.expovariate(1.0/config["service_mean"]))
 
-def model_env(config=None):
+# Потоковый режим: модель продвигается окнами по window секунд модельного
+# времени, после каждого окна выдается его сводка (см. _model_simpy).
+# Память не растет с sim_time: история уровней и времена отклика не хранятся,
+# журнал событий (если включен) выдается по окнам и затем очищается.
+def iter_model_env(config=None, window=60.0, hooks=None):
     cfg = DEFAULTS.copy()
     if config:
         cfg.update(config)
-    rd.seed(cfg.get("seed", DEFAULTS["seed"]))
+    if not window or window <= 0:
+        raise ValueError("Длина окна должна быть положительной")
+    if cfg.get("tiers"):
+        raise ValueError("Потоковый режим не поддерживает сеть сервисов (tiers)")
+    cfg["state_history"] = False
+    cfg["keep_response_times"] = False
+    instr = Instrumentation(hooks=hooks) if hooks else None
+    return _model_simpy(cfg, instr, float(window))
+
+
+# Сводки для графиков: события по интервалам, среднее и максимум очереди и занятости
+def _aggregates(event_bins, queue_level, busy_level, servers_level):
+    if event_bins is None:
+        return None
+    edges = event_bins.edges()
+    return {**event_bins.to_dict(), "queue": queue_level.binned(edges), "busy": busy_level.binned(edges),
+            "servers": servers_level.binned(edges)}
+
+
+# window=None - прогон целиком и словарь результатов,
+# иначе генератор сводок по окнам длиной window
+def _model_simpy(cfg, instr=None, window=None):
+    # Собственные потоки случайных чисел прогона, без глобального состояния
+    streams = make_streams(cfg.get("seed", DEFAULTS["seed"]))
+    # При диагностике время генерации блоков учитывается отдельно (внутри этапа run)
+    wrap = None
+    if instr is not None:
+        wrap = lambda draw: instr.timed("sampling", draw, "sample_blocks")
+    next_interarrival = interarrival_sampler(cfg, streams["arrival"], wrap=wrap)
+    next_service = service_sampler(cfg, streams["service"], wrap=wrap)
 
     SIM_TIME = float(cfg["sim_time"])
-    env = simpy.Environment()
-
-    server = simpy.Resource(env, capacity=cfg["num_servers"])
-    token_bucket = {"tokens": cfg["rate_limit_rps"], "last_time": 0.0}
+    env = simpy.Environment() if instr is None else instr.environment()
+
+    # Классы запросов (exper_classes): свой поток, время обработки и показатели
+    classes = None
+    if cfg.get("classes"):
+        check_classes(cfg)
+        classes = make_classes(cfg, streams, cfg["state_history"], wrap)
+    scheduling = cfg["class_scheduling"] if classes else "fifo"
+    preemptive = scheduling == "preemptive"
+    # Метка WFQ последнего начавшего обслуживание запроса (виртуальное время)
+    wfq_clock = 0.0
+
+    autoscale = cfg["strategy"] == "autoscale"
+    if autoscale:
+        check_autoscale(cfg)
+        initial = min(max(int(cfg["num_servers"]), int(cfg["autoscale_min"])), int(cfg["autoscale_max"]))
+        server = ScalableResource(env, capacity=initial)
+    elif preemptive:
+        server = PreemptingResource(env, capacity=cfg["num_servers"])
+    elif scheduling != "fifo":
+        server = simpy.PriorityResource(env, capacity=cfg["num_servers"])
+    else:
+        server = simpy.Resource(env, capacity=cfg["num_servers"])
+    # Ограничитель скорости: при формировании трафика запрос ждет токена, а не
+    # отклоняется; не дождавшись за rate_limit_max_delay - DROPPED_RATE_TIMEOUT
+    limiter = make_limiter(cfg) if cfg["strategy"] == "rate_limit" else None
+    shaping = limiter is not None and cfg["rate_limit_mode"] == "shape"
+    rate_drop = DROPPED_RATE_TIMEOUT if shaping else DROPPED_RATE
+
+    # Таймауты и повторы клиента (exper_client)
+    client = client_enabled(cfg)
+    next_backoff = budget = None
+    if client:
+        check_client(cfg)
+        next_backoff = backoff_sampler(cfg, streams["retry"])
+        budget = RetryBudget.from_config(cfg)
+    max_retries = int(cfg["retries"])
+    timeout_queue, timeout_total = cfg["timeout_queue"], cfg["timeout_total"]
+    # Номера попыток: исходные запросы и повторы нумеруются подряд
+    ids = itertools.count(1)
 
     stats = {
         "total_arrivals": 0,
         "processed": 0,
         "dropped": 0,
+        "succeeded": 0,
+        "failed": 0,
+        "timeouts": 0,
+        "retries": 0,
+        "shaped": 0,
+        "shaping_delay": 0.0,
         "response_times": [],
-        "events": [],
-        "queue_samples": [],
-        "server_busy_samples": [],
+        "events": EventLog.from_config(cfg),
     }
 
-    server_busy_time = 0.0
-
-    def refill_tokens(now):
-        if cfg["rate_limit_rps"] <= 0:
-            token_bucket["last_time"] = now
-            return
-        elapsed = now - token_bucket["last_time"]
-        if elapsed <= 0:
-            return
-        token_bucket["tokens"] += elapsed * cfg["rate_limit_rps"]
-        token_bucket["tokens"] = min(token_bucket["tokens"], cfg["rate_limit_rps"] * 2.0)
-        token_bucket["last_time"] = now
+    # Длина очереди и число занятых серверов меняются только в моменты
+    # постановки в очередь, начала и окончания обслуживания
+    queue_level = TimeWeighted(history=cfg["state_history"])
+    busy_level = TimeWeighted(history=cfg["state_history"])
+    # Число работающих серверов и оплачиваемых (с запускаемыми и дорабатывающими)
+    servers_level = TimeWeighted(level=server.capacity, history=cfg["state_history"])
+    billed_level = TimeWeighted(level=server.capacity, history=False)
+    scaling = {"pending": 0, "events": []}
+    log_event = stats["events"].append
+    # Сводки для графиков считаются по всем событиям, независимо от журнала
+    event_bins = EventBins.from_config(cfg) if window is None and cfg.get("plot_bins") else None
+    if event_bins is not None:
+        append, count = log_event, event_bins.add
+
+        def log_event(t, code, req_id):
+            count(t, code)
+            append(t, code, req_id)
+    if instr is not None:
+        log_event = instr.wrap_log(log_event)
+    response_stats = ResponseStats(cfg)
+    service_sum = 0.0
+    service_count = 0
+    keep_response_times = cfg["keep_response_times"]
+
+    strategy = cfg["strategy"]
+    capacity = cfg["num_servers"]
+    if strategy == "queue" and cfg["queue_size"] is not None:
+        system_limit = cfg["queue_size"] + cfg["num_servers"]
+    else:
+        system_limit = None
 
-    # Генерация поступающих запросов в систему
-    def arrival_process(env):
-        req_counter = 0  
+    def drop(now, code, req_id):
+        stats["dropped"] += 1
+        log_event(now, code, req_id)
 
-        while env.now < SIM_TIME:
-            if cfg["arrival_dist"] == "poisson_burst":
+    # Решение о допуске запроса класса k: код отказа или None. Для rate_limit
+    # расходует токен. Квота класса проверяется первой.
+    def admission(now, k=0):
+        if classes is not None and classes[k].quota is not None and classes[k].queued >= classes[k].quota:
+            return DROPPED_QUEUE_FULL
 
-                yield env.timeout(cfg["interburst_interval"])
+        if strategy == "rate_limit":
+            if limiter.admit(now):
+                return None
+            return rate_drop
 
-                for _ in range(cfg["burst_size"]):
-                    req_counter += 1
-                    env.process(handle_request(env, req_counter))
+        elif strategy == "reject":
+            if server.count >= capacity:
+                return DROPPED_REJECT
+
+        elif autoscale:
+            if cfg["queue_size"] is not None and len(server.queue) >= cfg["queue_size"]:
+                return DROPPED_QUEUE_FULL
+
+        elif system_limit is not None:
+            if len(server.queue) + server.count >= system_limit:
+                return DROPPED_QUEUE_FULL
+        return None
+
+    def bill(now):
+        billed = scaling["pending"] + max(server.capacity, server.count)
+        if billed != billed_level.level:
+            billed_level.add(now, billed - billed_level.level)
+
+    def provision(n):
+        yield env.timeout(cfg["autoscale_delay"])
+        scaling["pending"] -= n
+        server.set_capacity(server.capacity + n)
+        servers_level.add(env.now, n)
+        bill(env.now)
+        scaling["events"].append((env.now, "ready", server.capacity))
+
+    # Периодическая оценка сигнала и решение о масштабировании
+    def autoscaler(env):
+        interval = float(cfg["autoscale_interval"])
+        lo, hi, step = int(cfg["autoscale_min"]), int(cfg["autoscale_max"]), int(cfg["autoscale_step"])
+        last_action = -math.inf
+        prev = (0.0, 0.0, 0.0)
+        while True:
+            yield env.timeout(interval)
+            now = env.now
+            cur = (busy_level.integral(now), servers_level.integral(now), queue_level.integral(now))
+            if cfg["autoscale_metric"] == "utilization":
+                signal = (cur[0] - prev[0]) / max(1e-12, cur[1] - prev[1])
+            else:
+                signal = (cur[2] - prev[2]) / interval / max(1, server.capacity)
+            prev = cur
+            if now - last_action < cfg["autoscale_cooldown"]:
                 continue
-
-
-            req_counter += 1
-            env.process(handle_request(env, req_counter))
-
-
-            ia = sample_interarrival(cfg)
-            if ia is None:
-                ia = 0.0
-
-
-            yield env.timeout(ia)
-
-
-
-    # Обработка запроса
-    def handle_request(env, req_id):
-        nonlocal server_busy_time, stats
-
-        arrival_time = env.now
+            target = server.capacity + scaling["pending"]
+            if signal > cfg["autoscale_up"] and target < hi:
+                n = min(step, hi - target)
+                scaling["pending"] += n
+                bill(now)
+                env.process(provision(n))
+                scaling["events"].append((now, "scale_out", target + n))
+                last_action = now
+            elif signal < cfg["autoscale_down"] and target > lo and not scaling["pending"]:
+                n = min(step, target - lo)
+                server.set_capacity(server.capacity - n)
+                servers_level.add(now, -n)
+                bill(now)
+                scaling["events"].append((now, "scale_in", server.capacity))
+                last_action = now
+
+    # Поступление попытки: None при отказе, иначе задержка до входа в систему
+    # (ожидание токена при формировании трафика). При отказе клиент повторяет
+    # запрос (first - момент первой попытки, attempt - номер повтора, k - класс).
+    def arrive(req_id, now, service=None, first=None, attempt=0, k=0):
         stats["total_arrivals"] += 1
-        stats["events"].append((arrival_time, "ARRIVAL", req_id))
+        log_event(now, ARRIVAL, req_id)
+        code = admission(now, k)
+        if classes is not None:
+            classes[k].arrivals += 1
+        if code is not None:
+            drop(now, code, req_id)
+            if classes is not None:
+                classes[k].dropped += 1
+                if not client:
+                    classes[k].failed += 1
+            if client:
+                retry(now, now if first is None else first, attempt, service, k)
+            return None
+        return limiter.delay if shaping else 0.0
+
+    # Заявка на сервер: по приоритету класса или по метке WFQ
+    def request_slot(k):
+        if scheduling == "fifo":
+            return server.request()
+        c = classes[k]
+        if scheduling == "wfq":
+            c.tag = max(wfq_clock, c.tag) + c.cost
+            return server.request(priority=c.tag)
+        return server.request(priority=c.priority)
+
+    def queue_add(now, r, n):
+        queue_level.add(now, n)
+        if classes is not None:
+            classes[r.k].queued += n
+            classes[r.k].queue_level.add(now, n)
+
+    # Допущенный запрос сразу занимает место в ресурсе, поэтому следующий
+    # запрос видит актуальную очередь. Процесс SimPy создается только для него.
+    # arrival - момент поступления попытки, если она ждала токена.
+    def enqueue(req_id, service=None, first=None, attempt=0, delay=0.0, arrival=None, k=0):
+        now = env.now
+        if delay:
+            shape(Request(req_id, now, None, service, first, attempt, k), delay)
+            return
+        r = Request(req_id, now if arrival is None else arrival, request_slot(k), service, first, attempt, k)
+        if not r.slot.triggered:
+            queue_add(now, r, 1)
+        env.process(serve(r))
+
+    # Ожидание токена - событие календаря с обработчиком, без процесса SimPy.
+    # Клиент с таймаутом может уйти, не дождавшись.
+    def shape(r, delay):
+        stats["shaped"] += 1
+        stats["shaping_delay"] += delay
+        wait = patience(r, r.arrival) if client else None
+        if wait is not None and wait < delay:
+            env.timeout(wait).callbacks.append(lambda event: abandon(env.now, r))
+        else:
+            env.timeout(delay).callbacks.append(
+                lambda event: enqueue(r.id, r.service, r.first, r.attempt, arrival=r.arrival, k=r.k))
+
+    # Неудачная попытка в момент now: повтор после задержки, если не исчерпаны
+    # повторы и бюджет, иначе исходный запрос неуспешен. Повтор - событие
+    # календаря с обработчиком, без процесса SimPy.
+    def retry(now, first, attempt, service, k=0):
+        if attempt >= max_retries or (budget is not None and not budget.withdraw(
+                stats["total_arrivals"] - stats["retries"])):
+            stats["failed"] += 1
+            if classes is not None:
+                classes[k].failed += 1
+            return
+        delay = now - env.now + next_backoff(attempt + 1)
+        env.timeout(delay, (first, attempt + 1, service, k)).callbacks.append(resend)
+
+    def resend(event):
+        first, attempt, service, k = event.value
+        now = env.now
+        req_id = next(ids)
+        stats["retries"] += 1
+        if classes is not None:
+            classes[k].retries += 1
+        log_event(now, RETRY, req_id)
+        delay = arrive(req_id, now, service, first, attempt, k)
+        if delay is not None:
+            enqueue(req_id, service, first, attempt, delay, k=k)
+
+    # Клиент перестал ждать попытку r
+    def abandon(now, r):
+        stats["timeouts"] += 1
+        if classes is not None:
+            classes[r.k].timeouts += 1
+        log_event(now, TIMEOUT, r.id)
+        retry(now, r.first, r.attempt, r.service, r.k)
+
+    # Уход клиента в срок deadline, если попытка r к нему не завершится
+    def watch(r, deadline):
+        r.late = True
+        env.timeout(max(0.0, deadline - env.now)).callbacks.append(
+            lambda event: r.slot is None or abandon(env.now, r))
+
+    # Сколько попытка r может ждать начала обслуживания с момента now
+    # (оба таймаута - от поступления попытки); None - без ограничения
+    def patience(r, now):
+        wait = None if timeout_queue is None else r.arrival + timeout_queue - now
+        if timeout_total is not None:
+            left = r.arrival + timeout_total - now
+            wait = left if wait is None else min(wait, left)
+        return wait
+
+    # Генерация поступающих запросов в систему; c - класс запросов (None - без классов)
+    def arrival_process(env, c=None):
+        acfg, next_gap, k = (cfg, next_interarrival, 0) if c is None else (c.config, c.next_interarrival, c.index)
+
+        if acfg["arrival_dist"] == "poisson_burst":
+            while env.now < SIM_TIME:
+                yield env.timeout(acfg["interburst_interval"])
+
+                for _ in range(acfg["burst_size"]):
+                    req_counter = next(ids)
+                    delay = arrive(req_counter, env.now, k=k)
+                    if delay is not None:
+                        enqueue(req_counter, delay=delay, k=k)
+            return
 
-        strategy = cfg["strategy"]
-        qlen = len(server.queue)
-        in_service = server.count
+        # Моменты поступления (и времена обработки) читаются из журнала порциями
+        if acfg["arrival_dist"] == "trace":
+            for times, services in exper_trace.iter_trace(cfg):
+                services = services.tolist() if services is not None else [None] * len(times)
+                for t, service in zip(times.tolist(), services):
+                    if t > env.now and env.peek() <= t:
+                        yield env.timeout(t - env.now)
+                    req_counter = next(ids)
+                    delay = arrive(req_counter, t, service)
+                    if delay is not None:
+                        if t > env.now:
+                            yield env.timeout(t - env.now)
+                        enqueue(req_counter, service, delay=delay)
+            return
 
-        if strategy == "rate_limit":
-            refill_tokens(env.now)
-            if token_bucket["tokens"] >= 1.0:
-                token_bucket["tokens"] -= 1.0
+        # До ближайшего события модели состояние системы не меняется, поэтому
+        # отклоненные запросы обрабатываются подряд без шага SimPy; шаг по
+        # времени нужен, только если раньше есть событие или запрос допущен
+        t = env.now
+        while t < SIM_TIME:
+            if t > env.now and env.peek() <= t:
+                yield env.timeout(t - env.now)
+                t = env.now
+            req_counter = next(ids)
+            delay = arrive(req_counter, t, k=k)
+            if delay is not None:
+                if t > env.now:
+                    yield env.timeout(t - env.now)
+                    t = env.now
+                enqueue(req_counter, delay=delay, k=k)
+
+            t += next_gap()
+
+
+
+    # Обслуживание допущенного запроса
+    def serve(r):
+        nonlocal service_sum, service_count, wfq_clock
+        c = classes[r.k] if classes is not None else None
+
+        if not r.slot.triggered:
+            wait = patience(r, env.now) if client else None
+            if wait is None:
+                yield r.slot
             else:
-                stats["dropped"] += 1
-                stats["events"].append((env.now, "DROPPED_RATE", req_id))
-                return
-
-        elif strategy == "reject":
-            if in_service >= cfg["num_servers"]:
-                stats["dropped"] += 1
-                stats["events"].append((env.now, "DROPPED_REJECT", req_id))
-                return
-
-        elif strategy == "queue":
-            if cfg["queue_size"] is not None:
-                if (qlen + in_service) >= cfg["queue_size"] + cfg["num_servers"]:
-                    stats["dropped"] += 1
-                    stats["events"].append((env.now, "DROPPED_QUEUE_FULL", req_id))
+                yield r.slot | env.timeout(wait)
+                if not r.slot.triggered:
+                    # Клиент ушел из очереди и освободил место
+                    r.slot.cancel()
+                    queue_add(env.now, r, -1)
+                    abandon(env.now, r)
                     return
-
-        req = server.request()
-        yield req
+            queue_add(env.now, r, -1)
 
         start_service = env.now
-        stats["events"].append((start_service, "SERVICE_START", req_id))
-
-        service_time = sample_service(cfg)
-        yield env.timeout(service_time)
+        busy_level.add(start_service, 1)
+        log_event(start_service, SERVICE_START, r.id)
+
+        if c is not None:
+            c.busy_level.add(start_service, 1)
+            if scheduling == "wfq":
+                wfq_clock = r.slot.priority
+            service_time = c.next_service() if r.service is None else r.service
+            c.service_sum += service_time
+            c.service_count += 1
+        else:
+            service_time = next_service() if r.service is None else r.service
+        service_sum += service_time
+        service_count += 1
+        # Ответ не успеет до таймаута клиента: клиент уходит в свой срок,
+        # а сервер дорабатывает запрос
+        deadline = math.inf
+        if client and timeout_total is not None:
+            deadline = r.arrival + timeout_total
+            if start_service + service_time > deadline:
+                watch(r, deadline)
+        if preemptive:
+            if not (yield from serve_preemptive(r, c, start_service, service_time, deadline)):
+                return
+        else:
+            yield env.timeout(service_time)
 
         end_service = env.now
-        server.release(req)
+        server.release(r.slot)
+        r.slot = None
+        busy_level.add(end_service, -1)
+        if autoscale:
+            bill(end_service)
 
-        server_busy_time += service_time
         stats["processed"] += 1
-        stats["response_times"].append(end_service - arrival_time)
-        stats["events"].append((end_service, "SERVICE_END", req_id))
-
-
-
-    def monitor(env):
-        while env.now < SIM_TIME:
-            stats["queue_samples"].append((env.now, len(server.queue)))
-            stats["server_busy_samples"].append((env.now, server.count))
-            yield env.timeout(cfg["monitor_interval"])
-
-    env.process(arrival_process(env))
-    env.process(monitor(env))
-    token_bucket["last_time"] = 0.0
-
+        if c is not None:
+            c.busy_level.add(end_service, -1)
+            c.processed += 1
+        if end_service <= deadline:
+            stats["succeeded"] += 1
+            response_stats.add(end_service - r.first)
+            if c is not None:
+                c.succeeded += 1
+                c.response.add(end_service - r.first)
+            if keep_response_times:
+                stats["response_times"].append(end_service - r.first)
+        log_event(end_service, SERVICE_END, r.id)
+
+    # Обслуживание с прерыванием: запрос важнее забирает сервер, прерванный
+    # запрос встает в очередь и затем дообслуживается оставшееся время.
+    # В очереди действуют таймауты клиента, как при первом ожидании.
+    # False - клиент ушел из очереди, запрос не дообслуживается
+    def serve_preemptive(r, c, start, remaining, deadline):
+        while True:
+            yield env.timeout(remaining) | r.slot.preempted
+            if not r.slot.preempted.triggered:
+                return True
+            now = env.now
+            remaining -= now - start
+            c.preemptions += 1
+            busy_level.add(now, -1)
+            c.busy_level.add(now, -1)
+            if deadline < math.inf and not r.late:
+                watch(r, deadline)
+            r.slot = server.request(priority=c.priority)
+            queue_add(now, r, 1)
+            wait = patience(r, now) if client else None
+            if wait is None:
+                yield r.slot
+            else:
+                yield r.slot | env.timeout(max(0.0, wait))
+                if not r.slot.triggered:
+                    r.slot.cancel()
+                    r.slot = None
+                    queue_add(env.now, r, -1)
+                    # К сроку timeout_total клиент уже ушел по watch
+                    if not (r.late and env.now >= deadline):
+                        abandon(env.now, r)
+                    return False
+            start = env.now
+            queue_add(start, r, -1)
+            busy_level.add(start, 1)
+            c.busy_level.add(start, 1)
+
+
+    # Сводки по окнам [start, end): счетчики - события внутри окна, время отклика -
+    # запросы, завершенные в окне, длина очереди и занятость - по времени окна
+    def windows(step):
+        nonlocal response_stats
+        start = 0.0
+        seen = {"total_arrivals": 0, "processed": 0, "dropped": 0, "succeeded": 0, "timeouts": 0, "retries": 0}
+        queue_area = busy_area = servers_area = 0.0
+        while start < SIM_TIME:
+            end = min(start + step, SIM_TIME)
+            env.run(until=end)
+            span = end - start
+            response = response_stats.summary()
+            queue_int = queue_level.integral(end)
+            busy_int = busy_level.integral(end)
+            servers_int = servers_level.integral(end)
+            counts = {k: stats[k] - seen[k] for k in seen}
+            yield {
+                "start": start,
+                "end": end,
+                "arrivals": counts["total_arrivals"],
+                "processed": counts["processed"],
+                "dropped": counts["dropped"],
+                "succeeded": counts["succeeded"],
+                "throughput": counts["processed"] / span,
+                "goodput": counts["succeeded"] / span,
+                "timeouts": counts["timeouts"],
+                "retries": counts["retries"],
+                "avg_response_time": response["mean"],
+                "response_quantiles": response["quantiles"],
+                "utilization": (busy_int - busy_area) / max(1e-12, servers_int - servers_area),
+                "mean_servers": (servers_int - servers_area) / span,
+                "mean_queue_len": (queue_int - queue_area) / span,
+                "max_queue_len": queue_level.take_max(),
+                "mean_busy_servers": (busy_int - busy_area) / span,
+                "max_busy_servers": busy_level.take_max(),
+                "total_arrivals": stats["total_arrivals"],
+                "total_processed": stats["processed"],
+                "total_dropped": stats["dropped"],
+                "events": stats["events"].drain(),
+            }
+            seen = {k: stats[k] for k in seen}
+            queue_area, busy_area, servers_area = queue_int, busy_int, servers_int
+            response_stats = ResponseStats(cfg)
+            start = end
+
+    if classes is None:
+        env.process(arrival_process(env))
+    else:
+        for c in classes:
+            env.process(arrival_process(env, c))
+    if autoscale:
+        env.process(autoscaler(env))
+    if window is not None:
+        return windows(window)
+
+    if instr is not None:
+        instr.lap("setup")
     env.run(until=SIM_TIME)
+    if instr is not None:
+        instr.lap("run")
 
-    utilization = (server_busy_time / (SIM_TIME * max(1, cfg["num_servers"]))) if SIM_TIME > 0 else 0.0
-    avg_response = sum(stats["response_times"]) / len(stats["response_times"]) if stats["response_times"] else 0.0
+    # Загруженность - среднее по времени число занятых серверов на один сервер
+    utilization = busy_level.mean(SIM_TIME) / max(1, cfg["num_servers"])
+    if autoscale:
+        utilization = busy_level.integral(SIM_TIME) / max(1e-12, servers_level.integral(SIM_TIME))
+    response = response_stats.summary()
 
     results = {
         "total_arrivals": stats["total_arrivals"],
         "processed": stats["processed"],
         "dropped": stats["dropped"],
-        "avg_response_time": avg_response,
+        "avg_response_time": response["mean"],
+        "response_std": response["std"],
+        "response_quantiles": response["quantiles"],
+        "response_hist": response["hist"],
         "utilization": utilization,
-        "queue_time_series": stats["queue_samples"],
-        "server_busy_time_series": stats["server_busy_samples"],
+        "mean_queue_len": queue_level.mean(SIM_TIME),
+        "max_queue_len": queue_level.max,
+        "mean_busy_servers": busy_level.mean(SIM_TIME),
+        "max_busy_servers": busy_level.max,
+        "queue_time_series": time_series(queue_level, SIM_TIME, cfg["monitor_interval"]),
+        "server_busy_time_series": time_series(busy_level, SIM_TIME, cfg["monitor_interval"]),
+        "queue_history": queue_level.history(),
+        "busy_history": busy_level.history(),
+        "servers_time_series": time_series(servers_level, SIM_TIME, cfg["monitor_interval"]),
+        "servers_history": servers_level.history(),
+        "mean_servers": servers_level.mean(SIM_TIME),
+        "server_seconds": billed_level.integral(SIM_TIME),
+        "scaling_events": scaling["events"],
+        "shaped": stats["shaped"],
+        "avg_shaping_delay": stats["shaping_delay"] / max(1, stats["shaped"]),
+        **client_results(stats["total_arrivals"], stats["processed"], stats["succeeded"],
+                         stats["failed"] if client else stats["dropped"], stats["timeouts"], stats["retries"],
+                         SIM_TIME),
+        "classes": None if classes is None else {
+            c.name: class_results(c, SIM_TIME, cfg["num_servers"]) for c in classes},
         "response_times": stats["response_times"],
         "events": stats["events"],
+        "aggregates": _aggregates(event_bins, queue_level, busy_level, servers_level),
+        # Управляющие переменные с известными ожиданиями (exper_random.expected_controls);
+        # при классах запросов - по первому классу
+        "controls": {
+            "service_mean": service_sum / service_count if service_count else 0.0,
+            "arrivals": float(stats["total_arrivals"] - stats["retries"]),
+        } if classes is None else {
+            "service_mean": classes[0].service_sum / classes[0].service_count if classes[0].service_count else 0.0,
+            "arrivals": float(classes[0].arrivals - classes[0].retries),
+        },
         "config": cfg,
     }
+    if instr is not None:
+        instr.counters["events_logged"] = len(stats["events"])
+        instr.lap("assembly")
     return results
 
 if __name__ == "__main__":
@@ -217,7 +796,11 @@ if __name__ == "__main__":
     res = model_env(cfg)
     print("Sanity run results:")
     for k, v in res.items():
-        if k in ("queue_time_series", "response_times", "events"):
+        if k in ("queue_time_series", "servers_time_series", "response_times", "events"):
             print(k, "len:", len(v))
+        elif k in ("queue_history", "busy_history", "servers_history"):
+            print(k, "len:", len(v[0]))
+        elif k == "aggregates":
+            print(k, "bins:", len(v["edges"]) - 1)
         else:
             print(k, ":", v)
\ No newline at end of file
@@ -0,0 +1,191 @@
+import hashlib
+import itertools
+import json
+import os
+import numpy as np
+from scipy.stats import qmc
+import exper_cloud as mdl
+import exper_sweep as sweep
+
+# Многофакторные эксперименты: план задается словарем
+#   {"design": "factorial" | "lhs", "factors": {...}, "samples": N (для lhs),
+#    "base": {...общая конфигурация...}, "replicas": r, "seed": s, "engine": "simpy"}
+# Фактор - любой параметр модели из DEFAULTS:
+#   список значений                    - уровни фактора;
+#   {"low", "high", "levels"=3,        - диапазон: для factorial - levels уровней,
+#    "scale"="linear"|"log",             для lhs - непрерывная величина
+#    "integer"=False}
+# Агрегированные результаты каждой завершенной точки дописываются строкой JSON
+# в файл прогона, поэтому прерванный эксперимент продолжается с места остановки,
+# а реплики незавершенных точек берутся из кэша результатов.
+
+# Основные факторы нагрузки и мощности (выбраны по умолчанию на странице плана)
+FACTORS = ("queue_size", "num_servers", "arrival_rate", "service_mean")
+DESIGNS = ("factorial", "lhs")
+RUNS_DIR = os.environ.get("EXPER_RUNS_DIR", ".exper_runs")
+
+
+def _check_factors(factors):
+    if not factors:
+        raise ValueError("План эксперимента должен содержать хотя бы один фактор")
+    for name, spec in factors.items():
+        if name not in mdl.DEFAULTS:
+            raise ValueError(f"Неизвестный параметр модели: {name!r}")
+        if isinstance(spec, dict) and not spec.get("low", 0) <= spec.get("high", 0):
+            raise ValueError(f"Для фактора {name!r} нужно low <= high")
+
+
+def _cast(spec, value):
+    if isinstance(spec, dict) and spec.get("integer"):
+        return int(round(value))
+    return float(value)
+
+
+# Отображение u из [0, 1) на значения фактора
+def _scale(spec, u):
+    if not isinstance(spec, dict):
+        levels = list(spec)
+        return [levels[min(int(x * len(levels)), len(levels) - 1)] for x in u]
+    low, high = float(spec["low"]), float(spec["high"])
+    if spec.get("scale") == "log":
+        values = np.exp(np.log(low) + (np.log(high) - np.log(low)) * u)
+    else:
+        values = low + (high - low) * u
+    return [_cast(spec, v) for v in values]
+
+
+def _levels(spec):
+    if not isinstance(spec, dict):
+        return list(spec)
+    n = max(1, int(spec.get("levels", 3)))
+    u = np.linspace(0.0, 1.0, n) if n > 1 else np.zeros(1)
+    if spec.get("scale") == "log":
+        values = np.exp(np.log(spec["low"]) + (np.log(spec["high"]) - np.log(spec["low"])) * u)
+    else:
+        values = spec["low"] + (spec["high"] - spec["low"]) * u
+    # Повторы после округления до целых не нужны
+    return list(dict.fromkeys(_cast(spec, v) for v in values))
+
+
+# Полный факторный план: все сочетания уровней
+def factorial(factors):
+    _check_factors(factors)
+    names = list(factors)
+    return [dict(zip(names, combo)) for combo in itertools.product(*(_levels(factors[n]) for n in names))]
+
+
+# Латинский гиперкуб: samples точек, по каждому фактору ровно одна точка в каждой из samples полос
+def latin_hypercube(factors, samples, seed=0):
+    _check_factors(factors)
+    names = list(factors)
+    u = qmc.LatinHypercube(d=len(names), seed=np.random.default_rng(seed)).random(int(samples))
+    columns = [_scale(factors[n], u[:, i]) for i, n in enumerate(names)]
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+def design_points(spec):
+    design = spec.get("design", "factorial")
+    if design == "factorial":
+        return factorial(spec["factors"])
+    elif design == "lhs":
+        return latin_hypercube(spec["factors"], spec.get("samples", 20), spec.get("seed", 0))
+    raise ValueError(f"Неизвестный тип плана: {design!r}, допустимы {DESIGNS}")
+
+
+def spec_hash(spec):
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def run_path(name):
+    return os.path.join(RUNS_DIR, f"{name}.jsonl")
+
+
+# Seed реплики rep точки index: не зависит от порядка выполнения и перезапусков
+def point_seed(spec, index, rep):
+    return int(np.random.SeedSequence([int(spec.get("seed", 0)), index, rep]).generate_state(1)[0])
+
+
+def point_cfg(spec, index, point, rep):
+    return {**spec.get("base", {}), **point, "seed": point_seed(spec, index, rep)}
+
+
+# Прочитанные строки файла прогона: (заголовок, {номер точки: строка}).
+# Недописанная при сбое последняя строка отбрасывается (и обрезается при записи).
+def load_run(path):
+    header, rows, good = None, {}, 0
+    if not os.path.exists(path):
+        return header, rows, good
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                break
+            if not line.endswith(b"\n"):
+                break
+            good += len(line)
+            if header is None:
+                header = rec
+            else:
+                rows[rec["point"]] = rec
+    return header, rows, good
+
+
+# Агрегированная строка точки по результатам реплик (в порядке номеров)
+def aggregate(index, point, results, sim_time, level=0.95):
+    row = {"point": index, **point, "replicas": len(results)}
+    for metric, fn in sweep.METRICS.items():
+        mean, ci = sweep.mean_ci([fn(res) for res in results], level)
+        row[metric if metric.startswith("mean_") else f"mean_{metric}"] = mean
+        row[f"ci_{metric}"] = ci if np.isfinite(ci) else None
+    row["mean_p99"] = float(np.mean([res["response_quantiles"]["p99"] for res in results]))
+    row["mean_throughput"] = float(np.mean([res["processed"] / sim_time for res in results]))
+    row["mean_goodput"] = float(np.mean([res["goodput"] for res in results]))
+    row["mean_retry_amplification"] = float(np.mean([res["retry_amplification"] for res in results]))
+    return row
+
+
+# Выполнение плана с записью в path. Уже завершенные точки пропускаются;
+# если файл принадлежит другому плану - ошибка (restart=True - начать заново).
+# Отдает строки новых точек по мере завершения.
+def run_design(spec, path, workers=None, cache=None, restart=False, level=0.95):
+    points = design_points(spec)
+    digest = spec_hash(spec)
+    replicas = max(1, int(spec.get("replicas", 1)))
+    engine = spec.get("engine", "simpy")
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if restart and os.path.exists(path):
+        os.remove(path)
+    header, done, good = load_run(path)
+    if header is not None and header.get("spec_hash") != digest:
+        raise ValueError(f"Файл {path} содержит результаты другого плана")
+
+    with open(path, "ab") as out:
+        out.truncate(good)
+        if header is None:
+            out.write((json.dumps({"spec_hash": digest, "spec": spec, "points": len(points)}) + "\n").encode())
+            out.flush()
+
+        jobs = [((i, rep), point_cfg(spec, i, p, rep))
+                for i, p in enumerate(points) if i not in done
+                for rep in range(replicas)]
+        jobs_cfg = {i: cfg for (i, rep), cfg in jobs}
+        partial = {}
+        for (i, rep), res in sweep.run_sweep(jobs, workers=workers, engine=engine, cache=cache):
+            partial.setdefault(i, {})[rep] = res
+            if len(partial[i]) < replicas:
+                continue
+            reps = partial.pop(i)
+            sim_time = float({**mdl.DEFAULTS, **jobs_cfg[i]}["sim_time"])
+            row = aggregate(i, points[i], [reps[k] for k in sorted(reps)], sim_time, level)
+            out.write((json.dumps(row) + "\n").encode())
+            out.flush()
+            os.fsync(out.fileno())
+            yield row
+
+
+def results_frame(path):
+    import pandas as pd
+    _, rows, _ = load_run(path)
+    return pd.DataFrame([rows[k] for k in sorted(rows)])
@@ -0,0 +1,180 @@
+from array import array
+import numpy as np
+
+# Коды событий журнала
+EVENT_NAMES = (
+    "ARRIVAL",
+    "SERVICE_START",
+    "SERVICE_END",
+    "DROPPED_QUEUE_FULL",
+    "DROPPED_RATE",
+    "DROPPED_RATE_TIMEOUT",
+    "DROPPED_REJECT",
+    "TIMEOUT",
+    "RETRY",
+)
+(ARRIVAL, SERVICE_START, SERVICE_END,
+ DROPPED_QUEUE_FULL, DROPPED_RATE, DROPPED_RATE_TIMEOUT, DROPPED_REJECT,
+ TIMEOUT, RETRY) = range(len(EVENT_NAMES))
+EVENT_CODES = {name: code for code, name in enumerate(EVENT_NAMES)}
+# Отказы сервера при допуске; TIMEOUT (клиент перестал ждать) и RETRY
+# (повторная попытка, записывается перед ее ARRIVAL) - события клиента
+DROP_CODES = (DROPPED_QUEUE_FULL, DROPPED_RATE, DROPPED_RATE_TIMEOUT, DROPPED_REJECT)
+PLOT_BINS = 600
+
+
+# Журнал событий в виде растущих типизированных массивов:
+# время (float64), код события (int8), номер запроса (int64) - 17 байт на событие.
+# every > 1 - в журнал попадают все события каждого every-го запроса.
+class EventLog:
+    def __init__(self, every=1, enabled=True):
+        self.time = array("d")
+        self.code = array("b")
+        self.req_id = array("q")
+        self.every = max(1, int(every))
+        self.enabled = bool(enabled)
+
+    @classmethod
+    def from_config(cls, cfg):
+        return cls(every=cfg.get("event_log_every", 1), enabled=cfg.get("event_log", True))
+
+    @classmethod
+    def from_arrays(cls, time, code, req_id, every=1, enabled=True):
+        log = cls(every=every, enabled=enabled)
+        if not log.enabled:
+            return log
+        time = np.asarray(time, dtype=np.float64)
+        code = np.asarray(code, dtype=np.int8)
+        req_id = np.asarray(req_id, dtype=np.int64)
+        if log.every > 1:
+            keep = req_id % log.every == 0
+            time, code, req_id = time[keep], code[keep], req_id[keep]
+        log.time.frombytes(time.tobytes())
+        log.code.frombytes(code.tobytes())
+        log.req_id.frombytes(req_id.tobytes())
+        return log
+
+    def append(self, t, code, req_id):
+        if not self.enabled or req_id % self.every:
+            return
+        self.time.append(t)
+        self.code.append(code)
+        self.req_id.append(req_id)
+
+    # Накопленные события отдельным журналом; сам журнал очищается
+    # (потоковый режим: память не растет с длительностью прогона)
+    def drain(self):
+        out = EventLog(self.every, self.enabled)
+        out.time, out.code, out.req_id = self.time, self.code, self.req_id
+        self.time, self.code, self.req_id = array("d"), array("b"), array("q")
+        return out
+
+    def __len__(self):
+        return len(self.time)
+
+    # Совместимость со старым форматом: кортежи (время, "СОБЫТИЕ", id)
+    def __iter__(self):
+        for t, c, i in zip(self.time, self.code, self.req_id):
+            yield t, EVENT_NAMES[c], i
+
+    # Число событий с кодами codes (все события, если codes=None)
+    def count(self, codes=None):
+        if codes is None:
+            return len(self)
+        return int(np.count_nonzero(np.isin(self.columns()[1], codes)))
+
+    # Столбцы как массивы NumPy без копирования
+    def columns(self):
+        return (
+            np.frombuffer(self.time, dtype=np.float64) if len(self) else np.empty(0, dtype=np.float64),
+            np.frombuffer(self.code, dtype=np.int8) if len(self) else np.empty(0, dtype=np.int8),
+            np.frombuffer(self.req_id, dtype=np.int64) if len(self) else np.empty(0, dtype=np.int64),
+        )
+
+    # Моменты событий с указанными кодами
+    def times_of(self, *codes):
+        time, code, _ = self.columns()
+        return time[np.isin(code, codes)]
+
+    # Страница журнала: события start..stop (среди событий с кодами codes, если заданы).
+    # Таблица строится только для страницы, поэтому время не зависит от размера журнала.
+    def to_pandas(self, start=0, stop=None, codes=None):
+        import pandas as pd
+        time, code, req_id = self.columns()
+        if codes is not None:
+            rows = np.flatnonzero(np.isin(code, codes))[start:stop]
+            time, code, req_id = time[rows], code[rows], req_id[rows]
+        else:
+            time, code, req_id = time[start:stop], code[start:stop], req_id[start:stop]
+        return pd.DataFrame({
+            "time": time,
+            "event": pd.Categorical.from_codes(code, categories=EVENT_NAMES),
+            "id": req_id,
+        })
+
+    def to_arrow(self):
+        import pyarrow as pa
+        time, code, req_id = self.columns()
+        return pa.table({
+            "time": pa.array(time),
+            "event": pa.DictionaryArray.from_arrays(pa.array(code), pa.array(EVENT_NAMES)),
+            "id": pa.array(req_id),
+        })
+
+    # path - путь или файловый объект
+    def to_parquet(self, path, **kwargs):
+        import pyarrow.parquet as pq
+        pq.write_table(self.to_arrow(), path, **kwargs)
+
+
+# Число событий каждого типа по bins равным интервалам [0, sim_time): O(1) на
+# событие, размер не зависит от числа событий. Считаются все события, даже при
+# прореживании или отключении журнала. Графики строятся по этим сводкам, а не по журналу.
+class EventBins:
+    __slots__ = ("bins", "width", "counts")
+
+    def __init__(self, sim_time, bins=PLOT_BINS):
+        self.bins = max(1, int(bins))
+        self.width = float(sim_time) / self.bins
+        self.counts = [0] * (self.bins * len(EVENT_NAMES))
+
+    @classmethod
+    def from_config(cls, cfg):
+        return cls(cfg["sim_time"], cfg.get("plot_bins", PLOT_BINS))
+
+    def add(self, t, code):
+        b = int(t / self.width)
+        self.counts[(b if b < self.bins else self.bins - 1) * len(EVENT_NAMES) + code] += 1
+
+    # Массивы моментов и кодов (векторизованный движок)
+    def add_many(self, times, codes):
+        b = np.minimum((np.asarray(times, dtype=float) / self.width).astype(np.int64), self.bins - 1)
+        flat = np.bincount(b * len(EVENT_NAMES) + np.asarray(codes, dtype=np.int64),
+                           minlength=len(self.counts))
+        self.counts = (np.asarray(self.counts) + flat).tolist()
+
+    # Ожидаемые числа событий при постоянных интенсивностях {код: событий/сек} (аналитический движок)
+    @classmethod
+    def from_rates(cls, sim_time, bins, rates):
+        out = cls(sim_time, bins)
+        counts = np.zeros((out.bins, len(EVENT_NAMES)))
+        for code, rate in rates.items():
+            counts[:, code] = rate * out.width
+        out.counts = counts.ravel().tolist()
+        return out
+
+    def edges(self):
+        return np.linspace(0.0, self.width * self.bins, self.bins + 1)
+
+    # Числа событий по типам и накопленные кривые поступивших, обработанных и отклоненных
+    def to_dict(self):
+        c = np.asarray(self.counts).reshape(self.bins, len(EVENT_NAMES))
+        return {
+            "edges": self.edges().tolist(),
+            "counts": {name: c[:, code].tolist() for code, name in enumerate(EVENT_NAMES)},
+            "cumulative": {
+                "arrivals": np.cumsum(c[:, ARRIVAL]).tolist(),
+                "processed": np.cumsum(c[:, SERVICE_END]).tolist(),
+                "dropped": np.cumsum(c[:, list(DROP_CODES)].sum(axis=1)).tolist(),
+            },
+        }
@@ -0,0 +1,183 @@
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+import simpy
+from exper_events import EVENT_NAMES, EVENT_CODES, DROP_CODES
+
+# Режимы захвата профиля прогона: cProfile (время по функциям)
+# или tracemalloc (выделения памяти по строкам кода)
+PROFILE_MODES = (None, "cprofile", "tracemalloc")
+
+# События, на которые можно подписаться; "DROP" - любой отказ
+HOOK_EVENTS = ("ARRIVAL", "SERVICE_START", "SERVICE_END", "DROP", "TIMEOUT", "RETRY")
+
+# Сколько строк профиля попадает в результаты
+PROFILE_TOP = 25
+
+
+# Окружение SimPy, которое считает созданные процессы, таймауты и шаги планировщика
+class CountingEnvironment(simpy.Environment):
+    def __init__(self, counters, initial_time=0):
+        super().__init__(initial_time)
+        self.counters = counters
+
+    def process(self, generator):
+        self.counters["processes"] += 1
+        return super().process(generator)
+
+    def timeout(self, delay=0, value=None):
+        self.counters["timeouts"] += 1
+        return super().timeout(delay, value)
+
+    def step(self):
+        self.counters["sim_events"] += 1
+        super().step()
+
+
+def _hook_table(hooks):
+    table = [[] for _ in EVENT_NAMES]
+    for name, fns in (hooks or {}).items():
+        if name not in HOOK_EVENTS:
+            raise ValueError(f"Неизвестное событие для подписки: {name!r}, допустимы {HOOK_EVENTS}")
+        if callable(fns):
+            fns = [fns]
+        codes = DROP_CODES if name == "DROP" else (EVENT_CODES[name],)
+        for code in codes:
+            table[code].extend(fns)
+    return tuple(tuple(fns) for fns in table)
+
+
+# Сбор диагностики одного прогона: время этапов, счетчики, подписчики на события
+# и профиль. Создается только по запросу, поэтому обычный прогон не замедляется.
+# Подписчик вызывается как fn(время, "СОБЫТИЕ", id) для каждого события,
+# независимо от event_log и event_log_every.
+class Instrumentation:
+    def __init__(self, profile=None, hooks=None, top=PROFILE_TOP):
+        if profile not in PROFILE_MODES:
+            raise ValueError(f"Неизвестный режим профилирования: {profile!r}, допустимы {PROFILE_MODES}")
+        self.profile = profile
+        self.top = int(top)
+        self.hooks = _hook_table(hooks)
+        self.phases = {}
+        self.counters = defaultdict(int)
+        self.wall_time = 0.0
+        self.profile_data = None
+        self._last = None
+
+    @classmethod
+    def from_config(cls, cfg, hooks=None):
+        profile = cfg.get("profile")
+        if not cfg.get("instrument") and profile is None and not hooks:
+            return None
+        return cls(profile, hooks, cfg.get("profile_top", PROFILE_TOP))
+
+    @property
+    def has_hooks(self):
+        return any(self.hooks)
+
+    # Завершение этапа: время с конца предыдущего этапа (или начала захвата)
+    def lap(self, name):
+        now = time.perf_counter()
+        self.phases[name] = self.phases.get(name, 0.0) + now - self._last
+        self._last = now
+
+    # Обертка функции генерации блока: накапливает время этапа и число вызовов.
+    # Этап вложен в тот, во время которого вызывается функция.
+    def timed(self, name, fn, counter=None):
+        phases = self.phases
+        counters = self.counters
+
+        def wrapper(*args):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                phases[name] = phases.get(name, 0.0) + time.perf_counter() - t0
+                if counter:
+                    counters[counter] += 1
+        return wrapper
+
+    def environment(self):
+        return CountingEnvironment(self.counters)
+
+    # Обертка записи в журнал: счетчик событий и вызов подписчиков
+    def wrap_log(self, append):
+        hooks = self.hooks
+        counters = self.counters
+
+        def log_event(t, code, req_id):
+            counters["events_emitted"] += 1
+            append(t, code, req_id)
+            for fn in hooks[code]:
+                fn(t, EVENT_NAMES[code], req_id)
+        return log_event
+
+    @contextmanager
+    def capture(self):
+        start = time.perf_counter()
+        self._last = start
+        if self.profile == "cprofile":
+            prof = cProfile.Profile()
+            prof.enable()
+            try:
+                yield self
+            finally:
+                prof.disable()
+                self.wall_time = time.perf_counter() - start
+                self.profile_data = self._cprofile_report(prof)
+        elif self.profile == "tracemalloc":
+            started = not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            try:
+                yield self
+            finally:
+                self.wall_time = time.perf_counter() - start
+                self.profile_data = self._tracemalloc_report(tracemalloc.take_snapshot())
+                if started:
+                    tracemalloc.stop()
+        else:
+            try:
+                yield self
+            finally:
+                self.wall_time = time.perf_counter() - start
+
+    def _cprofile_report(self, prof):
+        text = io.StringIO()
+        stats = pstats.Stats(prof, stream=text).sort_stats("tottime")
+        stats.print_stats(self.top)
+        rows = []
+        for (filename, line, func), (cc, nc, tt, ct, _) in stats.stats.items():
+            rows.append({
+                "function": f"{filename}:{line}({func})",
+                "ncalls": nc,
+                "tottime": tt,
+                "cumtime": ct,
+            })
+        rows.sort(key=lambda r: r["tottime"], reverse=True)
+        return {"functions": rows[:self.top], "text": text.getvalue()}
+
+    def _tracemalloc_report(self, snapshot):
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = snapshot.filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+        rows = [{
+            "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "size": stat.size,
+            "count": stat.count,
+        } for stat in snapshot.statistics("lineno")[:self.top]]
+        return {"current_bytes": current, "peak_bytes": peak, "allocations": rows}
+
+    # Словарь для results["instrumentation"]; только встроенные типы
+    def report(self):
+        return {
+            "wall_time": self.wall_time,
+            "phases": dict(self.phases),
+            "counters": dict(self.counters),
+            "profile": self.profile,
+            "profile_data": self.profile_data,
+        }
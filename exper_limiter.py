@@ -0,0 +1,162 @@
+import math
+
+# Ограничители скорости для стратегии "rate_limit". Состояние каждого
+# пересчитывается в момент поступления запроса за O(1), без событий модели:
+#   token_bucket   - ведро токенов емкостью burst, пополняется со скоростью rate;
+#   gcra           - то же ведро в форме теоретического времени прибытия (GCRA):
+#                    одно число вместо токенов и момента пополнения;
+#   leaky_bucket   - дырявое ведро емкостью burst, вытекает со скоростью rate;
+#                    при формировании трафика запросы выходят равномерно, без пачек;
+#   sliding_window - не больше rate * window запросов в любом окне длиной window
+#                    (кольцевой журнал моментов допуска последних запросов).
+# В режиме "police" запрос без токена сразу отклоняется. В режиме "shape"
+# запрос ждет своей очереди не больше max_delay секунд, иначе отклоняется.
+# admit(now) возвращает True и задержку в атрибуте delay или False.
+# Ведро токенов и GCRA начинают прогон с min(rate, burst) токенов,
+# дырявое ведро и окно - пустыми.
+RATE_LIMITERS = ("token_bucket", "gcra", "leaky_bucket", "sliding_window")
+RATE_LIMIT_MODES = ("police", "shape")
+
+
+def check_limiter(cfg):
+    if cfg["rate_limiter"] not in RATE_LIMITERS:
+        raise ValueError(f"Неизвестный ограничитель скорости: {cfg['rate_limiter']!r}, допустимы {RATE_LIMITERS}")
+    if cfg["rate_limit_mode"] not in RATE_LIMIT_MODES:
+        raise ValueError(f"Неизвестный режим ограничения: {cfg['rate_limit_mode']!r}, допустимы {RATE_LIMIT_MODES}")
+    if cfg["rate_limit_burst"] is not None and cfg["rate_limit_burst"] < 1:
+        raise ValueError("Емкость ведра rate_limit_burst должна быть не меньше 1")
+    if cfg["rate_limit_max_delay"] < 0 or cfg["rate_limit_window"] <= 0:
+        raise ValueError("Нужно rate_limit_max_delay >= 0 и rate_limit_window > 0")
+
+
+def burst_size(cfg):
+    burst = cfg["rate_limit_burst"]
+    return cfg["rate_limit_rps"] * 2.0 if burst is None else float(burst)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "max_delay", "tokens", "last", "delay")
+
+    def __init__(self, rate, burst, max_delay=0.0):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.max_delay = float(max_delay)
+        self.tokens = min(self.rate, self.burst)
+        self.last = 0.0
+        self.delay = 0.0
+
+    def admit(self, now):
+        if self.rate <= 0:
+            self.last = now
+            return False
+        elapsed = now - self.last
+        if elapsed > 0:
+            self.tokens = min(self.tokens + elapsed * self.rate, self.burst)
+            self.last = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            self.delay = 0.0
+            return True
+        # Формирование: токен резервируется заранее, запас уходит в минус
+        delay = (1.0 - self.tokens) / self.rate
+        if delay > self.max_delay:
+            return False
+        self.tokens -= 1.0
+        self.delay = delay
+        return True
+
+
+class GCRA:
+    __slots__ = ("period", "tolerance", "max_delay", "tat", "delay")
+
+    def __init__(self, rate, burst, max_delay=0.0):
+        self.period = 1.0 / rate if rate > 0 else math.inf
+        self.tolerance = (float(burst) - 1.0) * self.period if rate > 0 else 0.0
+        self.max_delay = float(max_delay)
+        # Как у ведра токенов: в начале min(rate, burst) токенов
+        self.tat = (float(burst) - min(float(rate), float(burst))) * self.period if rate > 0 else 0.0
+        self.delay = 0.0
+
+    def admit(self, now):
+        if self.period == math.inf:
+            return False
+        tat = self.tat if self.tat > now else now
+        delay = tat - self.tolerance - now
+        if delay <= 0:
+            delay = 0.0
+        elif delay > self.max_delay:
+            return False
+        self.tat = tat + self.period
+        self.delay = delay
+        return True
+
+
+class LeakyBucket:
+    __slots__ = ("rate", "burst", "max_delay", "shape", "level", "last", "delay")
+
+    def __init__(self, rate, burst, max_delay=0.0, shape=False):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.max_delay = float(max_delay)
+        self.shape = bool(shape)
+        self.level = 0.0
+        self.last = 0.0
+        self.delay = 0.0
+
+    def admit(self, now):
+        if self.rate <= 0:
+            return False
+        if now > self.last:
+            self.level = max(0.0, self.level - (now - self.last) * self.rate)
+            self.last = now
+        if self.level + 1.0 > self.burst:
+            return False
+        # При формировании запрос выходит, когда вытекут стоящие перед ним
+        delay = self.level / self.rate if self.shape else 0.0
+        if delay > self.max_delay:
+            return False
+        self.level += 1.0
+        self.delay = delay
+        return True
+
+
+class SlidingWindow:
+    __slots__ = ("window", "max_delay", "log", "pos", "delay")
+
+    def __init__(self, rate, window, max_delay=0.0):
+        self.window = float(window)
+        self.max_delay = float(max_delay)
+        limit = max(1, int(round(rate * window))) if rate > 0 else 0
+        self.log = [-math.inf] * limit
+        self.pos = 0
+        self.delay = 0.0
+
+    def admit(self, now):
+        if not self.log:
+            return False
+        # Запрос, допущенный limit запросов назад, должен выйти из окна
+        start = self.log[self.pos] + self.window
+        delay = start - now if start > now else 0.0
+        if delay > self.max_delay:
+            return False
+        self.log[self.pos] = now + delay
+        self.pos = (self.pos + 1) % len(self.log)
+        self.delay = delay
+        return True
+
+
+# shape=False - отклонение без ожидания независимо от rate_limit_mode
+def make_limiter(cfg, shape=None):
+    check_limiter(cfg)
+    if shape is None:
+        shape = cfg["rate_limit_mode"] == "shape"
+    rate = float(cfg["rate_limit_rps"])
+    max_delay = float(cfg["rate_limit_max_delay"]) if shape else 0.0
+    kind = cfg["rate_limiter"]
+    if kind == "token_bucket":
+        return TokenBucket(rate, burst_size(cfg), max_delay)
+    if kind == "gcra":
+        return GCRA(rate, burst_size(cfg), max_delay)
+    if kind == "leaky_bucket":
+        return LeakyBucket(rate, burst_size(cfg), max_delay, shape)
+    return SlidingWindow(rate, cfg["rate_limit_window"], max_delay)
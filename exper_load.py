@@ -0,0 +1,317 @@
+import math
+import os
+import numpy as np
+
+# Нестационарная нагрузка (arrival_dist="profile"): неоднородный пуассоновский
+# поток с интенсивностью lambda(t) запросов в секунду. Профили load_profile:
+#   piecewise   - ломаная по точкам (время, интенсивность); повтор момента
+#                 задает скачок;
+#   spline      - монотонный кубический сплайн (PCHIP) по тем же точкам: гладкий
+#                 и без выбросов за значения соседних точек;
+#   ramp        - линейный рост от arrival_rate до load_peak_rate за load_duration
+#                 секунд с момента load_start, далее load_peak_rate;
+#   step        - load_peak_rate на [load_start, load_start + load_duration),
+#                 иначе arrival_rate; load_duration=None - до конца прогона;
+#   sinusoidal  - arrival_rate + load_amplitude * sin(2pi (t - load_start) / load_period),
+#                 но не меньше 0 (суточный цикл);
+#   flash_crowd - наплыв: с load_start линейный рост от arrival_rate до
+#                 load_peak_rate за load_rise секунд, load_duration секунд на пике,
+#                 затем экспоненциальный спад к arrival_rate с постоянной load_decay.
+# Точки для piecewise и spline берутся из load_points или из CSV load_path
+# (столбцы load_time_column и load_rate_column, время от первой строки).
+# Время точек делится на load_time_scale (сутки можно сжать в минуты), интенсивность
+# умножается на load_rate_scale. После последней точки держится последнее значение.
+# load_period - профиль повторяется с этим периодом (для sinusoidal - период синусоиды).
+#
+# Профиль хранится как ломаная по узлам: интенсивность монотонна между соседними
+# узлами, поэтому максимум на участке - в одном из его концов. Гладкие профили
+# (spline, sinusoidal, flash_crowd) заменяются ломаной по частой сетке узлов.
+# Способы генерации load_sampling, оба блоками без событий модели:
+#   thinning  - прореживание: кандидаты из потока с кусочно-постоянной
+#               интенсивностью max(lambda) на участке, кандидат в момент t
+#               остается с вероятностью lambda(t) / max; точен для любого профиля;
+#   inversion - обращение: моменты единичного пуассоновского потока переводятся
+#               во время через обратную к Lambda(t) = интеграл lambda; Lambda ломаной
+#               обращается точно, поэтому метод точен для piecewise, ramp и step,
+#               а для гладких профилей - с погрешностью сетки узлов.
+# Первый запрос, как и у остальных потоков, поступает в момент 0.
+LOAD_PROFILES = ("piecewise", "spline", "ramp", "step", "sinusoidal", "flash_crowd")
+LOAD_SAMPLING = ("thinning", "inversion")
+# Участков сетки на период синусоиды и на один участок сплайна
+_SINE_KNOTS = 256
+_SPLINE_KNOTS = 16
+# Спад наплыва описывается узлами на load_decay * _DECAY_SPAN секунд
+_DECAY_SPAN = 12.0
+_DECAY_KNOTS = 96
+# Кандидатов в одном блоке генерации (не зависит от числа запрошенных значений)
+_BLOCK = 4096
+
+
+def check_load(cfg):
+    kind = cfg["load_profile"]
+    if kind not in LOAD_PROFILES:
+        raise ValueError(f"Неизвестный профиль нагрузки: {kind!r}, допустимы {LOAD_PROFILES}")
+    if cfg["load_sampling"] not in LOAD_SAMPLING:
+        raise ValueError(f"Неизвестный способ генерации профиля: {cfg['load_sampling']!r}, допустимы {LOAD_SAMPLING}")
+    if cfg["load_period"] is not None and cfg["load_period"] <= 0:
+        raise ValueError("Период профиля load_period должен быть положительным или None")
+    if kind in ("piecewise", "spline"):
+        if cfg["load_time_scale"] <= 0 or cfg["load_rate_scale"] < 0:
+            raise ValueError("Нужно load_time_scale > 0 и load_rate_scale >= 0")
+        return
+    if cfg["arrival_rate"] < 0 or cfg["load_peak_rate"] < 0:
+        raise ValueError("Интенсивности arrival_rate и load_peak_rate не могут быть отрицательными")
+    if cfg["load_start"] < 0:
+        raise ValueError("Момент начала load_start не может быть отрицательным")
+    if kind == "sinusoidal" and cfg["load_period"] is None:
+        raise ValueError("Для профиля sinusoidal нужен период load_period")
+    if kind == "ramp" and not cfg["load_duration"]:
+        raise ValueError("Для профиля ramp нужна положительная длительность роста load_duration")
+    if cfg["load_duration"] is not None and cfg["load_duration"] < 0:
+        raise ValueError("Длительность load_duration не может быть отрицательной")
+    if kind == "flash_crowd" and (cfg["load_rise"] < 0 or cfg["load_decay"] <= 0 or cfg["load_duration"] is None):
+        raise ValueError("Для профиля flash_crowd нужны load_rise >= 0, load_decay > 0 и load_duration")
+
+
+# Точки (время, интенсивность) из load_points или CSV
+def load_points(cfg):
+    if cfg.get("load_path"):
+        import pandas as pd
+        df = pd.read_csv(cfg["load_path"], usecols=[cfg["load_time_column"], cfg["load_rate_column"]])
+        t = df[cfg["load_time_column"]].to_numpy(dtype=np.float64)
+        r = df[cfg["load_rate_column"]].to_numpy(dtype=np.float64)
+        t = t - t[0] if len(t) else t
+    elif cfg.get("load_points"):
+        pts = np.asarray(cfg["load_points"], dtype=np.float64).reshape(-1, 2)
+        t, r = pts[:, 0], pts[:, 1]
+    else:
+        raise ValueError("Для профилей piecewise и spline нужны точки load_points или файл load_path")
+    if len(t) == 0 or np.any(~np.isfinite(t)) or np.any(~np.isfinite(r)):
+        raise ValueError("Точки профиля нагрузки должны быть конечными числами")
+    if np.any(np.diff(t) < 0) or t[0] < 0:
+        raise ValueError("Моменты точек профиля должны быть неотрицательными и идти по неубыванию")
+    if np.any(r < 0):
+        raise ValueError("Интенсивность в точках профиля не может быть отрицательной")
+    return t / float(cfg["load_time_scale"]), r * float(cfg["load_rate_scale"])
+
+
+# Журнал точек мог измениться при том же пути
+def load_signature(cfg):
+    if not cfg.get("load_path"):
+        return None
+    st = os.stat(cfg["load_path"])
+    return [st.st_size, st.st_mtime_ns]
+
+
+# Интенсивность, заданная ломаной по узлам t, r; после последнего узла - tail
+def _linear(t, r, tail):
+    def rate(x):
+        x = np.asarray(x, dtype=np.float64)
+        return np.where(x > t[-1], tail, np.interp(x, t, r))
+    return rate
+
+
+class LoadProfile:
+    __slots__ = ("t", "r", "tail", "period", "rate_fn", "slope", "cum", "peak", "peak_cum", "peak_tail",
+                 "total", "peak_total")
+
+    # t, r - узлы ломаной (t[0] = 0), tail - интенсивность после последнего узла,
+    # rate_fn - точная интенсивность на [0, period) или [0, inf)
+    def __init__(self, t, r, tail, rate_fn, period=None):
+        self.t = np.asarray(t, dtype=np.float64)
+        self.r = np.asarray(r, dtype=np.float64)
+        self.tail = float(tail)
+        self.period = None if period is None else float(period)
+        self.rate_fn = rate_fn
+        h = np.diff(self.t)
+        self.slope = np.divide(np.diff(self.r), h, out=np.zeros_like(h), where=h > 0)
+        self.cum = np.concatenate(([0.0], np.cumsum(h * (self.r[:-1] + self.r[1:]) / 2.0)))
+        # Мажоранта для прореживания: максимум на участке - в одном из концов
+        self.peak = np.maximum(self.r[:-1], self.r[1:])
+        self.peak_cum = np.concatenate(([0.0], np.cumsum(h * self.peak)))
+        self.peak_tail = max(self.tail, float(self.r[-1]))
+        if self.period is not None:
+            self.total = self.cum[-1] + self.tail * (self.period - self.t[-1])
+            self.peak_total = self.peak_cum[-1] + self.peak_tail * (self.period - self.t[-1])
+            if self.total <= 0:
+                raise ValueError("Интенсивность профиля нагрузки равна нулю на всем периоде")
+        else:
+            self.total = self.peak_total = None
+
+    def _local(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        return x if self.period is None else np.mod(x, self.period)
+
+    # Точная интенсивность lambda(x)
+    def rate(self, x):
+        return np.maximum(0.0, self.rate_fn(self._local(x)))
+
+    # Мажоранта интенсивности в момент x
+    def majorant(self, x):
+        x = self._local(x)
+        j = np.clip(np.searchsorted(self.t, x, side="right") - 1, 0, len(self.peak) - 1)
+        return np.where(x >= self.t[-1], self.peak_tail, self.peak[j])
+
+    # Lambda(x) - ожидаемое число запросов на [0, x) (без запроса в момент 0)
+    def cumulative(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        k = 0.0
+        if self.period is not None:
+            k = np.floor(x / self.period)
+            x = x - k * self.period
+            k = k * self.total
+        j = np.clip(np.searchsorted(self.t, x, side="right") - 1, 0, len(self.slope) - 1)
+        s = np.minimum(x, self.t[-1]) - self.t[j]
+        inside = self.cum[j] + self.r[j] * s + 0.5 * self.slope[j] * s * s
+        return k + inside + self.tail * np.maximum(0.0, x - self.t[-1])
+
+    # Моменты, в которых накопленная интенсивность (ломаной или мажоранты) равна y
+    def _invert(self, y, cum, r0, slope, tail, total):
+        k = 0.0
+        if self.period is not None:
+            k = np.floor(y / total)
+            y = y - k * total
+            k = k * self.period
+        j = np.clip(np.searchsorted(cum, y, side="right") - 1, 0, len(r0) - 1)
+        d = np.minimum(y, cum[-1]) - cum[j]
+        # Корень r0 s + slope s^2 / 2 = d в устойчивой форме
+        denom = r0[j] + np.sqrt(np.maximum(0.0, r0[j] ** 2 + 2.0 * slope[j] * d))
+        s = np.divide(2.0 * d, denom, out=np.zeros_like(d), where=denom > 0)
+        over = np.maximum(0.0, y - cum[-1])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            after = np.where(over > 0, over / tail if tail > 0 else np.inf, 0.0)
+        return k + np.minimum(self.t[j] + s, self.t[j + 1]) + after
+
+    def invert(self, y):
+        return self._invert(y, self.cum, self.r[:-1], self.slope, self.tail, self.total)
+
+    def invert_majorant(self, y):
+        return self._invert(y, self.peak_cum, self.peak, np.zeros_like(self.peak), self.peak_tail,
+                            self.peak_total)
+
+
+def _sine(base, amplitude, start, period):
+    def rate(x):
+        return base + amplitude * np.sin(2.0 * math.pi * (np.asarray(x, dtype=np.float64) - start) / period)
+    # Экстремумы синусоиды - среди узлов, между узлами она монотонна
+    grid = np.linspace(0.0, period, 4 * _SINE_KNOTS + 1)
+    quarter = period / 4.0
+    extrema = np.mod(start + quarter * np.arange(4), period)
+    t = np.unique(np.concatenate((grid, extrema)))
+    return t, rate
+
+
+def _flash_crowd(base, peak, start, rise, hold, decay):
+    top = start + rise + hold
+
+    def rate(x):
+        x = np.asarray(x, dtype=np.float64)
+        up = base + (peak - base) * np.clip((x - start) / rise, 0.0, 1.0) if rise > 0 else np.where(x >= start, peak, base)
+        down = base + (peak - base) * np.exp(-np.maximum(0.0, x - top) / decay)
+        return np.where(x < start, base, np.where(x <= top, up, down))
+    t = np.concatenate(([0.0, start, start, start + rise], top + decay * np.linspace(0.0, _DECAY_SPAN, _DECAY_KNOTS + 1)))
+    r = rate(t)
+    r[1] = base
+    return t, r, rate
+
+
+# Профиль по конфигурации
+def make_profile(cfg):
+    check_load(cfg)
+    kind = cfg["load_profile"]
+    period = cfg["load_period"]
+    if kind in ("piecewise", "spline"):
+        t, r = load_points(cfg)
+        if t[0] > 0:
+            t, r = np.concatenate(([0.0], t)), np.concatenate(([r[0]], r))
+        if len(t) == 1:
+            t, r = np.array([0.0, 1.0]), np.array([r[0], r[0]])
+        if period is not None and t[-1] > period:
+            raise ValueError("Точки профиля не должны выходить за период load_period")
+        tail = float(r[-1])
+        if kind == "piecewise":
+            return LoadProfile(t, r, tail, _linear(t, r, tail), period)
+        if np.any(np.diff(t) <= 0):
+            raise ValueError("Для профиля spline моменты точек должны строго возрастать")
+        from scipy.interpolate import PchipInterpolator
+        spline = PchipInterpolator(t, r, extrapolate=False)
+        last = t[-1]
+
+        def rate(x):
+            return spline(np.clip(x, 0.0, last))
+        fine = np.unique(np.concatenate([np.linspace(a, b, _SPLINE_KNOTS + 1) for a, b in zip(t[:-1], t[1:])]))
+        return LoadProfile(fine, np.maximum(0.0, spline(fine)), tail, rate, period)
+
+    base = float(cfg["arrival_rate"])
+    peak = float(cfg["load_peak_rate"])
+    start = float(cfg["load_start"])
+    duration = cfg["load_duration"]
+    if kind == "ramp":
+        t = [0.0, start, start + float(duration)]
+        r = [base, base, peak]
+        return LoadProfile(t, r, peak, _linear(np.array(t), np.array(r), peak), period)
+    if kind == "step":
+        if duration is None:
+            t, r, tail = [0.0, start, start], [base, base, peak], peak
+        else:
+            end = start + float(duration)
+            t, r, tail = [0.0, start, start, end, end], [base, base, peak, peak, base], base
+        return LoadProfile(t, r, tail, _linear(np.array(t), np.array(r), tail), period)
+    if kind == "sinusoidal":
+        t, rate = _sine(base, float(cfg["load_amplitude"]), start, float(period))
+        return LoadProfile(t, np.maximum(0.0, rate(t)), float(max(0.0, rate(t[-1]))), rate, period)
+    t, r, rate = _flash_crowd(base, peak, start, float(cfg["load_rise"]), float(duration), float(cfg["load_decay"]))
+    return LoadProfile(t, r, base, rate, period)
+
+
+# Генератор интервалов между запросами неоднородного потока. Кандидаты
+# генерируются блоками фиксированного размера, поэтому последовательность
+# не зависит от того, сколько значений запрашивается за раз.
+# exponential(n), uniform(n) - блоки случайных величин потока поступлений.
+class ProfileArrivals:
+    __slots__ = ("profile", "thinning", "exponential", "uniform", "level", "last", "pending", "done")
+
+    def __init__(self, profile, method, exponential, uniform):
+        self.profile = profile
+        self.thinning = method == "thinning"
+        self.exponential = exponential
+        self.uniform = uniform
+        self.level = 0.0
+        self.last = 0.0
+        self.pending = np.empty(0)
+        self.done = False
+
+    def _block(self):
+        y = self.level + np.cumsum(self.exponential(_BLOCK))
+        self.level = y[-1]
+        if not self.thinning:
+            times = self.profile.invert(y)
+        else:
+            times = self.profile.invert_majorant(y)
+            u = self.uniform(_BLOCK)
+            finite = np.isfinite(times)
+            keep = np.zeros(len(times), dtype=bool)
+            keep[finite] = u[finite] * self.profile.majorant(times[finite]) < self.profile.rate(times[finite])
+            times = times[keep | ~finite]
+        if len(times) and not np.isfinite(times[-1]):
+            # Интенсивность после последнего узла нулевая: запросов больше нет
+            self.done = True
+            times = times[np.isfinite(times)]
+        return times
+
+    def __call__(self, n):
+        parts, have = [self.pending], len(self.pending)
+        while have < n and not self.done:
+            parts.append(self._block())
+            have += len(parts[-1])
+        if len(parts) > 1:
+            self.pending = np.concatenate(parts)
+        times = self.pending[:n]
+        self.pending = self.pending[n:]
+        if len(times) < n:
+            times = np.concatenate((times, np.full(n - len(times), np.inf)))
+        with np.errstate(invalid="ignore"):
+            gaps = np.diff(np.concatenate(([self.last], times)))
+        gaps[np.isinf(times)] = np.inf
+        self.last = times[-1]
+        return gaps
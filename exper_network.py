@@ -0,0 +1,434 @@
+import heapq
+import math
+from bisect import bisect_right
+from collections import deque
+import numpy as np
+import exper_trace
+from exper_client import client_results
+from exper_limiter import make_limiter
+from exper_random import STREAMS, BlockSampler, interarrival_sampler, service_sampler
+from exper_stats import ResponseStats, TimeWeighted, Welford, time_series
+from exper_events import (EventLog, EventBins, ARRIVAL, SERVICE_START, SERVICE_END,
+                          DROPPED_QUEUE_FULL, DROPPED_RATE, DROPPED_REJECT)
+
+# Сеть сервисов (cfg["tiers"]): шлюз -> приложение -> база данных и т.п.
+# Каждый уровень - словарь:
+#   name        - имя уровня (обязательно);
+#   servers     - число обработчиков (по умолчанию num_servers);
+#   strategy, queue_size, rate_limit_rps, rate_limiter, rate_limit_burst, rate_limit_window -
+#                 допуск запросов как в основной модели (ограничитель только отклоняет);
+#   service_dist, service_mean, service_std - время собственной обработки;
+#   routes      - {уровень: вероятность} вызова после обработки; остаток
+#                 вероятности - ответ вызывающему без дальнейших вызовов;
+#                 переходы не должны образовывать циклов;
+#   pool_size   - пул соединений к нижележащим уровням (None - без ограничения),
+#                 вызов ждет свободного соединения в очереди FIFO;
+#   hold        - обработчик занят, пока ждет ответа нижележащего уровня
+#                 (синхронный вызов); False - освобождается сразу (асинхронный).
+# Не заданные параметры берутся из общей конфигурации. Запросы поступают на первый
+# уровень; отказ на любом уровне возвращается по цепочке и считается отказом запроса.
+# Время отклика уровня - от поступления на уровень до ответа (с нижележащими вызовами).
+# Вместо процесса SimPy на каждый переход - собственный календарь событий на heapq:
+# одно событие на окончание обработки, остальное - прямые вызовы.
+
+TIER_STRATEGIES = ("queue", "reject", "rate_limit")
+_SERVICE_DONE = 0
+
+
+def tier_config(cfg, tier):
+    return {
+        "servers": cfg["num_servers"],
+        "strategy": cfg["strategy"],
+        "queue_size": cfg["queue_size"],
+        "rate_limit_rps": cfg["rate_limit_rps"],
+        "rate_limiter": cfg["rate_limiter"],
+        "rate_limit_burst": cfg["rate_limit_burst"],
+        "rate_limit_mode": cfg["rate_limit_mode"],
+        "rate_limit_max_delay": cfg["rate_limit_max_delay"],
+        "rate_limit_window": cfg["rate_limit_window"],
+        "service_dist": cfg["service_dist"],
+        "service_mean": cfg["service_mean"],
+        "service_std": cfg["service_std"],
+        "routes": {},
+        "pool_size": None,
+        "hold": True,
+        **tier,
+    }
+
+
+def check_tiers(cfg):
+    tiers = cfg.get("tiers")
+    if not tiers:
+        raise ValueError("Сеть сервисов должна содержать хотя бы один уровень")
+    names = [t.get("name") for t in tiers]
+    if None in names or len(set(names)) != len(names):
+        raise ValueError("У каждого уровня сети должно быть уникальное имя name")
+    for tier in tiers:
+        t = tier_config(cfg, tier)
+        if t["strategy"] not in TIER_STRATEGIES:
+            raise ValueError(f"Уровень {t['name']!r}: неизвестная стратегия {t['strategy']!r}")
+        if t["strategy"] == "rate_limit" and t["rate_limit_mode"] != "police":
+            raise ValueError(f"Уровень {t['name']!r}: в сети сервисов ограничитель скорости только отклоняет запросы")
+        if int(t["servers"]) < 1:
+            raise ValueError(f"Уровень {t['name']!r}: нужен хотя бы один обработчик")
+        probs = list(t["routes"].values())
+        if any(p < 0 for p in probs) or sum(probs) > 1.0 + 1e-9:
+            raise ValueError(f"Уровень {t['name']!r}: вероятности переходов должны быть >= 0 и в сумме <= 1")
+        for target in t["routes"]:
+            if target not in names:
+                raise ValueError(f"Уровень {t['name']!r}: переход на неизвестный уровень {target!r}")
+    # Вызовы идут только вниз: цикл переходов дал бы бесконечную цепочку вызовов
+    routes = {t["name"]: list(t.get("routes", {})) for t in tiers}
+    state = {}
+
+    def visit(name, path):
+        state[name] = 1
+        for target in routes[name]:
+            if state.get(target) == 1:
+                cycle = " -> ".join(path[path.index(target):] + [target])
+                raise ValueError(f"Цикл переходов между уровнями сети: {cycle}")
+            if target not in state:
+                visit(target, path + [target])
+        state[name] = 2
+    for name in names:
+        if name not in state:
+            visit(name, [name])
+
+
+# Состояние уровня и его статистика
+class _Tier:
+    __slots__ = ("name", "servers", "strategy", "queue_size", "limiter", "targets", "cum",
+                 "pool_size", "pool_used", "pool_wait", "hold", "busy", "queue", "next_service", "next_route",
+                 "queue_level", "busy_level", "pool_level", "wait_level", "response", "pool_wait_time",
+                 "arrivals", "dropped", "processed", "failed")
+
+    def __init__(self, cfg, t, index, service_rng, route_rng, history):
+        self.name = t["name"]
+        self.servers = int(t["servers"])
+        self.strategy = t["strategy"]
+        self.queue_size = None if t["queue_size"] is None else int(t["queue_size"])
+        self.limiter = make_limiter(t, shape=False) if self.strategy == "rate_limit" else None
+        self.targets = [index[name] for name in t["routes"]]
+        self.cum = np.cumsum(list(t["routes"].values())).tolist()
+        self.pool_size = None if t["pool_size"] is None else int(t["pool_size"])
+        self.pool_used = 0
+        self.pool_wait = deque()
+        self.hold = bool(t["hold"])
+        self.busy = 0
+        self.queue = deque()
+        tcfg = {**cfg, **t}
+        self.next_service = service_sampler(tcfg, service_rng)
+        self.next_route = BlockSampler(lambda n: route_rng.random(n))
+        self.queue_level = TimeWeighted(history=history)
+        self.busy_level = TimeWeighted(history=history)
+        self.pool_level = TimeWeighted(history=False)
+        self.wait_level = TimeWeighted(history=False)
+        self.response = ResponseStats(tcfg)
+        self.pool_wait_time = Welford()
+        self.arrivals = self.dropped = self.processed = self.failed = 0
+
+
+# Вызов уровня: номер запроса, уровень, момент поступления, вызывающий вызов,
+# время обработки из трассы и признак занятого обработчика
+class _Call:
+    __slots__ = ("id", "tier", "arrival", "parent", "service", "holding", "wait_start")
+
+    def __init__(self, req_id, tier, arrival, parent, service=None):
+        self.id = req_id
+        self.tier = tier
+        self.arrival = arrival
+        self.parent = parent
+        self.service = service
+        self.holding = False
+        self.wait_start = 0.0
+
+
+# Моменты внешних поступлений (и времена обработки из трассы) по порядку
+def _arrivals(cfg, rng, sim_time):
+    d = cfg["arrival_dist"]
+    if d == "trace":
+        for times, services in exper_trace.iter_trace(cfg):
+            services = services.tolist() if services is not None else [None] * len(times)
+            yield from zip(times.tolist(), services)
+        return
+    if d == "poisson_burst":
+        t = float(cfg["interburst_interval"])
+        while t < sim_time:
+            for _ in range(int(cfg["burst_size"])):
+                yield t, None
+            t += float(cfg["interburst_interval"])
+        return
+    next_interarrival = interarrival_sampler(cfg, rng)
+    t = 0.0
+    while t < sim_time:
+        yield t, None
+        t += next_interarrival()
+
+
+def model_network(cfg, instr=None):
+    check_tiers(cfg)
+    SIM_TIME = float(cfg["sim_time"])
+    tier_cfgs = [tier_config(cfg, t) for t in cfg["tiers"]]
+    index = {t["name"]: i for i, t in enumerate(tier_cfgs)}
+    history = cfg.get("state_history", True)
+
+    # Первые потоки совпадают с потоками основной модели: сеть из одного уровня
+    # без переходов воспроизводит model_env с тем же seed
+    children = np.random.SeedSequence(cfg.get("seed", 1234)).spawn(len(STREAMS) + 2 * len(tier_cfgs))
+    rngs = [np.random.default_rng(ss) for ss in children]
+    arrival_rng = rngs[STREAMS.index("arrival")]
+    tiers = []
+    for i, t in enumerate(tier_cfgs):
+        service_rng = rngs[STREAMS.index("service")] if i == 0 else rngs[len(STREAMS) + 2 * i]
+        tiers.append(_Tier(cfg, t, index, service_rng, rngs[len(STREAMS) + 2 * i + 1], history))
+
+    events = EventLog.from_config(cfg)
+    event_bins = EventBins.from_config(cfg) if cfg.get("plot_bins") else None
+    log_event = events.append
+    if event_bins is not None:
+        append, count = log_event, event_bins.add
+
+        def log_event(t, code, req_id):
+            count(t, code)
+            append(t, code, req_id)
+
+    calendar = []
+    seq = 0
+    stats = {"total_arrivals": 0, "processed": 0, "dropped": 0}
+    response_stats = ResponseStats({**cfg, **tier_cfgs[0]})
+    response_times = [] if cfg.get("keep_response_times") else None
+    total_queue = TimeWeighted(history=history)
+    total_busy = TimeWeighted(history=history)
+    service_sum = 0.0
+    service_count = 0
+
+    # Решение о допуске на уровень: код отказа или None
+    def admission(tier, now):
+        if tier.strategy == "rate_limit":
+            if tier.limiter.admit(now):
+                return None
+            return DROPPED_RATE
+        elif tier.strategy == "reject":
+            if tier.busy >= tier.servers:
+                return DROPPED_REJECT
+        elif tier.queue_size is not None and len(tier.queue) + tier.busy >= tier.queue_size + tier.servers:
+            return DROPPED_QUEUE_FULL
+        return None
+
+    def start_service(call, now):
+        nonlocal seq, service_sum, service_count
+        tier = tiers[call.tier]
+        tier.busy += 1
+        tier.busy_level.add(now, 1)
+        total_busy.add(now, 1)
+        call.holding = True
+        service = tier.next_service() if call.service is None else call.service
+        if call.parent is None:
+            log_event(now, SERVICE_START, call.id)
+            service_sum += service
+            service_count += 1
+        seq += 1
+        heapq.heappush(calendar, (now + service, seq, _SERVICE_DONE, call))
+
+    def release_worker(call, now):
+        tier = tiers[call.tier]
+        call.holding = False
+        tier.busy -= 1
+        tier.busy_level.add(now, -1)
+        total_busy.add(now, -1)
+        if tier.queue:
+            tier.queue_level.add(now, -1)
+            total_queue.add(now, -1)
+            start_service(tier.queue.popleft(), now)
+
+    # Поступление вызова на уровень
+    def arrive(call, now):
+        tier = tiers[call.tier]
+        tier.arrivals += 1
+        code = admission(tier, now)
+        if code is not None:
+            tier.dropped += 1
+            finish(call, now, code, admitted=False)
+        elif tier.busy < tier.servers:
+            start_service(call, now)
+        else:
+            tier.queue.append(call)
+            tier.queue_level.add(now, 1)
+            total_queue.add(now, 1)
+
+    # Вызов нижележащего уровня через пул соединений вызывающего
+    def call_down(call, target, now):
+        tier = tiers[call.tier]
+        if tier.pool_size is not None and tier.pool_used >= tier.pool_size:
+            call.wait_start = now
+            tier.pool_wait.append((call, target))
+            tier.wait_level.add(now, 1)
+            return
+        tier.pool_used += 1
+        tier.pool_level.add(now, 1)
+        tier.pool_wait_time.add(0.0)
+        arrive(_Call(call.id, target, now, call), now)
+
+    # Освободившееся соединение передается первому ждущему вызову. Отказ на
+    # нижележащем уровне тут же освобождает соединение снова, поэтому передачи
+    # идут в цикле через очередь handoffs, а не рекурсией по числу ждущих
+    handoffs = deque()
+    draining = False
+
+    def release_connection(tier, now):
+        nonlocal draining
+        tier.pool_used -= 1
+        tier.pool_level.add(now, -1)
+        handoffs.append(tier)
+        if draining:
+            return
+        draining = True
+        while handoffs:
+            owner = handoffs.popleft()
+            if not owner.pool_wait:
+                continue
+            call, target = owner.pool_wait.popleft()
+            owner.wait_level.add(now, -1)
+            owner.pool_used += 1
+            owner.pool_level.add(now, 1)
+            owner.pool_wait_time.add(now - call.wait_start)
+            arrive(_Call(call.id, target, now, call), now)
+        draining = False
+
+    # Ответ уровня: code=None - успех, иначе код отказа (свой или нижележащего уровня)
+    def finish(call, now, code, admitted=True):
+        tier = tiers[call.tier]
+        if admitted:
+            if code is None:
+                tier.processed += 1
+                tier.response.add(now - call.arrival)
+            else:
+                tier.failed += 1
+            if call.holding:
+                release_worker(call, now)
+        parent = call.parent
+        if parent is not None:
+            release_connection(tiers[parent.tier], now)
+            finish(parent, now, code)
+            return
+        if code is None:
+            stats["processed"] += 1
+            response_stats.add(now - call.arrival)
+            if response_times is not None:
+                response_times.append(now - call.arrival)
+            log_event(now, SERVICE_END, call.id)
+        else:
+            stats["dropped"] += 1
+            log_event(now, code, call.id)
+
+    # Окончание собственной обработки: вызов нижележащего уровня или ответ
+    def service_done(call, now):
+        tier = tiers[call.tier]
+        if tier.targets:
+            k = bisect_right(tier.cum, tier.next_route())
+            if k < len(tier.targets):
+                if not tier.hold:
+                    release_worker(call, now)
+                call_down(call, tier.targets[k], now)
+                return
+        finish(call, now, None)
+
+    if instr is not None:
+        instr.lap("setup")
+
+    # Внешние поступления не попадают в календарь: следующее сравнивается
+    # с ближайшим событием, при совпадении времени события идут раньше
+    arrivals = _arrivals(cfg, arrival_rng, SIM_TIME)
+    nxt = next(arrivals, None)
+    req_id = 0
+    while True:
+        t_event = calendar[0][0] if calendar else math.inf
+        if nxt is not None and nxt[0] < t_event:
+            now, service = nxt
+            if now >= SIM_TIME:
+                nxt = None
+                continue
+            req_id += 1
+            stats["total_arrivals"] += 1
+            log_event(now, ARRIVAL, req_id)
+            arrive(_Call(req_id, 0, now, None, service), now)
+            nxt = next(arrivals, None)
+        elif t_event < SIM_TIME:
+            now, _, _, call = heapq.heappop(calendar)
+            service_done(call, now)
+        else:
+            break
+    if instr is not None:
+        instr.lap("run")
+
+    def tier_result(tier):
+        response = tier.response.summary()
+        return {
+            "arrivals": tier.arrivals,
+            "dropped": tier.dropped,
+            "processed": tier.processed,
+            "failed": tier.failed,
+            "throughput": tier.processed / SIM_TIME,
+            "avg_response_time": response["mean"],
+            "response_std": response["std"],
+            "response_quantiles": response["quantiles"],
+            "utilization": tier.busy_level.mean(SIM_TIME) / tier.servers,
+            "mean_queue_len": tier.queue_level.mean(SIM_TIME),
+            "max_queue_len": tier.queue_level.max,
+            "mean_busy_servers": tier.busy_level.mean(SIM_TIME),
+            "max_busy_servers": tier.busy_level.max,
+            "mean_pool_in_use": tier.pool_level.mean(SIM_TIME),
+            "max_pool_in_use": tier.pool_level.max,
+            "mean_pool_wait_len": tier.wait_level.mean(SIM_TIME),
+            "avg_pool_wait": tier.pool_wait_time.mean,
+        }
+
+    servers = sum(t.servers for t in tiers)
+    servers_level = TimeWeighted(level=servers, history=history)
+    response = response_stats.summary()
+    aggregates = None
+    if event_bins is not None:
+        edges = event_bins.edges()
+        aggregates = {**event_bins.to_dict(), "queue": total_queue.binned(edges), "busy": total_busy.binned(edges),
+                      "servers": servers_level.binned(edges)}
+
+    # Очередь и занятость - суммарные по всем уровням
+    results = {
+        "total_arrivals": stats["total_arrivals"],
+        "processed": stats["processed"],
+        "dropped": stats["dropped"],
+        "avg_response_time": response["mean"],
+        "response_std": response["std"],
+        "response_quantiles": response["quantiles"],
+        "response_hist": response["hist"],
+        "utilization": total_busy.mean(SIM_TIME) / servers,
+        "mean_queue_len": total_queue.mean(SIM_TIME),
+        "max_queue_len": total_queue.max,
+        "mean_busy_servers": total_busy.mean(SIM_TIME),
+        "max_busy_servers": total_busy.max,
+        "queue_time_series": time_series(total_queue, SIM_TIME, cfg["monitor_interval"]),
+        "server_busy_time_series": time_series(total_busy, SIM_TIME, cfg["monitor_interval"]),
+        "queue_history": total_queue.history(),
+        "busy_history": total_busy.history(),
+        "servers_time_series": time_series(servers_level, SIM_TIME, cfg["monitor_interval"]),
+        "servers_history": servers_level.history(),
+        "mean_servers": float(servers),
+        "server_seconds": servers * SIM_TIME,
+        "scaling_events": [],
+        **client_results(stats["total_arrivals"], stats["processed"], stats["processed"], stats["dropped"], 0, 0,
+                         SIM_TIME),
+        "response_times": response_times if response_times is not None else [],
+        "events": events,
+        "aggregates": aggregates,
+        "tiers": {t.name: tier_result(t) for t in tiers},
+        "controls": {
+            "service_mean": service_sum / service_count if service_count else 0.0,
+            "arrivals": float(stats["total_arrivals"]),
+        },
+        "config": cfg,
+    }
+    if instr is not None:
+        instr.counters["requests"] = req_id
+        instr.counters["events_logged"] = len(events)
+        instr.lap("assembly")
+    return results
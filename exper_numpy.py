@@ -0,0 +1,226 @@
+import heapq
+import numpy as np
+import exper_trace
+from exper_client import client_enabled, client_results
+from exper_random import make_streams, sample_interarrival, sample_service, profile_gaps
+from exper_stats import ResponseStats, TimeWeighted, time_series
+from exper_events import EventLog, EventBins, ARRIVAL, SERVICE_START, SERVICE_END, DROPPED_QUEUE_FULL, DROPPED_REJECT
+
+# Векторизованный движок для стратегий "queue" и "reject":
+# FIFO-обслуживание на num_servers одинаковых серверах без SimPy.
+# Интервалы и времена обработки генерируются массивами, а моменты начала
+# и окончания обслуживания считаются рекурсией Кифера-Вольфовица
+# (для одного сервера с бесконечной очередью - рекурсией Линдли целиком в NumPy).
+
+SUPPORTED_STRATEGIES = ("queue", "reject")
+
+
+def check_supported(cfg):
+    if cfg["strategy"] not in SUPPORTED_STRATEGIES:
+        raise ValueError(f"engine='numpy' не поддерживает стратегию {cfg['strategy']!r}")
+    if client_enabled(cfg):
+        raise ValueError("engine='numpy' не поддерживает таймауты и повторы клиента")
+    if cfg.get("classes"):
+        raise ValueError("engine='numpy' не поддерживает классы запросов")
+
+
+# Моменты поступления запросов на [0, sim_time): первый запрос в момент 0,
+# при "poisson_burst" - пачки по burst_size через каждые interburst_interval,
+# при "profile" - неоднородный поток (exper_load)
+def arrival_times(cfg, rng):
+    sim_time = float(cfg["sim_time"])
+
+    if cfg["arrival_dist"] == "poisson_burst":
+        step = float(cfg["interburst_interval"])
+        bursts = np.arange(1, int(np.ceil(sim_time / step)) + 1) * step
+        bursts = bursts[bursts < sim_time]
+        return np.repeat(bursts, int(cfg["burst_size"]))
+
+    chunk = int(min(1 << 22, max(1024, sim_time * max(1.0, cfg["arrival_rate"]) * 1.2)))
+    if cfg["arrival_dist"] == "profile":
+        draw = profile_gaps(cfg, rng)
+    else:
+        draw = lambda n: sample_interarrival(cfg, rng, n)
+    parts = [np.zeros(1)]
+    last = 0.0
+    while last < sim_time:
+        ia = draw(chunk)
+        if not np.any(ia > 0):
+            raise ValueError("Интервал между запросами должен быть положительным")
+        # Последовательное суммирование, как при продвижении модельного времени
+        t = np.cumsum(np.concatenate(([last], ia)))[1:]
+        parts.append(t)
+        last = t[-1]
+    times = np.concatenate(parts)
+    return times[times < sim_time]
+
+
+# Одноканальная система с бесконечной очередью: D_n = S_n + max_{k<=n}(a_k - S_{k-1})
+def _lindley_single(arr, svc):
+    cums = np.cumsum(svc)
+    ends = cums + np.maximum.accumulate(arr - (cums - svc))
+    return ends - svc, ends
+
+
+# Многоканальная система: куча моментов освобождения серверов (Кифер-Вольфовиц)
+# и куча моментов ухода для проверки вместимости очереди
+# per_request=True - svc[i] относится к i-му поступившему запросу (трасса),
+# иначе к i-му допущенному
+def _kiefer_wolfowitz(arr, svc, cfg, per_request=False):
+    c = max(1, int(cfg["num_servers"]))
+    strategy = cfg["strategy"]
+    limit = None
+    if strategy == "queue" and cfg["queue_size"] is not None:
+        limit = int(cfg["queue_size"]) + c
+
+    free = [0.0] * c
+    in_system = []
+    admitted = []
+    starts = []
+    k = 0
+    svc_list = svc.tolist()
+
+    for i, t in enumerate(arr.tolist()):
+        if strategy == "reject":
+            if free[0] > t:
+                continue
+            start = t
+        else:
+            if limit is not None:
+                while in_system and in_system[0] <= t:
+                    heapq.heappop(in_system)
+                if len(in_system) >= limit:
+                    continue
+            start = free[0] if free[0] > t else t
+        end = start + svc_list[i if per_request else k]
+        heapq.heapreplace(free, end)
+        if limit is not None:
+            heapq.heappush(in_system, end)
+        admitted.append(i)
+        starts.append(start)
+        k += 1
+
+    starts = np.array(starts, dtype=float)
+    admitted = np.array(admitted, dtype=np.int64)
+    return admitted, starts, starts + (svc[admitted] if per_request else svc[:k])
+
+
+# instr - exper_instrument.Instrumentation: этапы sampling, run и assembly
+def model_numpy(cfg, instr=None):
+    check_supported(cfg)
+    streams = make_streams(cfg.get("seed"))
+    SIM_TIME = float(cfg["sim_time"])
+    c = max(1, int(cfg["num_servers"]))
+
+    trace_svc = None
+    if cfg["arrival_dist"] == "trace":
+        arr, trace_svc = exper_trace.read_window(cfg)
+    else:
+        arr = arrival_times(cfg, streams["arrival"])
+    n = len(arr)
+    # Времена обработки выдаются допущенным запросам в порядке поступления,
+    # как и в событийной модели, поэтому при тех же seed значения совпадают
+    per_request = trace_svc is not None
+    svc = trace_svc if per_request else np.asarray(sample_service(cfg, streams["service"], n), dtype=float)
+    if instr is not None:
+        instr.lap("sampling")
+
+    if cfg["strategy"] == "queue" and cfg["queue_size"] is None and c == 1:
+        admitted = np.arange(n, dtype=np.int64)
+        starts, ends = _lindley_single(arr, svc)
+    else:
+        admitted, starts, ends = _kiefer_wolfowitz(arr, svc, cfg, per_request)
+    if instr is not None:
+        instr.lap("run")
+
+    svc = svc[admitted] if per_request else svc[:len(admitted)]
+    adm_arr = arr[admitted]
+    done = ends < SIM_TIME
+    started = starts < SIM_TIME
+
+    order = np.argsort(ends[done], kind="stable")
+    response_times = (ends[done] - adm_arr[done])[order]
+
+    response = ResponseStats.summarize_array(cfg, response_times)
+
+    # Изменения длины очереди и числа занятых серверов до конца моделирования
+    history = cfg.get("state_history", True)
+    waited = starts > adm_arr
+    q_up = adm_arr[waited]
+    q_down = starts[waited & started]
+    queue_level = TimeWeighted.from_changes(
+        np.concatenate([q_up, q_down]),
+        np.concatenate([np.ones(len(q_up), dtype=np.int64), -np.ones(len(q_down), dtype=np.int64)]),
+        history=history)
+    b_up = starts[started]
+    b_down = ends[done]
+    busy_level = TimeWeighted.from_changes(
+        np.concatenate([b_up, b_down]),
+        np.concatenate([np.ones(len(b_up), dtype=np.int64), -np.ones(len(b_down), dtype=np.int64)]),
+        history=history)
+    utilization = busy_level.mean(SIM_TIME) / c
+    servers_level = TimeWeighted(level=c, history=history)
+
+    # Журнал событий в хронологическом порядке и сводки для графиков
+    events = EventLog(enabled=False)
+    event_bins = EventBins.from_config(cfg) if cfg.get("plot_bins") else None
+    if cfg.get("event_log", True) or event_bins is not None:
+        drop_code = DROPPED_REJECT if cfg["strategy"] == "reject" else DROPPED_QUEUE_FULL
+        ids = np.arange(1, n + 1)
+        dropped_mask = np.ones(n, dtype=bool)
+        dropped_mask[admitted] = False
+        ev_time = np.concatenate([arr, arr[dropped_mask], starts[started], ends[done]])
+        sizes = [n, int(dropped_mask.sum()), int(started.sum()), int(done.sum())]
+        ev_code = np.repeat(np.array([ARRIVAL, drop_code, SERVICE_START, SERVICE_END], dtype=np.int8), sizes)
+        if event_bins is not None:
+            event_bins.add_many(ev_time, ev_code)
+    if cfg.get("event_log", True):
+        ev_id = np.concatenate([ids, ids[dropped_mask], ids[admitted][started], ids[admitted][done]])
+        # При совпадении времени порядок как в событийной модели:
+        # поступление, отказ, окончание обслуживания, начало обслуживания следующего
+        ev_order = np.lexsort((np.repeat(np.array([0, 1, 3, 2]), sizes), ev_time))
+        events = EventLog.from_arrays(ev_time[ev_order], ev_code[ev_order], ev_id[ev_order],
+                                      every=cfg.get("event_log_every", 1))
+
+    results = {
+        "total_arrivals": n,
+        "processed": int(done.sum()),
+        "dropped": n - len(admitted),
+        "avg_response_time": response["mean"],
+        "response_std": response["std"],
+        "response_quantiles": response["quantiles"],
+        "response_hist": response["hist"],
+        "utilization": utilization,
+        "mean_queue_len": queue_level.mean(SIM_TIME),
+        "max_queue_len": queue_level.max,
+        "mean_busy_servers": busy_level.mean(SIM_TIME),
+        "max_busy_servers": busy_level.max,
+        "queue_time_series": time_series(queue_level, SIM_TIME, cfg["monitor_interval"]),
+        "server_busy_time_series": time_series(busy_level, SIM_TIME, cfg["monitor_interval"]),
+        "queue_history": queue_level.history(),
+        "busy_history": busy_level.history(),
+        "servers_time_series": time_series(servers_level, SIM_TIME, cfg["monitor_interval"]),
+        "servers_history": servers_level.history(),
+        "mean_servers": float(c),
+        "server_seconds": c * SIM_TIME,
+        "scaling_events": [],
+        **client_results(n, int(done.sum()), int(done.sum()), n - len(admitted), 0, 0, SIM_TIME),
+        "response_times": response_times.tolist() if cfg.get("keep_response_times") else [],
+        "events": events,
+        "aggregates": None if event_bins is None else {
+            **event_bins.to_dict(),
+            "queue": queue_level.binned(event_bins.edges()),
+            "busy": busy_level.binned(event_bins.edges()),
+            "servers": servers_level.binned(event_bins.edges()),
+        },
+        "controls": {
+            "service_mean": float(svc[started].mean()) if started.any() else 0.0,
+            "arrivals": float(n),
+        },
+        "config": cfg,
+    }
+    if instr is not None:
+        instr.counters["requests"] = n
+        instr.counters["events_logged"] = len(events)
+        instr.lap("assembly")
+    return results
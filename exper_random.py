@@ -0,0 +1,192 @@
+import math
+import numpy as np
+from scipy.special import ndtri
+import exper_load
+
+# Размер блока, которым генерируются случайные величины
+BLOCK_SIZE = 1024
+
+# Независимые потоки случайных чисел одного прогона. Каждый поток порождается
+# из seed прогона через SeedSequence.spawn, поэтому прогоны не делят общее
+# состояние и могут выполняться параллельно в потоках.
+STREAMS = ("arrival", "service", "retry")
+
+
+def make_streams(seed):
+    children = np.random.SeedSequence(seed).spawn(len(STREAMS))
+    return {name: np.random.default_rng(ss) for name, ss in zip(STREAMS, children)}
+
+
+# Способы генерации: "direct" - штатные методы NumPy, "inverse" - метод обратной
+# функции от равномерных U. При antithetic=True вместо U берется 1 - U, поэтому
+# прогоны с одним seed и разным antithetic образуют антитетическую пару.
+SAMPLING = ("direct", "inverse")
+_EPS = 2.0 ** -53
+
+
+def _inverse(config):
+    return config.get("sampling", "direct") == "inverse" or config.get("antithetic", False)
+
+
+def _uniforms(config, rng, size):
+    u = rng.random(size)
+    if config.get("antithetic", False):
+        u = 1.0 - u
+    return np.clip(u, _EPS, 1.0 - _EPS)
+
+
+def _inverse_interarrival(config, u):
+    d = config["arrival_dist"]
+    if d == "deterministic":
+        return np.full(np.shape(u), float(config["arrival_interval"]))
+    elif d == "uniform":
+        return config["arrival_low"] + (config["arrival_high"] - config["arrival_low"]) * u
+    else:
+        return -np.log1p(-u) / max(1e-9, config["arrival_rate"])
+
+
+def _inverse_service(config, u):
+    d = config["service_dist"]
+    mean = config["service_mean"]
+    if d == "deterministic":
+        return np.full(np.shape(u), float(mean))
+    elif d == "normal":
+        return np.maximum(0.0, mean + config["service_std"] * ndtri(u))
+    elif d == "uniform":
+        low = max(0.0, mean - config["service_std"])
+        return low + (mean + config["service_std"] - low) * u
+    else:
+        return -np.log1p(-u) * max(1e-9, mean)
+
+
+# Интервалы между запросами; size=None - одно значение, иначе массив
+def sample_interarrival(config, rng, size=None):
+    d = config["arrival_dist"]
+    if d in ("poisson_burst", "trace", "profile"):
+        return None
+    if _inverse(config):
+        v = _inverse_interarrival(config, _uniforms(config, rng, size))
+        return float(v) if size is None else v
+    if d == "exponential":
+        lam = max(1e-9, config["arrival_rate"])
+        return rng.exponential(1.0 / lam, size)
+    elif d == "deterministic":
+        return config["arrival_interval"] if size is None else np.full(size, float(config["arrival_interval"]))
+    elif d == "uniform":
+        return rng.uniform(config["arrival_low"], config["arrival_high"], size)
+    else:
+        return rng.exponential(1.0 / max(1e-9, config["arrival_rate"]), size)
+
+
+# Времена обработки; size=None - одно значение, иначе массив
+def sample_service(config, rng, size=None):
+    d = config["service_dist"]
+    if _inverse(config):
+        v = _inverse_service(config, _uniforms(config, rng, size))
+        return float(v) if size is None else v
+    if d == "exponential":
+        mean = max(1e-9, config["service_mean"])
+        return rng.exponential(mean, size)
+    elif d == "deterministic":
+        return config["service_mean"] if size is None else np.full(size, float(config["service_mean"]))
+    elif d == "normal":
+        s = rng.normal(config["service_mean"], config["service_std"], size)
+        return np.maximum(0.0, s)
+    elif d == "uniform":
+        low = max(0.0, config["service_mean"] - config["service_std"])
+        high = config["service_mean"] + config["service_std"]
+        return rng.uniform(low, high, size)
+    else:
+        return rng.exponential(max(1e-9, config["service_mean"]), size)
+
+
+# Поштучная выдача значений, заранее сгенерированных блоком.
+# Последовательность совпадает с генерацией одним массивом любой длины.
+class BlockSampler:
+    __slots__ = ("_draw", "_block", "_buf", "_pos")
+
+    def __init__(self, draw, block=BLOCK_SIZE):
+        self._draw = draw
+        self._block = block
+        self._buf = []
+        self._pos = 0
+
+    def __call__(self):
+        if self._pos >= len(self._buf):
+            self._buf = self._draw(self._block).tolist()
+            self._pos = 0
+        value = self._buf[self._pos]
+        self._pos += 1
+        return value
+
+
+# Интервалы неоднородного потока (arrival_dist="profile"): функция n -> массив
+# следующих n интервалов. В отличие от sample_interarrival хранит состояние.
+def profile_gaps(config, rng):
+    unit = {**config, "arrival_dist": "exponential", "arrival_rate": 1.0}
+    return exper_load.ProfileArrivals(exper_load.make_profile(config), config["load_sampling"],
+                                      lambda n: sample_interarrival(unit, rng, n),
+                                      lambda n: _uniforms(config, rng, n))
+
+
+# wrap - обертка функции генерации блока (например, замер времени)
+def interarrival_sampler(config, rng, block=BLOCK_SIZE, wrap=None):
+    if config["arrival_dist"] == "profile":
+        draw = profile_gaps(config, rng)
+    else:
+        draw = lambda n: sample_interarrival(config, rng, n)
+    return BlockSampler(wrap(draw) if wrap else draw, block)
+
+
+def service_sampler(config, rng, block=BLOCK_SIZE, wrap=None):
+    draw = lambda n: sample_service(config, rng, n)
+    return BlockSampler(wrap(draw) if wrap else draw, block)
+
+
+# Известные математические ожидания управляющих переменных прогона:
+# среднее время обработки и число поступивших запросов. Для равномерного
+# потока и трассы точного числа поступлений нет, эта переменная не используется;
+# для времен обработки из трассы не используется среднее время обработки.
+def expected_controls(config):
+    out = {}
+    if config.get("tiers"):
+        # Сеть сервисов: среднее время обработки - на входном уровне
+        entry = config["tiers"][0]
+        config = {**config, **{k: entry[k] for k in ("service_dist", "service_mean", "service_std") if k in entry}}
+    elif config.get("classes"):
+        # Классы запросов: поток и время обработки первого класса
+        config = {**config, **config["classes"][0]}
+    d = config["service_dist"]
+    mean = config["service_mean"]
+    if config["arrival_dist"] == "trace" and config.get("trace_service_column"):
+        d = "trace"
+    if d == "normal":
+        std = config["service_std"]
+        if std > 0:
+            z = mean / std
+            cdf = 0.5 * (1.0 + math.erf(z / math.sqrt(2.0)))
+            pdf = math.exp(-0.5 * z * z) / math.sqrt(2.0 * math.pi)
+            out["service_mean"] = mean * cdf + std * pdf
+        else:
+            out["service_mean"] = max(0.0, mean)
+    elif d == "uniform":
+        low = max(0.0, mean - config["service_std"])
+        out["service_mean"] = (low + mean + config["service_std"]) / 2.0
+    elif d == "deterministic":
+        out["service_mean"] = float(mean)
+    elif d != "trace":
+        out["service_mean"] = max(1e-9, mean)
+
+    T = float(config["sim_time"])
+    a = config["arrival_dist"]
+    if a == "deterministic":
+        out["arrivals"] = float(math.ceil(T / config["arrival_interval"]))
+    elif a == "poisson_burst":
+        out["arrivals"] = float(config["burst_size"] * (math.ceil(T / config["interburst_interval"]) - 1))
+    elif a == "profile":
+        # Первый запрос в момент 0, далее неоднородный поток
+        out["arrivals"] = 1.0 + float(exper_load.make_profile(config).cumulative(T))
+    elif a not in ("uniform", "trace"):
+        # Первый запрос в момент 0, далее пуассоновский поток
+        out["arrivals"] = 1.0 + max(1e-9, config["arrival_rate"]) * T
+    return out
@@ -0,0 +1,315 @@
+import math
+import numpy as np
+from scipy.interpolate import RBFInterpolator
+import exper_cloud as mdl
+import exper_design as design
+import exper_sweep as sweep
+from exper_stats import QUANTILES, quantile_name
+
+# Поиск минимальной мощности под SLO вместо перебора по сетке.
+# SLO - словарь {метрика: порог}, например {"p99": 0.5, "drop_rate": 0.01}:
+# среднее по репликам каждой метрики не должно превышать порога.
+# Точка проверяется последовательно: сначала min_reps реплик, затем реплики
+# добавляются, только пока ДИ какой-либо метрики накрывает порог (до max_reps).
+# Решение по точке:
+#   "feasible" - верхние границы ДИ всех метрик не выше порогов;
+#   "violated" - нижняя граница ДИ хотя бы одной метрики выше порога;
+#   "uncertain" - при max_reps различить не удалось (считается недопустимой).
+# Реплики разных точек используют общие случайные числа (seed зависит только
+# от номера реплики), поэтому соседние точки сравниваются точнее.
+#   bisect_search    - один монотонный параметр, зашумленная бисекция;
+#   surrogate_search - несколько параметров, суррогатная модель (RBF) запаса по SLO.
+
+SLO_METRICS = {
+    "mean_response": lambda res: res["avg_response_time"],
+    "drop_rate": lambda res: res["dropped"] / max(1, res["total_arrivals"]),
+    # Доля исходных запросов, не получивших ответа (с учетом таймаутов и повторов)
+    "error_rate": lambda res: res["failed"] / max(1, res["requests"]),
+    **{quantile_name(q): (lambda res, name=quantile_name(q): res["response_quantiles"][name]) for q in QUANTILES},
+}
+GOALS = ("min", "max")
+DECISIONS = ("feasible", "violated", "uncertain")
+
+
+def check_slo(slo):
+    if not slo:
+        raise ValueError("SLO должен содержать хотя бы одну метрику")
+    for metric in slo:
+        if metric not in SLO_METRICS:
+            raise ValueError(f"Неизвестная метрика SLO: {metric!r}, допустимы {tuple(SLO_METRICS)}")
+
+
+# Решение по значениям реплик {метрика: [значения]}. exact - детерминированный
+# движок (analytic): одного прогона достаточно. Возвращает (решение, {метрика: (среднее, полуширина)}).
+def decide(values, slo, level=0.95, exact=False):
+    stats = {}
+    for metric in slo:
+        mean, hw = sweep.mean_ci(values[metric], level)
+        stats[metric] = (mean, 0.0 if exact else hw)
+    if any(mean - hw > slo[m] for m, (mean, hw) in stats.items()):
+        return "violated", stats
+    if all(mean + hw <= slo[m] for m, (mean, hw) in stats.items()):
+        return "feasible", stats
+    return "uncertain", stats
+
+
+# Относительный запас по SLO: минимум (порог - среднее) / порог по метрикам, > 0 - допустимо
+def margin(stats, slo):
+    return min((slo[m] - mean) / (slo[m] if slo[m] > 0 else 1.0) for m, (mean, _) in stats.items())
+
+
+# Последовательная проверка точек с кэшем уже проверенных
+class _Evaluator:
+    def __init__(self, base, slo, level, min_reps, max_reps, seed, engine, workers, cache, progress):
+        check_slo(slo)
+        self.base = dict(base or {})
+        self.slo = dict(slo)
+        self.level = level
+        self.exact = engine == "analytic"
+        self.min_reps = 1 if self.exact else max(2, int(min_reps))
+        self.max_reps = self.min_reps if self.exact else max(self.min_reps, int(max_reps))
+        self.seed = int(seed)
+        self.engine = engine
+        self.workers = workers
+        self.cache = cache
+        self.progress = progress
+        self.records = {}
+        self.order = []
+        self.simulations = 0
+
+    @staticmethod
+    def key(point):
+        return tuple(sorted(point.items()))
+
+    def cfg(self, point, rep):
+        seed = int(np.random.SeedSequence([self.seed, rep]).generate_state(1)[0])
+        return {**self.base, **point, "seed": seed}
+
+    # Проверка набора точек; реплики всех точек раунда считаются параллельно.
+    # Добавка реплик оценивается по текущей полуширине: n * (hw / |среднее - порог|)^2.
+    def evaluate(self, points):
+        new = {}
+        for p in points:
+            k = self.key(p)
+            if k not in self.records and k not in new:
+                new[k] = dict(p)
+        values = {k: {m: [] for m in self.slo} for k in new}
+        done = {k: 0 for k in new}
+        todo = {k: self.min_reps for k in new}
+
+        while todo:
+            jobs = []
+            for k, extra in todo.items():
+                jobs += [((k, rep), self.cfg(new[k], rep)) for rep in range(done[k], done[k] + extra)]
+                done[k] += extra
+            for (k, rep), res in sweep.run_sweep(jobs, workers=self.workers, engine=self.engine, cache=self.cache):
+                for m in self.slo:
+                    values[k][m].append(SLO_METRICS[m](res))
+                self.simulations += 1
+
+            todo = {}
+            for k in new:
+                decision, stats = decide(values[k], self.slo, self.level, self.exact)
+                if decision != "uncertain" or done[k] >= self.max_reps:
+                    continue
+                need = done[k] + 1
+                for m, (mean, hw) in stats.items():
+                    gap = abs(mean - self.slo[m])
+                    if mean - hw <= self.slo[m] < mean + hw and gap > 0:
+                        need = max(need, math.ceil(done[k] * (hw / gap) ** 2))
+                todo[k] = min(need, self.max_reps) - done[k]
+
+        for k, p in new.items():
+            decision, stats = decide(values[k], self.slo, self.level, self.exact)
+            rec = {
+                "point": p,
+                "replicas": done[k],
+                "metrics": {m: {"mean": mean, "ci": hw if math.isfinite(hw) else None}
+                            for m, (mean, hw) in stats.items()},
+                "margin": margin(stats, self.slo),
+                "decision": decision,
+            }
+            self.records[k] = rec
+            self.order.append(k)
+            if self.progress is not None:
+                self.progress(rec)
+        return [self.records[self.key(p)] for p in points]
+
+    def evaluations(self):
+        return [self.records[k] for k in self.order]
+
+
+# Зашумленная бисекция по одному параметру. goal="min" - наименьшее значение,
+# при котором SLO выполняется (допустимость растет с параметром, например
+# num_servers); goal="max" - наибольшее (например, допустимая arrival_rate).
+# Для целых параметров поиск до соседних значений, для вещественных - до tol.
+# При монотонности ответ верен, если верны два решения на концах найденного
+# интервала, поэтому достоверность - по Бонферрони для этих двух решений.
+# progress(запись) вызывается после проверки каждой точки.
+def bisect_search(base, parameter, low, high, slo, goal="min", integer=None, tol=None, level=0.95,
+                  min_reps=5, max_reps=40, seed=0, engine="simpy", workers=None, cache=None, progress=None):
+    if parameter not in mdl.DEFAULTS:
+        raise ValueError(f"Неизвестный параметр модели: {parameter!r}")
+    if goal not in GOALS:
+        raise ValueError(f"Неизвестная цель поиска: {goal!r}, допустимы {GOALS}")
+    if not low < high:
+        raise ValueError("Нужно low < high")
+    if integer is None:
+        integer = isinstance(mdl.DEFAULTS[parameter], int) and not isinstance(mdl.DEFAULTS[parameter], bool)
+    cast = (lambda x: int(round(x))) if integer else float
+    step = 1 if integer else (float(tol) if tol else (high - low) / 100.0)
+    ev = _Evaluator(base, slo, level, min_reps, max_reps, seed, engine, workers, cache, progress)
+
+    def feasible(x):
+        return ev.evaluate([{parameter: x}])[0]["decision"] == "feasible"
+
+    # ok - допустимый конец интервала, bad - недопустимый
+    ok, bad = (cast(high), cast(low)) if goal == "min" else (cast(low), cast(high))
+    value = None
+    if feasible(ok):
+        if feasible(bad):
+            value, bad = bad, None
+        else:
+            while abs(ok - bad) > step:
+                mid = (ok + bad) // 2 if integer else (ok + bad) / 2.0
+                if feasible(mid):
+                    ok = mid
+                else:
+                    bad = mid
+            value = ok
+
+    evaluations = ev.evaluations()
+    uncertain = [r["point"][parameter] for r in evaluations if r["decision"] == "uncertain"]
+    # Если SLO не выполняется даже на допустимом конце, второй конец не проверялся
+    decisive = [x for x in (value, bad) if x is not None and ev.key({parameter: x}) in ev.records
+                and ev.records[ev.key({parameter: x})]["decision"] != "uncertain"]
+    if value is None:
+        confidence = 0.0
+    elif ev.exact:
+        # Детерминированный движок: решения точные, доверительных интервалов нет
+        confidence = 1.0
+    else:
+        confidence = max(0.0, 1.0 - len(decisive) * (1.0 - level))
+
+    if value is None:
+        statement = (f"SLO не выполняется ни при одном {parameter} из [{low}, {high}]: "
+                     f"{'недопустим' if not uncertain else 'не подтвержден'} даже {parameter} = {ok}")
+    elif bad is None:
+        statement = f"SLO выполняется на всем диапазоне, {parameter} = {value} - граница диапазона"
+    else:
+        best = "наименьшее" if goal == "min" else "наибольшее"
+        below = "значения метрик ниже" if ev.exact else f"верхние границы {level:.0%}-ДИ ниже"
+        certainty = "" if ev.exact else f" с достоверностью не ниже {confidence:.0%}"
+        statement = (f"{parameter} = {value}: {below} порогов SLO, "
+                     f"при {parameter} = {bad} SLO {'нарушается' if bad in decisive else 'не подтверждается'}")
+        if bad in decisive:
+            statement += (f"; {best} допустимое значение лежит между {min(bad, value)} и {max(bad, value)}"
+                          f"{certainty}")
+        else:
+            statement += f"; значение {value} удовлетворяет SLO{certainty}"
+    if uncertain and value is not None:
+        statement += (f". Неразличимые при {ev.max_reps} репликах значения {uncertain} сочтены недопустимыми: "
+                      "ответ консервативен")
+    return {
+        "parameter": parameter,
+        "goal": goal,
+        "value": value,
+        "bracket": None if bad is None or value is None else tuple(sorted((bad, value))),
+        "feasible": value is not None,
+        "confidence": confidence,
+        "uncertain": uncertain,
+        "evaluations": evaluations,
+        "simulations": ev.simulations,
+        "statement": statement,
+    }
+
+
+# Координаты точки в единичном кубе (с учетом логарифмической шкалы)
+def _unit(factors, points):
+    cols = []
+    for name, spec in factors.items():
+        x = np.array([p[name] for p in points], dtype=float)
+        lo, hi = float(spec["low"]), float(spec["high"])
+        if spec.get("scale") == "log":
+            x, lo, hi = np.log(x), math.log(lo), math.log(hi)
+        cols.append((x - lo) / (hi - lo) if hi > lo else np.zeros_like(x))
+    return np.column_stack(cols)
+
+
+# Поиск по нескольким параметрам: минимум стоимости sum(cost[f] * f) при
+# выполнении SLO. factors - диапазоны в формате exper_design
+# ({"low", "high", "integer", "scale"}); cost по умолчанию 1 / (high - low),
+# отрицательный вес - чем больше значение фактора, тем лучше.
+# Начальный план - латинский гиперкуб init_points точек. Затем по запасу
+# по SLO проверенных точек строится RBF-интерполяция (значения ограничены [-1, 1]),
+# и на каждом шаге проверяется самый дешевый кандидат с прогнозом запаса >= 0,
+# который дешевле лучшей подтвержденной точки. Поиск завершается, когда
+# таких кандидатов нет или исчерпан бюджет budget проверок.
+def surrogate_search(base, factors, slo, cost=None, init_points=None, budget=20, candidates=2000,
+                     smoothing=1e-3, level=0.95, min_reps=5, max_reps=40, seed=0, engine="simpy",
+                     workers=None, cache=None, progress=None):
+    for name, spec in factors.items():
+        if not isinstance(spec, dict):
+            raise ValueError(f"Для фактора {name!r} нужен диапазон low/high")
+    names = list(factors)
+    weights = {n: 1.0 / max(1e-12, float(factors[n]["high"]) - float(factors[n]["low"])) for n in names}
+    weights.update(cost or {})
+    price = lambda p: float(sum(weights[n] * p[n] for n in names))
+    n_init = int(init_points) if init_points else max(2 * len(names) + 2, 6)
+
+    ev = _Evaluator(base, slo, level, min_reps, max_reps, seed, engine, workers, cache, progress)
+    ev.evaluate(design.latin_hypercube(factors, n_init, seed))
+
+    converged = False
+    for it in range(int(budget)):
+        recs = ev.evaluations()
+        feasible = [r for r in recs if r["decision"] == "feasible"]
+        best = min(feasible, key=lambda r: price(r["point"])) if feasible else None
+
+        pool = [p for p in design.latin_hypercube(factors, candidates, seed + 1 + it) if ev.key(p) not in ev.records]
+        pool = list({ev.key(p): p for p in pool}.values())
+        if not pool:
+            converged = True
+            break
+        surrogate = RBFInterpolator(_unit(factors, [r["point"] for r in recs]),
+                                    np.clip([r["margin"] for r in recs], -1.0, 1.0),
+                                    kernel="thin_plate_spline", smoothing=smoothing)
+        pred = surrogate(_unit(factors, pool))
+        costs = np.array([price(p) for p in pool])
+
+        if best is None:
+            # Допустимых точек еще нет: проверяется точка с наибольшим прогнозом запаса
+            pick = int(np.argmax(pred))
+        else:
+            better = (pred >= 0) & (costs < price(best["point"]))
+            if not better.any():
+                converged = True
+                break
+            pick = int(np.flatnonzero(better)[np.argmin(costs[better])])
+        ev.evaluate([pool[pick]])
+
+    recs = ev.evaluations()
+    feasible = [r for r in recs if r["decision"] == "feasible"]
+    best = min(feasible, key=lambda r: price(r["point"])) if feasible else None
+    cheaper = [r for r in recs if best is not None and price(r["point"]) < price(best["point"])]
+    confidence = level if best is not None else 0.0
+
+    if best is None:
+        statement = f"Ни одна из {len(recs)} проверенных точек не удовлетворяет SLO с достоверностью {level:.0%}"
+    else:
+        point = ", ".join(f"{n} = {best['point'][n]}" for n in names)
+        statement = (f"{point}: верхние границы {level:.0%}-ДИ ниже порогов SLO; "
+                     f"все {len(cheaper)} проверенных более дешевых точек SLO не подтвердили")
+        statement += ("; суррогатная модель не предсказывает более дешевой допустимой точки"
+                      if converged else "; бюджет проверок исчерпан, более дешевая точка не исключена")
+    return {
+        "factors": names,
+        "point": best["point"] if best is not None else None,
+        "cost": price(best["point"]) if best is not None else None,
+        "feasible": best is not None,
+        "converged": converged,
+        "confidence": confidence,
+        "evaluations": recs,
+        "simulations": ev.simulations,
+        "statement": statement,
+    }
@@ -0,0 +1,280 @@
+import math
+from array import array
+import numpy as np
+
+# Квантили времени отклика, которые оцениваются в каждом прогоне
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def quantile_name(p):
+    return f"p{round(p * 100):d}"
+
+
+# Среднее и дисперсия за один проход (алгоритм Уэлфорда)
+class Welford:
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, x):
+        self.n += 1
+        d = x - self.mean
+        self.mean += d / self.n
+        self.m2 += d * (x - self.mean)
+
+    # Объединение с характеристиками готовой выборки (формула Чана)
+    def add_many(self, values):
+        values = np.asarray(values, dtype=float)
+        m = len(values)
+        if m == 0:
+            return
+        b_mean = float(values.mean())
+        b_m2 = float(((values - b_mean) ** 2).sum())
+        n = self.n + m
+        d = b_mean - self.mean
+        self.mean += d * m / n
+        self.m2 += b_m2 + d * d * self.n * m / n
+        self.n = n
+
+    @property
+    def variance(self):
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+
+# Оценка квантиля по пяти маркерам без хранения выборки (алгоритм P², Jain & Chlamtac)
+class P2Quantile:
+    __slots__ = ("p", "q", "pos", "want", "step")
+
+    def __init__(self, p):
+        self.p = p
+        self.q = []
+        self.pos = [1, 2, 3, 4, 5]
+        self.want = [1.0, 1.0 + 2 * p, 1.0 + 4 * p, 3.0 + 2 * p, 5.0]
+        self.step = [0.0, p / 2, p, (1.0 + p) / 2, 1.0]
+
+    def add(self, x):
+        q = self.q
+        if len(q) < 5:
+            q.append(x)
+            if len(q) == 5:
+                q.sort()
+            return
+
+        pos = self.pos
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            pos[i] += 1
+        want = self.want
+        for i in range(5):
+            want[i] += self.step[i]
+
+        for i in (1, 2, 3):
+            d = want[i] - pos[i]
+            if (d >= 1 and pos[i + 1] - pos[i] > 1) or (d <= -1 and pos[i - 1] - pos[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = q[i] + d / (pos[i + 1] - pos[i - 1]) * (
+                    (pos[i] - pos[i - 1] + d) * (q[i + 1] - q[i]) / (pos[i + 1] - pos[i])
+                    + (pos[i + 1] - pos[i] - d) * (q[i] - q[i - 1]) / (pos[i] - pos[i - 1]))
+                if not q[i - 1] < qp < q[i + 1]:
+                    qp = q[i] + d * (q[i + d] - q[i]) / (pos[i + d] - pos[i])
+                q[i] = qp
+                pos[i] += d
+
+    @property
+    def value(self):
+        if len(self.q) < 5:
+            return float(np.quantile(self.q, self.p)) if self.q else 0.0
+        return self.q[2]
+
+
+# Гистограмма с фиксированным числом интервалов. Если значение не помещается,
+# соседние интервалы попарно объединяются и ширина удваивается.
+class StreamingHistogram:
+    __slots__ = ("width", "counts")
+
+    def __init__(self, bins=64, width=1.0):
+        self.width = float(width)
+        self.counts = [0] * (bins + bins % 2)
+
+    def _grow(self):
+        c = self.counts
+        merged = [c[i] + c[i + 1] for i in range(0, len(c), 2)]
+        self.counts = merged + [0] * (len(c) - len(merged))
+        self.width *= 2.0
+
+    def add(self, x):
+        i = int(x / self.width)
+        while i >= len(self.counts):
+            self._grow()
+            i = int(x / self.width)
+        self.counts[i] += 1
+
+    def add_many(self, values):
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return
+        while values.max() / self.width >= len(self.counts):
+            self._grow()
+        idx = (values / self.width).astype(np.int64)
+        add = np.bincount(idx, minlength=len(self.counts))
+        self.counts = [a + int(b) for a, b in zip(self.counts, add)]
+
+    def to_dict(self):
+        return {
+            "edges": [i * self.width for i in range(len(self.counts) + 1)],
+            "counts": list(self.counts),
+        }
+
+
+# Потоковые характеристики времени отклика: O(1) памяти на прогон
+class ResponseStats:
+    def __init__(self, cfg):
+        bins = int(cfg.get("hist_bins", 64))
+        self.moments = Welford()
+        self.quantiles = [P2Quantile(p) for p in QUANTILES]
+        self.hist = StreamingHistogram(bins, max(1e-9, 4.0 * cfg["service_mean"] / bins))
+
+    def add(self, x):
+        self.moments.add(x)
+        for est in self.quantiles:
+            est.add(x)
+        self.hist.add(x)
+
+    def summary(self):
+        return {
+            "mean": self.moments.mean,
+            "std": self.moments.std,
+            "quantiles": {quantile_name(est.p): est.value for est in self.quantiles},
+            "hist": self.hist.to_dict(),
+        }
+
+    # Для готового массива (векторизованный движок) квантили считаются точно
+    @classmethod
+    def summarize_array(cls, cfg, values):
+        stats = cls(cfg)
+        stats.moments.add_many(values)
+        stats.hist.add_many(values)
+        out = stats.summary()
+        if len(values):
+            out["quantiles"] = {quantile_name(p): float(v)
+                                for p, v in zip(QUANTILES, np.quantile(values, QUANTILES))}
+        return out
+
+
+# Кусочно-постоянный уровень (длина очереди, число занятых серверов), который
+# меняется только в моменты событий. Дает точные среднее по времени и максимум;
+# при history=True хранит историю изменений для последующей передискретизации.
+class TimeWeighted:
+    __slots__ = ("start", "last", "level", "area", "max", "times", "levels")
+
+    def __init__(self, start=0.0, level=0, history=True):
+        self.start = start
+        self.last = start
+        self.level = level
+        self.area = 0.0
+        self.max = level
+        self.times = array("d", [start]) if history else None
+        self.levels = array("q", [level]) if history else None
+
+    def add(self, t, delta):
+        self.area += self.level * (t - self.last)
+        self.last = t
+        self.level += delta
+        if self.level > self.max:
+            self.max = self.level
+        if self.times is not None:
+            self.times.append(t)
+            self.levels.append(self.level)
+
+    # Построение по готовым изменениям уровня (векторизованный движок).
+    # При совпадении времени уменьшения применяются раньше увеличений.
+    @classmethod
+    def from_changes(cls, times, deltas, start=0.0, history=True):
+        tw = cls(start, 0, history)
+        times = np.asarray(times, dtype=float)
+        deltas = np.asarray(deltas, dtype=np.int64)
+        if len(times) == 0:
+            return tw
+        order = np.lexsort((deltas, times))
+        times, levels = times[order], np.cumsum(deltas[order])
+        tw.area = float(np.sum(levels[:-1] * np.diff(times))) + 0.0
+        tw.last = float(times[-1])
+        tw.level = int(levels[-1])
+        tw.max = max(0, int(levels.max()))
+        if history:
+            tw.times.frombytes(times.tobytes())
+            tw.levels.frombytes(levels.tobytes())
+        return tw
+
+    # Максимум с предыдущего вызова (для сводок по окнам);
+    # следующий отсчитывается от текущего уровня
+    def take_max(self):
+        m = self.max
+        self.max = self.level
+        return m
+
+    def integral(self, t_end):
+        return self.area + self.level * (t_end - self.last)
+
+    def mean(self, t_end):
+        span = t_end - self.start
+        return self.integral(t_end) / span if span > 0 else 0.0
+
+    def history(self):
+        if self.times is None:
+            return np.empty(0), np.empty(0, dtype=np.int64)
+        return np.frombuffer(self.times, dtype=np.float64), np.frombuffer(self.levels, dtype=np.int64)
+
+    # Среднее по времени и максимум уровня в интервалах между границами edges
+    # (по истории изменений; без истории - пустые списки)
+    def binned(self, edges):
+        times, levels = self.history()
+        if len(times) == 0:
+            return {"mean": [], "max": []}
+        edges = np.asarray(edges, dtype=float)
+        # Площадь под уровнем до каждой границы
+        area = np.concatenate([[0.0], np.cumsum(levels[:-1] * np.diff(times))])
+        idx = np.maximum(np.searchsorted(times, edges, side="right") - 1, 0)
+        at_edge = area[idx] + levels[idx] * (edges - times[idx])
+        # Максимум: уровень на начало интервала и все изменения внутри него
+        j = np.searchsorted(times, edges, side="left")
+        first = np.maximum(j[:-1] - 1, 0)
+        last = np.maximum(j[1:] - 1, 0)
+        peak = np.maximum(np.maximum.reduceat(levels[:max(1, j[-1])], first), levels[last])
+        return {"mean": (np.diff(at_edge) / np.diff(edges)).tolist(), "max": peak.tolist()}
+
+
+# Значения кусочно-постоянного уровня в моменты grid (после всех изменений в этот момент)
+def resample(times, levels, grid):
+    times = np.asarray(times)
+    levels = np.asarray(levels)
+    grid = np.asarray(grid, dtype=float)
+    if len(times) == 0:
+        return np.zeros(len(grid), dtype=np.int64)
+    idx = np.searchsorted(times, grid, side="right") - 1
+    return levels[np.maximum(idx, 0)]
+
+
+# Временной ряд [(t, уровень), ...] на равномерной сетке с шагом step
+def time_series(tw, t_end, step):
+    times, levels = tw.history()
+    if len(times) == 0:
+        return []
+    grid = np.arange(tw.start, t_end, step)
+    return list(zip(grid.tolist(), resample(times, levels, grid).tolist()))
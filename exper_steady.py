@@ -0,0 +1,134 @@
+import math
+import numpy as np
+from scipy.stats import t as student_t
+import exper_cloud as mdl
+from exper_sweep import run_sweep
+
+# Оценка стационарных характеристик по одному длинному прогону:
+# прогон делится на окна (iter_model_env), начальный переходный участок
+# определяется правилом MSER-5 и отбрасывается, по остатку строятся
+# непересекающиеся групповые средние (batch means) и ДИ по Стьюденту.
+# Метрики - отношения сумм по окнам, поэтому группы с разным числом
+# запросов взвешиваются правильно.
+
+WINDOWS = 1000
+BATCHES = 20
+MSER_BATCH = 5
+
+
+# Точка усечения по MSER-k (White, 1997): наблюдения объединяются в группы по k,
+# выбирается d <= m/2, минимизирующее дисперсию среднего по группам d..m-1
+# (сумма квадратов отклонений / (m - d)^2). num/den - числители и знаменатели
+# по окнам (den=None - простые средние). Возвращает число отбрасываемых окон.
+def mser(num, den=None, batch=MSER_BATCH):
+    num = np.asarray(num, dtype=float)
+    den = np.ones_like(num) if den is None else np.asarray(den, dtype=float)
+    m = len(num) // batch
+    if m < 2:
+        return 0
+    group_num = num[:m * batch].reshape(m, batch).sum(axis=1)
+    group_den = den[:m * batch].reshape(m, batch).sum(axis=1)
+    valid = group_den > 0
+    z = np.where(valid, group_num / np.where(valid, group_den, 1.0), 0.0)
+
+    # Суммы по хвостам d..m-1 (группы без запросов не учитываются)
+    k = np.cumsum(valid[::-1])[::-1].astype(float)
+    s1 = np.cumsum(z[::-1])[::-1]
+    s2 = np.cumsum((z * z)[::-1])[::-1]
+    limit = m // 2 + 1
+    k, s1, s2 = k[:limit], s1[:limit], s2[:limit]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        stat = np.where(k > 1, (s2 - s1 * s1 / k) / (k * k), np.inf)
+    return int(np.argmin(stat)) * batch
+
+
+# Групповые средние: окна делятся на batches последовательных групп равного
+# размера (лишние окна отбрасываются с начала), оценка - отношение сумм по всем
+# группам, ДИ - по разбросу отношений в группах. lag1 - автокорреляция соседних
+# групповых средних; при заметной величине группы стоит укрупнить.
+def batch_means(num, den=None, batches=BATCHES, level=0.95):
+    num = np.asarray(num, dtype=float)
+    den = np.ones_like(num) if den is None else np.asarray(den, dtype=float)
+    batches = max(1, min(int(batches), len(num)))
+    size = len(num) // batches if batches else 0
+    if size == 0:
+        return {"mean": 0.0, "ci": math.inf, "batches": 0, "batch_size": 0, "lag1": None, "batch_means": []}
+    used = batches * size
+    b_num = num[-used:].reshape(batches, size).sum(axis=1)
+    b_den = den[-used:].reshape(batches, size).sum(axis=1)
+    valid = b_den > 0
+    means = b_num[valid] / b_den[valid]
+    mean = float(b_num.sum() / b_den.sum()) if b_den.sum() > 0 else 0.0
+
+    k = len(means)
+    ci = math.inf
+    lag1 = None
+    if k > 1:
+        ci = float(student_t.ppf(0.5 + level / 2, k - 1)) * float(means.std(ddof=1)) / math.sqrt(k)
+    if k > 2 and means.std() > 0:
+        d = means - means.mean()
+        lag1 = float(np.sum(d[1:] * d[:-1]) / np.sum(d * d))
+    return {
+        "mean": mean,
+        "ci": ci,
+        "batches": k,
+        "batch_size": size,
+        "lag1": lag1,
+        "batch_means": means.tolist(),
+    }
+
+
+# Один длинный прогон длиной sim_time из config, разбитый на windows окон.
+# Точка усечения - наибольшая из точек MSER по всем метрикам.
+def steady_state(config=None, windows=WINDOWS, batches=BATCHES, level=0.95, mser_batch=MSER_BATCH):
+    cfg = mdl.DEFAULTS.copy()
+    if config:
+        cfg.update(config)
+    sim_time = float(cfg["sim_time"])
+    window = sim_time / max(1, int(windows))
+
+    span, arrivals, dropped, succeeded, resp_sum, busy = [], [], [], [], [], []
+    for w in mdl.iter_model_env({**cfg, "event_log": False}, window=window):
+        length = w["end"] - w["start"]
+        span.append(length)
+        arrivals.append(w["arrivals"])
+        dropped.append(w["dropped"])
+        # Время отклика усредняется по успешным запросам: обработанные после
+        # таймаута клиента в него не входят
+        succeeded.append(w["succeeded"])
+        resp_sum.append(w["avg_response_time"] * w["succeeded"])
+        busy.append(w["utilization"] * length)
+
+    series = {
+        "mean_response": (np.array(resp_sum), np.array(succeeded, dtype=float)),
+        "drop_rate": (np.array(dropped, dtype=float), np.array(arrivals, dtype=float)),
+        "utilization": (np.array(busy), np.array(span)),
+    }
+    cuts = {name: mser(num, den, mser_batch) for name, (num, den) in series.items()}
+    cut = max(cuts.values())
+    n = len(span)
+    return {
+        "sim_time": sim_time,
+        "window": window,
+        "windows": n,
+        "warmup_windows": cut,
+        "warmup_time": float(np.sum(span[:cut])),
+        # Усечение на границе поиска: переходный участок, возможно, длиннее - нужен прогон дольше
+        "warmup_at_limit": cut >= (n // mser_batch // 2) * mser_batch and n >= 2 * mser_batch,
+        "mser_cuts": cuts,
+        "estimates": {name: batch_means(num[cut:], den[cut:], batches, level)
+                      for name, (num, den) in series.items()},
+    }
+
+
+# keys = ("steady_state", windows, batches, level, mser_batch) - ключ кэша run_sweep
+def _steady_job(cfg, keys, engine="simpy"):
+    return steady_state(cfg, *keys[1:])
+
+
+# Длинные прогоны для набора точек; make_cfg(point) - конфигурация прогона.
+# Результаты отдаются как (point, оценка) по мере готовности.
+def run_steady(points, make_cfg, windows=WINDOWS, batches=BATCHES, level=0.95, mser_batch=MSER_BATCH,
+               workers=None, cache=None):
+    keys = ("steady_state", int(windows), int(batches), float(level), int(mser_batch))
+    return run_sweep(((p, make_cfg(p)) for p in points), workers, keys, "simpy", cache, _steady_job)
@@ -0,0 +1,165 @@
+import os
+import math
+import numpy as np
+from scipy.stats import t as student_t
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import exper_cloud as mdl
+import exper_cache
+from exper_random import expected_controls
+
+# Ключи результатов, достаточные для агрегирования по точкам эксперимента.
+# Журнал событий и временные ряды в процесс-родитель не передаются.
+SUMMARY_KEYS = ("total_arrivals", "processed", "dropped", "avg_response_time", "response_quantiles", "utilization",
+                "server_seconds", "requests", "failed", "goodput", "retry_amplification", "controls")
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def run_job(cfg, keys=SUMMARY_KEYS, engine="simpy"):
+    res = mdl.model_env(cfg, engine=engine)
+    if keys is None:
+        return res
+    return {k: res[k] for k in keys}
+
+
+# Прогон набора заданий (key, cfg). Seed задается в самой конфигурации,
+# поэтому результат не зависит от того, в каком процессе выполнялся прогон.
+# Результаты отдаются по мере готовности, в порядке завершения;
+# уже посчитанные точки берутся из кэша (cache - exper_cache.ResultCache).
+# job(cfg, keys, engine) - функция прогона уровня модуля (передается в процессы);
+# keys входят в ключ кэша, поэтому задают и параметры job.
+def run_sweep(jobs, workers=None, keys=SUMMARY_KEYS, engine="simpy", cache=None, job=run_job):
+    workers = default_workers() if workers is None else int(workers)
+
+    pending = []
+    for key, cfg in jobs:
+        cache_key = exper_cache.config_key(cfg, engine, keys) if cache is not None else None
+        res = cache.get(cache_key) if cache_key is not None else None
+        if res is not None:
+            yield key, res
+        else:
+            pending.append((key, cfg, cache_key))
+
+    def store(cache_key, res):
+        if cache_key is not None:
+            cache.put(cache_key, res)
+        return res
+
+    if workers <= 1 or len(pending) <= 1:
+        for key, cfg, cache_key in pending:
+            yield key, store(cache_key, job(cfg, keys, engine))
+        return
+
+    pool = ProcessPoolExecutor(max_workers=min(workers, len(pending)))
+    try:
+        futures = {pool.submit(job, dict(cfg), keys, engine): (key, cache_key)
+                   for key, cfg, cache_key in pending}
+        for fut in as_completed(futures):
+            key, cache_key = futures[fut]
+            yield key, store(cache_key, fut.result())
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+# Метрики прогона, по которым оценивается точность
+METRICS = {
+    "mean_response": lambda res: res["avg_response_time"],
+    "drop_rate": lambda res: res["dropped"] / max(1, res["total_arrivals"]),
+    "utilization": lambda res: res["utilization"],
+}
+
+
+# Среднее и полуширина доверительного интервала по Стьюденту
+def mean_ci(values, level=0.95):
+    arr = np.asarray(values, dtype=float)
+    n = len(arr)
+    mean = float(arr.mean()) if n else 0.0
+    if n < 2:
+        return mean, math.inf
+    se = float(arr.std(ddof=1)) / math.sqrt(n)
+    return mean, float(student_t.ppf(0.5 + level / 2, n - 1)) * se
+
+
+# Точность достигнута, если полуширина ДИ не больше абсолютного порога
+# или не больше заданной доли от модуля среднего
+def precise_enough(values, rel_precision=None, abs_precision=None, level=0.95):
+    mean, hw = mean_ci(values, level)
+    if abs_precision is not None and hw <= abs_precision:
+        return True
+    return rel_precision is not None and hw <= rel_precision * abs(mean)
+
+
+# Последовательная репликация: сначала min_reps реплик в каждой точке, затем
+# добавляются реплики только туда, где ДИ выбранных метрик еще шире заданного.
+# Размер добавки оценивается по текущей полуширине: n * (hw / цель)^2.
+# make_cfg(point, rep) возвращает конфигурацию реплики; результаты отдаются
+# как ((point, rep), res) по мере готовности.
+def run_adaptive(points, make_cfg, metrics=tuple(METRICS), rel_precision=0.05, abs_precision=None,
+                 min_reps=5, max_reps=50, level=0.95, workers=None, keys=SUMMARY_KEYS,
+                 engine="simpy", cache=None):
+    points = list(points)
+    min_reps = max(2, int(min_reps))
+    max_reps = max(min_reps, int(max_reps))
+    values = {p: {m: [] for m in metrics} for p in points}
+    scheduled = {p: 0 for p in points}
+    todo = {p: min_reps for p in points}
+
+    while todo:
+        jobs = []
+        for p, extra in todo.items():
+            for rep in range(scheduled[p], scheduled[p] + extra):
+                jobs.append(((p, rep), make_cfg(p, rep)))
+            scheduled[p] += extra
+
+        for (p, rep), res in run_sweep(jobs, workers=workers, keys=keys, engine=engine, cache=cache):
+            for m in metrics:
+                values[p][m].append(METRICS[m](res))
+            yield (p, rep), res
+
+        todo = {}
+        for p in points:
+            n = scheduled[p]
+            if n >= max_reps:
+                continue
+            need = n
+            for m in metrics:
+                if precise_enough(values[p][m], rel_precision, abs_precision, level):
+                    continue
+                mean, hw = mean_ci(values[p][m], level)
+                target = max(abs_precision or 0.0, (rel_precision or 0.0) * abs(mean))
+                need = max(need, math.ceil(n * (hw / target) ** 2) if target > 0 else max_reps)
+            if need > n:
+                todo[p] = min(need, max_reps) - n
+
+
+# Конфигурация реплики rep с учетом снижения дисперсии: при antithetic реплики
+# идут парами с общим seed, вторая в паре использует 1 - U. Обе реплики пары
+# генерируют величины методом обратной функции, иначе первая брала бы штатный
+# генератор и пара не была бы антитетической
+def replica_cfg(cfg, rep, seed, antithetic=False):
+    if antithetic:
+        return {**cfg, "seed": seed(rep // 2), "sampling": "inverse", "antithetic": rep % 2 == 1}
+    return {**cfg, "seed": seed(rep)}
+
+
+# Оценка метрики по результатам реплик (в порядке номеров) с антитетическими
+# парами и/или управляющими переменными. Управляющие переменные вычитаются
+# с коэффициентами МНК: y - (x - E[x]) * beta. Возвращает (среднее, полуширина ДИ).
+def reduced_estimate(results, metric, cfg, antithetic=False, controls=False, level=0.95):
+    y = np.array([METRICS[metric](res) for res in results], dtype=float)
+    mu = expected_controls({**mdl.DEFAULTS, **cfg}) if controls else {}
+    names = sorted(mu)
+    X = np.array([[res["controls"][c] for c in names] for res in results], dtype=float).reshape(len(y), len(names))
+
+    if antithetic:
+        n = len(y) // 2 * 2
+        y = (y[0:n:2] + y[1:n:2]) / 2
+        X = (X[0:n:2] + X[1:n:2]) / 2
+
+    if names and len(y) > len(names) + 1:
+        Xc = X - X.mean(axis=0)
+        beta = np.linalg.lstsq(Xc, y - y.mean(), rcond=None)[0]
+        y = y - (X - np.array([mu[c] for c in names])) @ beta
+    return mean_ci(y, level)
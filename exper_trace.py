@@ -0,0 +1,192 @@
+import os
+import numpy as np
+
+# Воспроизведение реальной нагрузки (arrival_dist="trace") по журналу запросов:
+# моменты поступления и, при наличии, измеренные времена обработки.
+# Файл читается порциями по trace_chunk_rows строк и никогда не загружается целиком:
+#   csv     - pandas.read_csv(chunksize=...);
+#   parquet - пакеты pyarrow из отображенного в память файла, группы строк
+#             до начала окна пропускаются по статистике без чтения;
+#   npy     - np.load(mmap_mode="r"), начало окна находится двоичным поиском.
+# Моменты в файле - числа (секунды) или даты и должны идти по неубыванию.
+#
+# Окно воспроизведения: начинается в trace_start (по умолчанию первый момент
+# файла) плюс trace_offset секунд и длится sim_time * trace_rate_scale секунд
+# журнала. trace_rate_scale > 1 сжимает время: 1.5 - та же нагрузка в 1.5 раза
+# интенсивнее. Времена обработки из журнала не масштабируются.
+
+TRACE_FORMATS = ("csv", "parquet", "npy")
+CHUNK_ROWS = 1 << 18
+
+
+def trace_format(cfg):
+    fmt = cfg.get("trace_format")
+    if fmt is None:
+        name = str(cfg["trace_path"]).lower()
+        if name.endswith((".parquet", ".pq")):
+            fmt = "parquet"
+        elif name.endswith(".npy"):
+            fmt = "npy"
+        else:
+            fmt = "csv"
+    if fmt not in TRACE_FORMATS:
+        raise ValueError(f"Неизвестный формат трассы: {fmt!r}, допустимы {TRACE_FORMATS}")
+    return fmt
+
+
+def _check(cfg):
+    if not cfg.get("trace_path"):
+        raise ValueError("Для arrival_dist='trace' нужен путь к журналу trace_path")
+    if cfg.get("trace_rate_scale", 1.0) <= 0:
+        raise ValueError("trace_rate_scale должен быть положительным")
+
+
+# Секунды (float64) из числового столбца, datetime64 или строк с датами
+def _seconds(values):
+    values = np.asarray(values)
+    if values.dtype.kind == "M":
+        return values.astype("datetime64[ns]").astype(np.int64) / 1e9
+    if values.dtype.kind in "OUS":
+        import pandas as pd
+        stamps = pd.to_datetime(values, utc=True)
+        return np.asarray((stamps - pd.Timestamp(0, tz="UTC")) / pd.Timedelta(1, "s"), dtype=np.float64)
+    return values.astype(np.float64, copy=False)
+
+
+def _columns(cfg):
+    cols = [cfg.get("trace_time_column", "timestamp")]
+    if cfg.get("trace_service_column"):
+        cols.append(cfg["trace_service_column"])
+    return cols
+
+
+# Порции (моменты в секундах журнала, времена обработки или None) начиная
+# примерно с window_start: более ранние строки могут попасть в первую порцию
+def _csv_chunks(cfg, window_start):
+    import pandas as pd
+    cols = _columns(cfg)
+    reader = pd.read_csv(cfg["trace_path"], usecols=cols, chunksize=int(cfg.get("trace_chunk_rows", CHUNK_ROWS)))
+    with reader:
+        for df in reader:
+            ts = _seconds(df[cols[0]].to_numpy())
+            if window_start is not None and len(ts) and ts[-1] < window_start:
+                continue
+            yield ts, df[cols[1]].to_numpy(dtype=np.float64) if len(cols) > 1 else None
+
+
+def _parquet_file(cfg):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    return pq.ParquetFile(pa.memory_map(str(cfg["trace_path"]), "r"))
+
+
+# Максимум столбца в группе строк по статистике файла (None - статистики нет)
+def _row_group_max(pf, group, column):
+    meta = pf.metadata.row_group(group)
+    for i in range(meta.num_columns):
+        col = meta.column(i)
+        if col.path_in_schema == column:
+            stats = col.statistics
+            if stats is None or not stats.has_min_max:
+                return None
+            return float(_seconds(np.array([stats.max]))[0])
+    return None
+
+
+def _parquet_chunks(cfg, window_start):
+    cols = _columns(cfg)
+    pf = _parquet_file(cfg)
+    groups = list(range(pf.num_row_groups))
+    if window_start is not None:
+        while groups:
+            hi = _row_group_max(pf, groups[0], cols[0])
+            if hi is None or hi >= window_start:
+                break
+            groups.pop(0)
+    if not groups:
+        return
+    for batch in pf.iter_batches(batch_size=int(cfg.get("trace_chunk_rows", CHUNK_ROWS)),
+                                 row_groups=groups, columns=cols):
+        ts = _seconds(batch.column(0).to_numpy(zero_copy_only=False))
+        svc = batch.column(1).to_numpy(zero_copy_only=False).astype(np.float64) if len(cols) > 1 else None
+        yield ts, svc
+
+
+# Одномерный массив моментов или структурированный массив с именованными столбцами
+def _npy_columns(cfg):
+    data = np.load(cfg["trace_path"], mmap_mode="r")
+    if data.dtype.names is None:
+        if cfg.get("trace_service_column"):
+            raise ValueError("Одномерный .npy содержит только моменты поступления; "
+                             "для времен обработки нужен структурированный массив")
+        return data, None
+    cols = _columns(cfg)
+    return data[cols[0]], data[cols[1]] if len(cols) > 1 else None
+
+
+def _npy_chunks(cfg, window_start):
+    times, services = _npy_columns(cfg)
+    rows = int(cfg.get("trace_chunk_rows", CHUNK_ROWS))
+    start = 0
+    if window_start is not None and times.dtype.kind != "M":
+        start = int(np.searchsorted(times, window_start, side="left"))
+    for lo in range(start, len(times), rows):
+        hi = lo + rows
+        yield (_seconds(np.array(times[lo:hi])),
+               np.array(services[lo:hi], dtype=np.float64) if services is not None else None)
+
+
+_READERS = {"csv": _csv_chunks, "parquet": _parquet_chunks, "npy": _npy_chunks}
+
+
+def _first_timestamp(cfg):
+    for ts, _ in _READERS[trace_format(cfg)](cfg, None):
+        if len(ts):
+            return float(ts[0])
+    raise ValueError(f"Журнал {cfg['trace_path']} не содержит запросов")
+
+
+# Порции (моменты поступления в модельном времени на [0, sim_time),
+# времена обработки или None) в хронологическом порядке
+def iter_trace(cfg):
+    _check(cfg)
+    sim_time = float(cfg["sim_time"])
+    scale = float(cfg.get("trace_rate_scale", 1.0))
+    start = cfg.get("trace_start")
+    start = _first_timestamp(cfg) if start is None else float(_seconds(np.array([start]))[0])
+    window_start = start + float(cfg.get("trace_offset", 0.0))
+
+    last = -np.inf
+    for ts, svc in _READERS[trace_format(cfg)](cfg, window_start):
+        if len(ts) == 0:
+            continue
+        if ts[0] < last or np.any(np.diff(ts) < 0):
+            raise ValueError("Моменты поступления в журнале должны идти по неубыванию")
+        last = ts[-1]
+        t = (ts - window_start) / scale
+        lo = int(np.searchsorted(t, 0.0, side="left"))
+        hi = int(np.searchsorted(t, sim_time, side="left"))
+        if hi > lo:
+            if svc is not None:
+                svc = svc[lo:hi]
+                if not np.all(svc >= 0):
+                    raise ValueError("Времена обработки в журнале должны быть неотрицательными числами")
+            yield t[lo:hi], svc
+        if hi < len(t):
+            return
+
+
+# Все запросы окна одним массивом (векторизованный движок);
+# память пропорциональна размеру окна, а не файла
+def read_window(cfg):
+    parts = list(iter_trace(cfg))
+    times = np.concatenate([t for t, _ in parts]) if parts else np.empty(0)
+    if not cfg.get("trace_service_column"):
+        return times, None
+    return times, np.concatenate([s for _, s in parts]) if parts else np.empty(0)
+
+
+# Размер и время изменения файла журнала - часть ключа кэша результатов
+def trace_signature(cfg):
+    st = os.stat(cfg["trace_path"])
+    return [st.st_size, st.st_mtime_ns]
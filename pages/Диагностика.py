@@ -0,0 +1,102 @@
+import streamlit as st
+import pandas as pd
+import matplotlib.pyplot as plt
+from collections import Counter
+import exper_cloud as mdl
+import exper_instrument
+
+st.set_page_config(page_title="Диагностика производительности", layout="wide")
+st.title("Диагностика производительности модели")
+
+st.header("Параметры прогона")
+
+strategy_map = {
+    "Постановка в очередь": "queue",
+    "Отклонение": "reject",
+    "Ограничение скорости": "rate_limit"
+}
+strategy_display = st.selectbox("Стратегия регулирования", list(strategy_map.keys()))
+strategy = strategy_map[strategy_display]
+
+cfg = {"strategy": strategy, "instrument": True}
+if strategy == "queue":
+    queue_size = st.number_input("Размер очереди (-1 для неограниченной)", value=50)
+    cfg["queue_size"] = int(queue_size) if queue_size >= 0 else None
+elif strategy == "rate_limit":
+    cfg["rate_limit_rps"] = st.number_input("Максимальная скорость (запросы/сек)", value=20.0)
+
+cfg["sim_time"] = st.number_input("Время моделирования (сек)", value=600.0, min_value=1.0)
+cfg["arrival_rate"] = st.number_input("Среднее количество запросов в секунду", value=20.0)
+cfg["service_mean"] = st.number_input("Среднее время обработки (сек)", value=0.08)
+cfg["num_servers"] = st.slider("Количество параллельных серверов", 1, 10, 2)
+cfg["seed"] = int(st.number_input("Seed для генератора случайных чисел", value=1234))
+cfg["event_log"] = st.checkbox("Вести журнал событий", value=True)
+
+engine = "simpy"
+if strategy in mdl.exper_numpy.SUPPORTED_STRATEGIES:
+    engine_map = {
+        "Событийная модель (SimPy)": "simpy",
+        "Векторизованная рекурсия Линдли (NumPy)": "numpy"
+    }
+    engine = engine_map[st.selectbox("Движок моделирования", list(engine_map.keys()))]
+
+profile_map = {
+    "Без профиля": None,
+    "cProfile (время по функциям)": "cprofile",
+    "tracemalloc (выделения памяти)": "tracemalloc"
+}
+cfg["profile"] = profile_map[st.selectbox("Режим профилирования", list(profile_map.keys()))]
+cfg["profile_top"] = int(st.number_input("Строк профиля", value=25, min_value=5))
+count_hooks = st.checkbox("Считать события подписчиками", value=False, disabled=engine != "simpy",
+                          help="Подписчики вызываются на каждое событие и замедляют прогон")
+
+if st.button("Запустить диагностику"):
+    hooks = None
+    seen = Counter()
+    if count_hooks and engine == "simpy":
+        hooks = {name: (lambda t, event, req_id: seen.update((event,)))
+                 for name in exper_instrument.HOOK_EVENTS}
+
+    with st.spinner("Запуск модели..."):
+        res = mdl.model_env(cfg, engine=engine, hooks=hooks)
+    info = res["instrumentation"]
+
+    st.header("Результаты")
+    counters = info["counters"]
+    st.metric("Время прогона (сек)", f"{info['wall_time']:.4f}")
+    st.metric("Время на секунду модели (мс)", f"{info['wall_time'] / cfg['sim_time'] * 1000:.3f}")
+    st.metric("Запросов в секунду", f"{res['total_arrivals'] / info['wall_time']:.0f}" if info["wall_time"] > 0 else "-")
+
+    # Этапы прогона; генерация случайных величин входит в этап run
+    st.subheader("Время по этапам")
+    df_phases = pd.DataFrame(list(info["phases"].items()), columns=["Этап", "Время (сек)"])
+    df_phases["Доля"] = df_phases["Время (сек)"] / info["wall_time"]
+    st.dataframe(df_phases)
+    fig, ax = plt.subplots(figsize=(6, 2.5))
+    ax.barh(df_phases["Этап"], df_phases["Время (сек)"])
+    ax.set_xlabel("Время (сек)")
+    st.pyplot(fig)
+
+    st.subheader("Счетчики")
+    st.dataframe(pd.DataFrame(list(counters.items()), columns=["Счетчик", "Значение"]))
+
+    if hooks:
+        st.subheader("События по данным подписчиков")
+        st.dataframe(pd.DataFrame(sorted(seen.items()), columns=["Событие", "Количество"]))
+
+    data = info["profile_data"]
+    if info["profile"] == "cprofile":
+        st.subheader("Профиль cProfile (по собственному времени)")
+        st.dataframe(pd.DataFrame(data["functions"]))
+        with st.expander("Отчет pstats"):
+            st.text(data["text"])
+        st.download_button("Скачать отчет", data["text"], file_name="profile.txt")
+    elif info["profile"] == "tracemalloc":
+        st.subheader("Выделения памяти tracemalloc")
+        st.metric("Пик / текущий объем (КБ)",
+                  f"{data['peak_bytes'] / 1024:.1f} / {data['current_bytes'] / 1024:.1f}")
+        st.dataframe(pd.DataFrame(data["allocations"]).rename(
+            columns={"location": "Строка", "size": "Байт", "count": "Блоков"}))
+
+    st.sidebar.subheader("Использованная конфигурация")
+    st.sidebar.json(res["config"])
@@ -0,0 +1,127 @@
+import streamlit as st
+import pandas as pd
+import exper_cloud as mdl
+import exper_cache
+import exper_search as search
+from exper_classes import CLASS_SCHEDULING
+
+st.set_page_config(page_title="Классы запросов", layout="wide")
+st.title("Классы запросов: приоритеты, справедливое обслуживание и квоты")
+
+st.header("Классы")
+st.write("У каждого класса свой поток запросов, время обработки и SLO. Приоритет: меньше - важнее. "
+         "Вес используется при взвешенном справедливом обслуживании (WFQ), квота ограничивает число "
+         "ожидающих запросов класса.")
+
+default_classes = pd.DataFrame([
+    {"name": "interactive", "arrival_rate": 12.0, "service_dist": "exponential", "service_mean": 0.05,
+     "service_std": 0.02, "priority": 0, "weight": 4.0, "queue_quota": None, "slo_p99": 0.5},
+    {"name": "batch", "arrival_rate": 6.0, "service_dist": "exponential", "service_mean": 0.15,
+     "service_std": 0.05, "priority": 1, "weight": 1.0, "queue_quota": 30, "slo_p99": 5.0},
+    {"name": "background", "arrival_rate": 4.0, "service_dist": "exponential", "service_mean": 0.1,
+     "service_std": 0.03, "priority": 2, "weight": 0.5, "queue_quota": 10, "slo_p99": None},
+])
+distributions = ["exponential", "deterministic", "uniform", "normal"]
+classes_df = st.data_editor(default_classes, num_rows="dynamic", column_config={
+    "name": st.column_config.TextColumn("Класс", required=True),
+    "arrival_rate": st.column_config.NumberColumn("Нагрузка (запросы/сек)", min_value=0.0),
+    "service_dist": st.column_config.SelectboxColumn("Распределение обработки", options=distributions),
+    "service_mean": st.column_config.NumberColumn("Среднее время обработки (сек)", min_value=0.0, format="%.4f"),
+    "service_std": st.column_config.NumberColumn("Ст. отклонение (сек)", min_value=0.0, format="%.4f"),
+    "priority": st.column_config.NumberColumn("Приоритет", step=1),
+    "weight": st.column_config.NumberColumn("Вес WFQ", min_value=0.001),
+    "queue_quota": st.column_config.NumberColumn("Квота очереди", min_value=0, step=1,
+                                                 help="Пусто - без квоты"),
+    "slo_p99": st.column_config.NumberColumn("SLO: p99 не более (сек)", min_value=0.0, format="%.3f",
+                                             help="Пусто - без SLO"),
+})
+
+
+# Строка таблицы -> словарь класса exper_classes
+def parse_class(row):
+    return {
+        "name": str(row["name"]),
+        "arrival_rate": float(row["arrival_rate"]),
+        "service_dist": row["service_dist"],
+        "service_mean": float(row["service_mean"]),
+        "service_std": float(row["service_std"]),
+        "priority": int(row["priority"]),
+        "weight": float(row["weight"]),
+        "queue_quota": None if pd.isna(row["queue_quota"]) else int(row["queue_quota"]),
+        "slo": {} if pd.isna(row["slo_p99"]) else {"p99": float(row["slo_p99"])},
+    }
+
+
+st.header("Обслуживание")
+scheduling_names = {
+    "fifo": "Общая очередь (FIFO)",
+    "priority": "Строгий приоритет",
+    "preemptive": "Строгий приоритет с прерыванием",
+    "wfq": "Взвешенное справедливое обслуживание (WFQ)"
+}
+compare = st.checkbox("Сравнить все порядки обслуживания", value=True)
+schedulings = list(CLASS_SCHEDULING)
+if not compare:
+    schedulings = [st.selectbox("Порядок обслуживания", schedulings, format_func=scheduling_names.get)]
+num_servers = st.slider("Количество параллельных серверов", 1, 20, 2)
+queue_size = st.number_input("Общий размер очереди (-1 для неограниченной)", value=-1)
+sim_time = st.number_input("Время моделирования (сек)", value=600.0, min_value=1.0)
+seed = st.number_input("Seed для генератора случайных чисел", value=1234)
+use_cache = st.checkbox("Использовать кэш результатов", value=True)
+
+if st.button("Запустить симуляцию"):
+    try:
+        classes = [parse_class(row) for _, row in classes_df.dropna(subset=["name"]).iterrows()]
+    except (ValueError, TypeError) as e:
+        st.error(f"Ошибка в описании классов: {e}")
+        st.stop()
+    rows = []
+    for scheduling in schedulings:
+        params = {
+            "sim_time": sim_time,
+            "num_servers": int(num_servers),
+            "strategy": "queue",
+            "queue_size": int(queue_size) if queue_size >= 0 else None,
+            "arrival_dist": "exponential",
+            "seed": int(seed),
+            "event_log": False,
+            "classes": classes,
+            "class_scheduling": scheduling,
+        }
+        try:
+            with st.spinner(f"{scheduling_names[scheduling]}..."):
+                if use_cache:
+                    res = exper_cache.cached_model_env(params)
+                else:
+                    res = mdl.model_env(params)
+        except ValueError as e:
+            st.error(str(e))
+            st.stop()
+        for c in classes:
+            r = res["classes"][c["name"]]
+            slo_ok = None
+            if c["slo"]:
+                slo_ok = all(search.SLO_METRICS[m](r) <= v for m, v in c["slo"].items())
+            rows.append({
+                "Порядок": scheduling_names[scheduling],
+                "Класс": c["name"],
+                "Поступило": r["total_arrivals"],
+                "Обработано": r["processed"],
+                "Отклонено": r["dropped"],
+                "Среднее время отклика (сек)": r["avg_response_time"],
+                **{f"{k} (сек)": v for k, v in r["response_quantiles"].items()},
+                "Доля серверов": r["utilization"],
+                "Средняя очередь": r["mean_queue_len"],
+                "Прерываний": r["preemptions"],
+                "SLO выполнен": slo_ok,
+            })
+
+    df = pd.DataFrame(rows)
+    st.header("Показатели классов")
+    st.dataframe(df)
+    st.subheader("p99 времени отклика по классам (сек)")
+    st.bar_chart(df.pivot(index="Класс", columns="Порядок", values="p99 (сек)"))
+    st.subheader("Доля отклоненных по классам")
+    df["Доля отклоненных"] = df["Отклонено"] / df["Поступило"].clip(lower=1)
+    st.bar_chart(df.pivot(index="Класс", columns="Порядок", values="Доля отклоненных"))
+    st.download_button("Скачать показатели классов (CSV)", df.to_csv(index=False), file_name="classes.csv")
@@ -0,0 +1,136 @@
+import os
+import streamlit as st
+import exper_sweep as sweep
+import exper_cache
+import exper_design as design
+
+st.set_page_config(page_title="Многофакторный эксперимент", layout="wide")
+st.title("Многофакторный эксперимент: полный факторный план и латинский гиперкуб")
+
+st.header("Параметры эксперимента")
+
+# Общие параметры модели
+strategy_map = {
+    "Постановка в очередь": "queue",
+    "Отклонение": "reject",
+    "Ограничение скорости": "rate_limit"
+}
+strategy_display = st.selectbox("Стратегия регулирования", list(strategy_map.keys()))
+base = {"strategy": strategy_map[strategy_display]}
+base["sim_time"] = st.number_input("Время моделирования (сек)", value=60.0, min_value=1.0)
+if base["strategy"] == "rate_limit":
+    base["rate_limit_rps"] = st.number_input("Максимальная скорость (запросы/сек)", value=20.0)
+
+service_map = {
+    "Экспоненциальное": "exponential",
+    "Постоянное": "deterministic",
+    "Равномерное": "uniform",
+    "Нормальное": "normal"
+}
+base["service_dist"] = service_map[st.selectbox("Распределение времени обработки", list(service_map.keys()))]
+
+# Факторы и диапазоны
+st.subheader("Факторы")
+factor_names = {
+    "queue_size": "Размер очереди",
+    "num_servers": "Число серверов",
+    "arrival_rate": "Интенсивность запросов (запросы/сек)",
+    "service_mean": "Среднее время обработки (сек)",
+    "timeout_total": "Таймаут клиента (сек)",
+    "retries": "Число повторов клиента"
+}
+factor_defaults = {
+    "queue_size": (5, 100, True),
+    "num_servers": (1, 8, True),
+    "arrival_rate": (5.0, 40.0, False),
+    "service_mean": (0.02, 0.2, False),
+    "timeout_total": (0.2, 2.0, False),
+    "retries": (0, 5, True)
+}
+selected = st.multiselect("Изменяемые факторы", list(factor_names.values()),
+                          default=[factor_names[k] for k in design.FACTORS])
+design_map = {"Полный факторный план": "factorial", "Латинский гиперкуб": "lhs"}
+design_type = design_map[st.selectbox("Тип плана", list(design_map.keys()))]
+
+factors = {}
+for key, label in factor_names.items():
+    low, high, integer = factor_defaults[key]
+    if label not in selected:
+        continue
+    cols = st.columns(4)
+    f_low = cols[0].number_input(f"{label}: от", value=low)
+    f_high = cols[1].number_input(f"{label}: до", value=high)
+    spec = {"low": f_low, "high": f_high, "integer": integer}
+    if design_type == "factorial":
+        spec["levels"] = int(cols[2].number_input(f"{label}: уровней", value=3, min_value=1))
+    if cols[3].checkbox(f"{label}: логарифмическая шкала", value=False):
+        spec["scale"] = "log"
+    factors[key] = spec
+
+samples = None
+if design_type == "lhs":
+    samples = int(st.number_input("Число точек плана", value=50, min_value=2))
+replicas = int(st.number_input("Реплик на точку", value=5, min_value=1))
+seed0 = int(st.number_input("Начальный seed", value=1000, min_value=0))
+workers = st.number_input("Число параллельных процессов", value=sweep.default_workers(), min_value=1)
+use_cache = st.checkbox("Использовать кэш результатов", value=True)
+
+spec = {"design": design_type, "factors": factors, "base": base, "replicas": replicas, "seed": seed0, "engine": "simpy"}
+if samples is not None:
+    spec["samples"] = samples
+
+# Файл прогона: повторный запуск с тем же планом продолжает его
+run_name = st.text_input("Имя прогона", value=f"design-{design.spec_hash(spec)}")
+path = design.run_path(run_name)
+n_points = len(design.design_points(spec)) if factors else 0
+header, done, _ = design.load_run(path)
+st.write(f"Точек в плане: {n_points}, прогонов модели: {n_points * replicas}")
+if header is not None:
+    if header.get("spec_hash") == design.spec_hash(spec):
+        st.info(f"Найден прогон «{run_name}»: завершено {len(done)} из {n_points} точек, запуск продолжит его")
+    else:
+        st.warning(f"Прогон «{run_name}» выполнялся с другим планом; выберите другое имя или начните заново")
+restart = st.checkbox("Начать заново (удалить сохраненные результаты)", value=False)
+
+if st.button("Запустить эксперимент"):
+    if not factors:
+        st.error("Выберите хотя бы один фактор")
+        st.stop()
+    cache = exper_cache.default_cache() if use_cache else None
+    completed = 0 if restart else len(done)
+    progress = st.progress(completed / max(1, n_points))
+    status = st.empty()
+    try:
+        for row in design.run_design(spec, path, workers=workers, cache=cache, restart=restart):
+            completed += 1
+            progress.progress(min(1.0, completed / max(1, n_points)))
+            status.write(f"Завершено точек: {completed} из {n_points}")
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
+    progress.progress(1.0)
+
+# Результаты (в том числе частичные после прерванного запуска)
+if os.path.exists(path):
+    df = design.results_frame(path)
+    if len(df):
+        st.header("Результаты эксперимента")
+        metric_map = {
+            "Среднее время отклика (сек)": "mean_response",
+            "Доля отклоненных": "mean_drop_rate",
+            "Загруженность серверов": "mean_utilization",
+            "Время отклика p99 (сек)": "mean_p99",
+            "Пропускная способность (запросы/сек)": "mean_throughput",
+            "Полезная пропускная способность (запросы/сек)": "mean_goodput",
+            "Попыток на запрос": "mean_retry_amplification"
+        }
+        factor_cols = [k for k in factor_names if k in df.columns]
+        metric = metric_map[st.selectbox("Показатель", list(metric_map.keys()))]
+        x = st.selectbox("По горизонтали", factor_cols, format_func=factor_names.get)
+        color = st.selectbox("Цвет", [None] + [f for f in factor_cols if f != x],
+                             format_func=lambda k: "-" if k is None else factor_names[k])
+        st.scatter_chart(df, x=x, y=metric, color=color)
+
+        st.subheader("Таблица с результатами")
+        st.dataframe(df.rename(columns=factor_names))
+        st.download_button("Скачать результаты (CSV)", df.to_csv(index=False), file_name=f"{run_name}.csv")
@@ -0,0 +1,146 @@
+import streamlit as st
+import pandas as pd
+import exper_sweep as sweep
+import exper_cache
+import exper_search as search
+
+st.set_page_config(page_title="Поиск мощности под SLO", layout="wide")
+st.title("Поиск минимальной мощности под SLO")
+
+st.header("Параметры модели")
+
+strategy_map = {
+    "Постановка в очередь": "queue",
+    "Отклонение": "reject",
+    "Ограничение скорости": "rate_limit"
+}
+strategy_display = st.selectbox("Стратегия регулирования", list(strategy_map.keys()))
+base = {"strategy": strategy_map[strategy_display], "event_log": False, "state_history": False}
+base["sim_time"] = st.number_input("Время моделирования (сек)", value=60.0, min_value=1.0)
+base["arrival_rate"] = st.number_input("Нагрузка (запросы/сек)", value=40.0, min_value=0.1)
+
+service_map = {
+    "Экспоненциальное": "exponential",
+    "Постоянное": "deterministic",
+    "Равномерное": "uniform",
+    "Нормальное": "normal"
+}
+base["service_dist"] = service_map[st.selectbox("Распределение времени обработки", list(service_map.keys()))]
+base["service_mean"] = st.number_input("Среднее время обработки (сек)", value=0.08, min_value=0.001, format="%.3f")
+base["num_servers"] = int(st.number_input("Число серверов (если не ищется)", value=4, min_value=1))
+if base["strategy"] == "queue":
+    base["queue_size"] = int(st.number_input("Размер очереди (если не ищется)", value=50, min_value=1))
+if base["strategy"] == "rate_limit":
+    base["rate_limit_rps"] = st.number_input("Максимальная скорость (запросы/сек, если не ищется)", value=20.0)
+
+st.header("SLO")
+slo = {}
+cols = st.columns(3)
+if cols[0].checkbox("Ограничить p99 времени отклика", value=True):
+    slo["p99"] = cols[0].number_input("p99 не более (сек)", value=0.5, min_value=0.0, format="%.3f")
+if cols[1].checkbox("Ограничить долю отклоненных", value=True):
+    slo["drop_rate"] = cols[1].number_input("Доля отклоненных не более (%)", value=1.0, min_value=0.0) / 100
+if cols[2].checkbox("Ограничить среднее время отклика", value=False):
+    slo["mean_response"] = cols[2].number_input("Среднее не более (сек)", value=0.2, min_value=0.0, format="%.3f")
+
+st.header("Поиск")
+param_names = {
+    "num_servers": "Число серверов",
+    "queue_size": "Размер очереди",
+    "rate_limit_rps": "Максимальная скорость (запросы/сек)"
+}
+param_defaults = {
+    "num_servers": (1, 32, True),
+    "queue_size": (1, 200, True),
+    "rate_limit_rps": (1.0, 200.0, False)
+}
+mode_map = {
+    "Один параметр (бисекция)": "bisect",
+    "Несколько параметров (суррогатная модель)": "surrogate"
+}
+mode = mode_map[st.selectbox("Режим поиска", list(mode_map.keys()))]
+available = [k for k in param_names if k != "rate_limit_rps" or base["strategy"] == "rate_limit"]
+
+if mode == "bisect":
+    parameter = st.selectbox("Параметр", available, format_func=param_names.get)
+    low, high, integer = param_defaults[parameter]
+    cols = st.columns(3)
+    p_low = cols[0].number_input("От", value=low)
+    p_high = cols[1].number_input("До", value=high)
+    tol = None
+    if not integer:
+        tol = cols[2].number_input("Точность", value=0.5, min_value=1e-6)
+    goal_map = {"Наименьшее допустимое": "min", "Наибольшее допустимое": "max"}
+    goal = goal_map[st.selectbox("Искать", list(goal_map.keys()),
+                                 help="Для наибольшего значения допустимость должна убывать с ростом параметра")]
+else:
+    selected = st.multiselect("Параметры", available, default=available[:2], format_func=param_names.get)
+    factors, cost = {}, {}
+    for key in selected:
+        low, high, integer = param_defaults[key]
+        cols = st.columns(3)
+        f_low = cols[0].number_input(f"{param_names[key]}: от", value=low)
+        f_high = cols[1].number_input(f"{param_names[key]}: до", value=high)
+        factors[key] = {"low": f_low, "high": f_high, "integer": integer}
+        cost[key] = cols[2].number_input(f"{param_names[key]}: стоимость единицы", value=1.0,
+                                         help="Минимизируется сумма стоимостей; отрицательная - чем больше, тем лучше")
+    budget = int(st.number_input("Бюджет проверок после начального плана", value=20, min_value=1))
+
+level = st.slider("Уровень доверия", min_value=0.8, max_value=0.99, value=0.95, step=0.01)
+cols = st.columns(2)
+min_reps = int(cols[0].number_input("Начальное число реплик в точке", value=5, min_value=2))
+max_reps = int(cols[1].number_input("Максимальное число реплик в точке", value=40, min_value=2))
+seed0 = int(st.number_input("Начальный seed", value=1000, min_value=0))
+workers = st.number_input("Число параллельных процессов", value=sweep.default_workers(), min_value=1)
+use_cache = st.checkbox("Использовать кэш результатов", value=True)
+
+if st.button("Найти"):
+    if not slo:
+        st.error("Задайте хотя бы одно ограничение SLO")
+        st.stop()
+    cache = exper_cache.default_cache() if use_cache else None
+    status = st.empty()
+    table = st.empty()
+    rows = []
+
+    # Таблица проверенных точек обновляется по мере поиска
+    def progress(rec):
+        row = {**rec["point"], "Реплик": rec["replicas"], "Решение": rec["decision"], "Запас": rec["margin"]}
+        for m, v in rec["metrics"].items():
+            row[m] = v["mean"]
+            row[f"ci_{m}"] = v["ci"]
+        rows.append(row)
+        status.write(f"Проверено точек: {len(rows)}")
+        table.dataframe(pd.DataFrame(rows).rename(columns=param_names))
+
+    opts = dict(level=level, min_reps=min_reps, max_reps=max_reps, seed=seed0,
+                workers=workers, cache=cache, progress=progress)
+    try:
+        if mode == "bisect":
+            result = search.bisect_search(base, parameter, p_low, p_high, slo, goal=goal, tol=tol, **opts)
+        else:
+            if not factors:
+                st.error("Выберите хотя бы один параметр")
+                st.stop()
+            result = search.surrogate_search(base, factors, slo, cost=cost, budget=budget, **opts)
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
+
+    st.header("Результат")
+    if result["feasible"]:
+        st.success(result["statement"])
+    else:
+        st.warning(result["statement"])
+    st.write(f"Прогонов модели: {result['simulations']}, проверено точек: {len(result['evaluations'])}")
+
+    df = pd.DataFrame(rows)
+    if mode == "bisect":
+        metric = next(iter(slo))
+        chart = df.sort_values(parameter)
+        st.subheader(f"{metric} по проверенным точкам (порог {slo[metric]})")
+        st.line_chart(chart, x=parameter, y=metric)
+    elif len(factors) >= 2:
+        x, y = list(factors)[:2]
+        st.subheader("Проверенные точки")
+        st.scatter_chart(df, x=x, y=y, color="Решение")
@@ -0,0 +1,126 @@
+import streamlit as st
+import pandas as pd
+import exper_cloud as mdl
+import exper_cache
+
+st.set_page_config(page_title="Сеть сервисов", layout="wide")
+st.title("Модель сети сервисов: шлюз, приложение, база данных")
+
+st.header("Уровни сети")
+st.write("Запросы поступают на первый уровень. Переходы задаются в виде «уровень:вероятность, ...»; "
+         "остаток вероятности - ответ без дальнейших вызовов.")
+
+default_tiers = pd.DataFrame([
+    {"name": "gateway", "servers": 8, "strategy": "queue", "queue_size": 200, "rate_limit_rps": 100.0,
+     "service_dist": "exponential", "service_mean": 0.002, "service_std": 0.001,
+     "routes": "app:1.0", "pool_size": 16, "hold": True},
+    {"name": "app", "servers": 6, "strategy": "queue", "queue_size": 50, "rate_limit_rps": 100.0,
+     "service_dist": "exponential", "service_mean": 0.03, "service_std": 0.01,
+     "routes": "db:0.7", "pool_size": 4, "hold": True},
+    {"name": "db", "servers": 3, "strategy": "queue", "queue_size": 20, "rate_limit_rps": 100.0,
+     "service_dist": "exponential", "service_mean": 0.02, "service_std": 0.005,
+     "routes": "", "pool_size": None, "hold": True},
+])
+strategies = ["queue", "reject", "rate_limit"]
+distributions = ["exponential", "deterministic", "uniform", "normal"]
+tiers_df = st.data_editor(default_tiers, num_rows="dynamic", column_config={
+    "name": st.column_config.TextColumn("Уровень", required=True),
+    "servers": st.column_config.NumberColumn("Обработчиков", min_value=1, step=1),
+    "strategy": st.column_config.SelectboxColumn("Стратегия", options=strategies),
+    "queue_size": st.column_config.NumberColumn("Размер очереди", min_value=0, step=1,
+                                                help="Пусто - неограниченная очередь"),
+    "rate_limit_rps": st.column_config.NumberColumn("Лимит (запросы/сек)", min_value=0.0),
+    "service_dist": st.column_config.SelectboxColumn("Распределение обработки", options=distributions),
+    "service_mean": st.column_config.NumberColumn("Среднее время обработки (сек)", min_value=0.0, format="%.4f"),
+    "service_std": st.column_config.NumberColumn("Ст. отклонение (сек)", min_value=0.0, format="%.4f"),
+    "routes": st.column_config.TextColumn("Переходы"),
+    "pool_size": st.column_config.NumberColumn("Пул соединений", min_value=1, step=1,
+                                               help="Пусто - без ограничения"),
+    "hold": st.column_config.CheckboxColumn("Синхронный вызов"),
+})
+
+
+# Строка таблицы -> словарь уровня exper_network
+def parse_tier(row):
+    routes = {}
+    for part in str(row["routes"] or "").split(","):
+        if part.strip():
+            name, prob = part.split(":")
+            routes[name.strip()] = float(prob)
+    return {
+        "name": str(row["name"]),
+        "servers": int(row["servers"]),
+        "strategy": row["strategy"],
+        "queue_size": None if pd.isna(row["queue_size"]) else int(row["queue_size"]),
+        "rate_limit_rps": float(row["rate_limit_rps"]),
+        "service_dist": row["service_dist"],
+        "service_mean": float(row["service_mean"]),
+        "service_std": float(row["service_std"]),
+        "routes": routes,
+        "pool_size": None if pd.isna(row["pool_size"]) else int(row["pool_size"]),
+        "hold": bool(row["hold"]),
+    }
+
+
+st.header("Входящая нагрузка")
+arrival_rate = st.number_input("Среднее количество запросов в секунду", value=100.0, min_value=0.1)
+sim_time = st.number_input("Время моделирования (сек)", value=60.0, min_value=1.0)
+seed = st.number_input("Seed для генератора случайных чисел", value=1234)
+use_cache = st.checkbox("Использовать кэш результатов", value=True)
+
+if st.button("Запустить симуляцию"):
+    try:
+        tiers = [parse_tier(row) for _, row in tiers_df.dropna(subset=["name"]).iterrows()]
+    except (ValueError, TypeError) as e:
+        st.error(f"Ошибка в описании уровней: {e}")
+        st.stop()
+    params = {
+        "sim_time": sim_time,
+        "arrival_dist": "exponential",
+        "arrival_rate": arrival_rate,
+        "seed": int(seed),
+        "event_log": False,
+        "tiers": tiers,
+    }
+    try:
+        with st.spinner("Запуск модели..."):
+            if use_cache:
+                res = exper_cache.cached_model_env(params)
+            else:
+                res = mdl.model_env(params)
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
+
+    st.header("Сквозные показатели")
+    cols = st.columns(4)
+    cols[0].metric("Всего запросов", res["total_arrivals"])
+    cols[1].metric("Успешно обработано", res["processed"])
+    cols[2].metric("Отказов", res["dropped"])
+    q = res["response_quantiles"]
+    cols[3].metric("Время отклика p50 / p99 (сек)", f"{q['p50']:.4f} / {q['p99']:.4f}")
+
+    st.header("Показатели уровней")
+    df = pd.DataFrame([{
+        "Уровень": name,
+        "Поступило": t["arrivals"],
+        "Отклонено": t["dropped"],
+        "Ошибок ниже": t["failed"],
+        "Обработано": t["processed"],
+        "Время отклика (сек)": t["avg_response_time"],
+        **{f"{k} (сек)": v for k, v in t["response_quantiles"].items()},
+        "Загруженность": t["utilization"],
+        "Средняя очередь": t["mean_queue_len"],
+        "Пул: занято в среднем": t["mean_pool_in_use"],
+        "Пул: ожидание (сек)": t["avg_pool_wait"],
+    } for name, t in res["tiers"].items()]).set_index("Уровень")
+    st.dataframe(df)
+
+    st.subheader("Время отклика уровня (с учетом нижележащих вызовов)")
+    st.bar_chart(df[["Время отклика (сек)"] + [c for c in df.columns if c.startswith("p")]])
+    st.subheader("Загруженность уровней")
+    st.bar_chart(df["Загруженность"])
+
+    st.download_button("Скачать показатели уровней (CSV)", df.to_csv(), file_name="tiers.csv")
+    st.sidebar.subheader("Использованная конфигурация")
+    st.sidebar.json(res["config"])
@@ -3,7 +3,9 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mtick
 import numpy as np
-import exper_cloud as mdl
+import exper_sweep as sweep
+import exper_cache
+import exper_steady
 from scipy.stats import f_oneway
 
 st.set_page_config(page_title="Эксперимент с rate_limit", layout="wide")
@@ -62,6 +64,23 @@ if service_dist in ["normal", "uniform"]:
 num_servers = st.slider("Число параллельных серверов", 1, 20, 2)
 cfg["num_servers"] = int(num_servers)
 
+limiter_map = {
+    "Ведро токенов": "token_bucket",
+    "GCRA": "gcra",
+    "Дырявое ведро": "leaky_bucket",
+    "Скользящее окно": "sliding_window"
+}
+cfg["rate_limiter"] = limiter_map[st.selectbox("Ограничитель", list(limiter_map.keys()))]
+if cfg["rate_limiter"] == "sliding_window":
+    cfg["rate_limit_window"] = st.number_input("Длина окна (сек)", value=1.0, min_value=0.001)
+else:
+    burst = st.number_input("Емкость ведра (запросов, 0 - две секунды нагрузки)", value=0.0, min_value=0.0)
+    cfg["rate_limit_burst"] = burst if burst >= 1 else None
+mode_map = {"Отклонять": "police", "Задерживать (формирование трафика)": "shape"}
+cfg["rate_limit_mode"] = mode_map[st.selectbox("Запрос без токена", list(mode_map.keys()))]
+if cfg["rate_limit_mode"] == "shape":
+    cfg["rate_limit_max_delay"] = st.number_input("Наибольшая задержка (сек)", value=1.0, min_value=0.0)
+
 # Эксперимент по rate_limit
 st.subheader("Диапазон максимальной скорости")
 r_min = st.number_input("Минимальная скорость (запросы/сек)", value=1.0, min_value=0.1)
@@ -69,6 +88,42 @@ r_max = st.number_input("Максимальная скорость (апросы
 r_step = st.number_input("Шаг скорости (апросы/сек)", value=5.0, min_value=0.1)
 replicas = st.number_input("Реплик на точку", value=10, min_value=1)
 seed0 = st.number_input("Начальный seed", value=1000, min_value=0)
+workers = st.number_input("Число параллельных процессов", value=sweep.default_workers(), min_value=1)
+use_cache = st.checkbox("Использовать кэш результатов", value=True)
+
+# Один длинный прогон на точку вместо реплик: переходный участок платится один раз
+mode_map = {
+    "Независимые реплики": "replicas",
+    "Один длинный прогон (MSER-5 и групповые средние)": "steady"
+}
+mode_display = st.selectbox("Метод оценки", list(mode_map.keys()))
+steady_mode = mode_map[mode_display] == "steady"
+if steady_mode:
+    steady_time = st.number_input("Длительность длинного прогона (сек)", value=20000.0, min_value=10.0)
+    steady_windows = st.number_input("Число окон прогона", value=1000, min_value=20)
+    steady_batches = st.number_input("Число групп для групповых средних", value=20, min_value=2)
+
+adaptive = st.checkbox("Адаптивное число реплик (до заданной точности)", value=False, disabled=steady_mode) and not steady_mode
+if adaptive:
+    metric_map = {
+        "Среднее время отклика": "mean_response",
+        "Доля отклоненных": "drop_rate",
+        "Загруженность серверов": "utilization"
+    }
+    metrics_display = st.multiselect("Метрики, по которым контролируется точность", list(metric_map.keys()), default=list(metric_map.keys()))
+    rel_precision = st.number_input("Относительная точность (полуширина ДИ / среднее)", value=0.05, min_value=0.0)
+    abs_precision = st.number_input("Абсолютная точность (полуширина ДИ, 0 - не использовать)", value=0.0, min_value=0.0)
+    min_reps = st.number_input("Минимум реплик на точку", value=5, min_value=2)
+    max_reps = st.number_input("Максимум реплик на точку", value=50, min_value=2)
+
+vr_map = {
+    "Нет": (False, False),
+    "Антитетические пары": (True, False),
+    "Управляющие переменные": (False, True),
+    "Антитетические пары и управляющие переменные": (True, True)
+}
+vr_display = st.selectbox("Снижение дисперсии", list(vr_map.keys()), disabled=steady_mode)
+antithetic, controls = vr_map[vr_display] if not steady_mode else (False, False)
 
 run_btn = st.button("Запустить эксперимент")
 
@@ -76,34 +131,69 @@ if run_btn:
     st.info("Запускаю эксперимент — это может занять время")
     rate_limits = np.arange(r_min, r_max + r_step, r_step)
     results = []
-    all_resp = {r: [] for r in rate_limits}    
-    all_util = {r: [] for r in rate_limits}     
-    all_drops = {r: [] for r in rate_limits}  
+    all_resp = {r: {} for r in rate_limits}
+    all_util = {r: {} for r in rate_limits}
+    all_drops = {r: {} for r in rate_limits}
+    all_p99 = {r: {} for r in rate_limits}
+    all_res = {r: {} for r in rate_limits}
     progress = st.progress(0)
-    total_runs = len(rate_limits) * replicas
     run_count = 0
+    cache = exper_cache.default_cache() if use_cache else None
 
-    for r_lim in rate_limits:
-        means = []
-        drops = []
-        utils = []
-        for rep in range(replicas):
-            cfg.update({
-                "rate_limit_rps": float(r_lim),
-                "seed": int(seed0 + rep + int(r_lim*1000)),
-            })
-            res = mdl.model_env(cfg)
-            means.append(res["avg_response_time"])
-            drops.append(res["dropped"] / max(1, res["total_arrivals"]))
-            utils.append(res["utilization"])
-
-            all_resp[r_lim].append(res["avg_response_time"])
-            all_util[r_lim].append(res["utilization"])
-            all_drops[r_lim].append(res["dropped"] / max(1, res["total_arrivals"]))
+    def make_cfg(r_lim, rep):
+        return sweep.replica_cfg({**cfg, "rate_limit_rps": float(r_lim)}, rep, lambda k: int(seed0 + k + int(r_lim*1000)), antithetic)
 
+    # Реплики считаются параллельно, результаты приходят в порядке завершения
+    steady_res = {}
+    if steady_mode:
+        # Групповые средние длинного прогона играют роль реплик в таблицах и графиках
+        total_runs = len(rate_limits)
+        steady_runs = exper_steady.run_steady(rate_limits, lambda p: {**make_cfg(p, 0), "sim_time": steady_time},
+                                              windows=steady_windows, batches=steady_batches,
+                                              workers=workers, cache=cache)
+        for p, est in steady_runs:
+            steady_res[p] = est
+            for d, metric in ((all_resp, "mean_response"), (all_util, "utilization"), (all_drops, "drop_rate")):
+                d[p] = dict(enumerate(est["estimates"][metric]["batch_means"]))
+            all_p99[p] = {0: float("nan")}
             run_count += 1
-            progress.progress(run_count / total_runs)
-        
+            progress.progress(min(1.0, run_count / total_runs))
+        runs = []
+    elif adaptive:
+        # Число реплик заранее неизвестно, прогресс считается от максимума
+        total_runs = len(rate_limits) * int(max_reps)
+        runs = sweep.run_adaptive(rate_limits, make_cfg,
+                                  metrics=[metric_map[m] for m in metrics_display],
+                                  rel_precision=rel_precision or None,
+                                  abs_precision=abs_precision or None,
+                                  min_reps=min_reps, max_reps=max_reps,
+                                  workers=workers, cache=cache)
+    else:
+        total_runs = len(rate_limits) * replicas
+        jobs = [((r_lim, rep), make_cfg(r_lim, rep)) for r_lim in rate_limits for rep in range(replicas)]
+        runs = sweep.run_sweep(jobs, workers=workers, cache=cache)
+
+    for (r_lim, rep), res in runs:
+        all_resp[r_lim][rep] = res["avg_response_time"]
+        all_util[r_lim][rep] = res["utilization"]
+        all_drops[r_lim][rep] = res["dropped"] / max(1, res["total_arrivals"])
+        all_p99[r_lim][rep] = res["response_quantiles"]["p99"]
+        all_res[r_lim][rep] = res
+
+        run_count += 1
+        progress.progress(min(1.0, run_count / total_runs))
+    progress.progress(1.0)
+
+    # Значения реплик по порядку номеров
+    for d in (all_resp, all_util, all_drops, all_p99, all_res):
+        for r_lim in rate_limits:
+            d[r_lim] = [d[r_lim][k] for k in sorted(d[r_lim])]
+
+    for r_lim in rate_limits:
+        means = all_resp[r_lim]
+        drops = all_drops[r_lim]
+        utils = all_util[r_lim]
+
         arr = np.array(means)
         mean = float(np.mean(arr))
         std = float(np.std(arr, ddof=1)) if len(arr) > 1 else 0.0
@@ -124,14 +214,38 @@ if run_btn:
 
         results.append({
             "rate_limit_rps": r_lim,
+            "replicas": len(means),
             "mean_response": mean,
             "ci95": ci95,
+            "mean_p99": float(np.mean(all_p99[r_lim])),
             "mean_drop_rate": mean_drops,
             "ci95_drop_rate": ci95_drops,
             "mean_utilization": mean_util,
             "ci95_utilization": ci95_util
         })
 
+        # Оценки со снижением дисперсии рядом с обычными
+        if antithetic or controls:
+            for metric, col in (("mean_response", "mean_response"), ("drop_rate", "mean_drop_rate"), ("utilization", "mean_utilization")):
+                adj_mean, adj_ci = sweep.reduced_estimate(all_res[r_lim], metric, make_cfg(r_lim, 0), antithetic, controls)
+                results[-1][col + "_adj"] = adj_mean
+                results[-1][col + "_ci95_adj"] = adj_ci
+
+        # Стационарные оценки: отношения сумм после отбрасывания разгона и ДИ групповых средних
+        if steady_mode:
+            est = steady_res[r_lim]["estimates"]
+            results[-1].update({
+                "mean_response": est["mean_response"]["mean"],
+                "ci95": est["mean_response"]["ci"],
+                "mean_drop_rate": est["drop_rate"]["mean"],
+                "ci95_drop_rate": est["drop_rate"]["ci"],
+                "mean_utilization": est["utilization"]["mean"],
+                "ci95_utilization": est["utilization"]["ci"],
+                "warmup_time": steady_res[r_lim]["warmup_time"],
+                "warmup_at_limit": steady_res[r_lim]["warmup_at_limit"],
+                "lag1_response": est["mean_response"]["lag1"],
+            })
+
     df = pd.DataFrame(results)
     
     st.header("Результаты эксперимента")
@@ -199,11 +313,28 @@ if run_btn:
     ax3.yaxis.set_major_formatter(mtick.PercentFormatter())
     st.pyplot(fig3)
 
+    if antithetic or controls:
+        st.subheader("Оценки со снижением дисперсии")
+        st.dataframe(df[['rate_limit_rps', 'mean_response', 'ci95', 'mean_response_adj', 'mean_response_ci95_adj',
+                         'mean_drop_rate', 'ci95_drop_rate', 'mean_drop_rate_adj', 'mean_drop_rate_ci95_adj',
+                         'mean_utilization', 'ci95_utilization', 'mean_utilization_adj', 'mean_utilization_ci95_adj']])
+
+    if steady_mode:
+        st.subheader("Стационарные оценки по длинному прогону")
+        if df["warmup_at_limit"].any():
+            st.warning("В части точек разгон занял половину прогона - увеличьте длительность длинного прогона")
+        st.dataframe(df[['rate_limit_rps', 'warmup_time', 'replicas', 'mean_response', 'ci95', 'lag1_response',
+                         'mean_drop_rate', 'ci95_drop_rate', 'mean_utilization', 'ci95_utilization']].rename(
+            columns={"warmup_time": "Отброшенный разгон (сек)", "replicas": "Групп",
+                     "lag1_response": "Автокорреляция групп (отклик)"}))
+
     st.subheader("Таблица с результатами")
-    st.dataframe(df[['rate_limit_rps', 'mean_response', 'mean_drop_rate', 'mean_utilization']].rename(
+    st.dataframe(df[['rate_limit_rps', 'replicas', 'mean_response', 'mean_p99', 'mean_drop_rate', 'mean_utilization']].rename(
         columns={
             "rate_limit_rps": "Максимальная скорость (запросы/сек)", 
+            "replicas": "Реплик",
             "mean_response": "Среднее время отклика (сек)", 
+            "mean_p99": "Время отклика p99 (сек)",
             "mean_drop_rate": "Доля отклоненных запросов", 
             "mean_utilization": "Средняя загруженность серверов"
         }))
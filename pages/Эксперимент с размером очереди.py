@@ -4,6 +4,10 @@ import matplotlib.pyplot as plt
 import matplotlib.ticker as mtick
 import numpy as np
 import exper_cloud as mdl
+import exper_sweep as sweep
+import exper_cache
+import exper_steady
+import exper_analytic
 from scipy.stats import f_oneway
 
 st.set_page_config(page_title="Эксперимент с размером очереди", layout="wide")
@@ -71,6 +75,54 @@ q_max = st.number_input("Максимальный размер очереди",
 q_step = st.number_input("Шаг размера очереди", value=5, min_value=1)
 replicas = st.number_input("Реплик на точку", value=10, min_value=1)
 seed0 = st.number_input("Начальный seed", value=1000, min_value=0)
+workers = st.number_input("Число параллельных процессов", value=sweep.default_workers(), min_value=1)
+use_cache = st.checkbox("Использовать кэш результатов", value=True)
+
+# Один длинный прогон на точку вместо реплик: переходный участок платится один раз
+mode_map = {
+    "Независимые реплики": "replicas",
+    "Один длинный прогон (MSER-5 и групповые средние)": "steady"
+}
+mode_display = st.selectbox("Метод оценки", list(mode_map.keys()))
+steady_mode = mode_map[mode_display] == "steady"
+if steady_mode:
+    steady_time = st.number_input("Длительность длинного прогона (сек)", value=20000.0, min_value=10.0)
+    steady_windows = st.number_input("Число окон прогона", value=1000, min_value=20)
+    steady_batches = st.number_input("Число групп для групповых средних", value=20, min_value=2)
+
+adaptive = st.checkbox("Адаптивное число реплик (до заданной точности)", value=False, disabled=steady_mode) and not steady_mode
+if adaptive:
+    metric_map = {
+        "Среднее время отклика": "mean_response",
+        "Доля отклоненных": "drop_rate",
+        "Загруженность серверов": "utilization"
+    }
+    metrics_display = st.multiselect("Метрики, по которым контролируется точность", list(metric_map.keys()), default=list(metric_map.keys()))
+    rel_precision = st.number_input("Относительная точность (полуширина ДИ / среднее)", value=0.05, min_value=0.0)
+    abs_precision = st.number_input("Абсолютная точность (полуширина ДИ, 0 - не использовать)", value=0.0, min_value=0.0)
+    min_reps = st.number_input("Минимум реплик на точку", value=5, min_value=2)
+    max_reps = st.number_input("Максимум реплик на точку", value=50, min_value=2)
+
+engine_map = {
+    "Событийная модель (SimPy)": "simpy",
+    "Векторизованная рекурсия Линдли (NumPy)": "numpy"
+}
+engine_display = st.selectbox("Движок моделирования", list(engine_map.keys()), disabled=steady_mode)
+engine = engine_map[engine_display]
+
+vr_map = {
+    "Нет": (False, False),
+    "Антитетические пары": (True, False),
+    "Управляющие переменные": (False, True),
+    "Антитетические пары и управляющие переменные": (True, True)
+}
+vr_display = st.selectbox("Снижение дисперсии", list(vr_map.keys()), disabled=steady_mode)
+antithetic, controls = vr_map[vr_display] if not steady_mode else (False, False)
+
+# При экспоненциальных распределениях модель M/M/c/K решается точно
+analytic_ok = exper_analytic.supported({**mdl.DEFAULTS, **cfg})
+show_analytic = st.checkbox("Показать аналитическую кривую (M/M/c/K)", value=analytic_ok, disabled=not analytic_ok,
+                            help="Доступна при экспоненциальных интервалах и временах обработки") and analytic_ok
 
 run_btn = st.button("Запустить эксперимент")
 
@@ -78,34 +130,69 @@ if run_btn:
     st.info("Запускаю эксперимент — это может занять время")
     queue_sizes = list(range(int(q_min), int(q_max) + 1, int(q_step)))
     results = []
-    all_resp = {q: [] for q in queue_sizes}    
-    all_util = {q: [] for q in queue_sizes}     
-    all_drops = {q: [] for q in queue_sizes}  
+    all_resp = {q: {} for q in queue_sizes}
+    all_util = {q: {} for q in queue_sizes}
+    all_drops = {q: {} for q in queue_sizes}
+    all_p99 = {q: {} for q in queue_sizes}
+    all_res = {q: {} for q in queue_sizes}
     progress = st.progress(0)
-    total_runs = len(queue_sizes) * replicas
     run_count = 0
+    cache = exper_cache.default_cache() if use_cache else None
 
-    for q in queue_sizes:
-        means = []
-        drops = []
-        utils = []
-        for r in range(replicas):
-            cfg.update({
-                "queue_size": int(q),
-                "seed": int(seed0 + r + q*1000),
-            })
-            res = mdl.model_env(cfg)
-            means.append(res["avg_response_time"])
-            drops.append(res["dropped"] / max(1, res["total_arrivals"]))
-            utils.append(res["utilization"])
-
-            all_resp[q].append(res["avg_response_time"])
-            all_util[q].append(res["utilization"])
-            all_drops[q].append(res["dropped"] / max(1, res["total_arrivals"]))
+    def make_cfg(q, r):
+        return sweep.replica_cfg({**cfg, "queue_size": int(q)}, r, lambda k: int(seed0 + k + q*1000), antithetic)
 
+    # Реплики считаются параллельно, результаты приходят в порядке завершения
+    steady_res = {}
+    if steady_mode:
+        # Групповые средние длинного прогона играют роль реплик в таблицах и графиках
+        total_runs = len(queue_sizes)
+        steady_runs = exper_steady.run_steady(queue_sizes, lambda p: {**make_cfg(p, 0), "sim_time": steady_time},
+                                              windows=steady_windows, batches=steady_batches,
+                                              workers=workers, cache=cache)
+        for p, est in steady_runs:
+            steady_res[p] = est
+            for d, metric in ((all_resp, "mean_response"), (all_util, "utilization"), (all_drops, "drop_rate")):
+                d[p] = dict(enumerate(est["estimates"][metric]["batch_means"]))
+            all_p99[p] = {0: float("nan")}
             run_count += 1
-            progress.progress(run_count / total_runs)
-        
+            progress.progress(min(1.0, run_count / total_runs))
+        runs = []
+    elif adaptive:
+        # Число реплик заранее неизвестно, прогресс считается от максимума
+        total_runs = len(queue_sizes) * int(max_reps)
+        runs = sweep.run_adaptive(queue_sizes, make_cfg,
+                                  metrics=[metric_map[m] for m in metrics_display],
+                                  rel_precision=rel_precision or None,
+                                  abs_precision=abs_precision or None,
+                                  min_reps=min_reps, max_reps=max_reps,
+                                  workers=workers, engine=engine, cache=cache)
+    else:
+        total_runs = len(queue_sizes) * replicas
+        jobs = [((q, r), make_cfg(q, r)) for q in queue_sizes for r in range(replicas)]
+        runs = sweep.run_sweep(jobs, workers=workers, engine=engine, cache=cache)
+
+    for (q, r), res in runs:
+        all_resp[q][r] = res["avg_response_time"]
+        all_util[q][r] = res["utilization"]
+        all_drops[q][r] = res["dropped"] / max(1, res["total_arrivals"])
+        all_p99[q][r] = res["response_quantiles"]["p99"]
+        all_res[q][r] = res
+
+        run_count += 1
+        progress.progress(min(1.0, run_count / total_runs))
+    progress.progress(1.0)
+
+    # Значения реплик по порядку номеров
+    for d in (all_resp, all_util, all_drops, all_p99, all_res):
+        for q in queue_sizes:
+            d[q] = [d[q][k] for k in sorted(d[q])]
+
+    for q in queue_sizes:
+        means = all_resp[q]
+        drops = all_drops[q]
+        utils = all_util[q]
+
         arr = np.array(means)
         mean = float(np.mean(arr))
         std = float(np.std(arr, ddof=1)) if len(arr) > 1 else 0.0
@@ -126,16 +213,47 @@ if run_btn:
 
         results.append({
             "queue_size": q,
+            "replicas": len(means),
             "mean_response": mean,
             "std_rep": std,
             "se": se,
             "ci95": ci95,
+            "mean_p99": float(np.mean(all_p99[q])),
             "mean_drop_rate": mean_drops,
             "ci95_drop_rate": ci95_drops,
             "mean_utilization": mean_util,
             "ci95_utilization": ci95_util
         })
 
+        # Стационарные значения M/M/c/K для сравнения с моделью
+        if show_analytic:
+            sol = exper_analytic.solve({**mdl.DEFAULTS, **cfg, "queue_size": int(q)})
+            results[-1]["analytic_response"] = sol["mean_response"]
+            results[-1]["analytic_drop_rate"] = sol["p_block"]
+            results[-1]["analytic_utilization"] = sol["utilization"]
+
+        # Оценки со снижением дисперсии рядом с обычными
+        if antithetic or controls:
+            for metric, col in (("mean_response", "mean_response"), ("drop_rate", "mean_drop_rate"), ("utilization", "mean_utilization")):
+                adj_mean, adj_ci = sweep.reduced_estimate(all_res[q], metric, make_cfg(q, 0), antithetic, controls)
+                results[-1][col + "_adj"] = adj_mean
+                results[-1][col + "_ci95_adj"] = adj_ci
+
+        # Стационарные оценки: отношения сумм после отбрасывания разгона и ДИ групповых средних
+        if steady_mode:
+            est = steady_res[q]["estimates"]
+            results[-1].update({
+                "mean_response": est["mean_response"]["mean"],
+                "ci95": est["mean_response"]["ci"],
+                "mean_drop_rate": est["drop_rate"]["mean"],
+                "ci95_drop_rate": est["drop_rate"]["ci"],
+                "mean_utilization": est["utilization"]["mean"],
+                "ci95_utilization": est["utilization"]["ci"],
+                "warmup_time": steady_res[q]["warmup_time"],
+                "warmup_at_limit": steady_res[q]["warmup_at_limit"],
+                "lag1_response": est["mean_response"]["lag1"],
+            })
+
     df = pd.DataFrame(results)
     
     st.header("Результаты эксперимента")
@@ -166,6 +284,8 @@ if run_btn:
     # График среднего времени отклика с 95% CI
     fig, ax = plt.subplots(figsize=(8,4))
     ax.plot(df["queue_size"], df["mean_response"], marker='o', label="Среднее время отклика")
+    if show_analytic:
+        ax.plot(df["queue_size"], df["analytic_response"], linestyle='--', color='black', label="M/M/c/K (аналитически)")
     ax.fill_between(df["queue_size"],
                     df["mean_response"] - df["ci95"],
                     df["mean_response"] + df["ci95"],
@@ -179,6 +299,8 @@ if run_btn:
     # График средней загрузки серверов
     fig2, ax2 = plt.subplots(figsize=(8,4))
     ax2.plot(df["queue_size"], df["mean_utilization"]*100, marker='o', color='orange', label="Средняя загруженность серверов")
+    if show_analytic:
+        ax2.plot(df["queue_size"], df["analytic_utilization"]*100, linestyle='--', color='black', label="M/M/c/K (аналитически)")
     ax2.fill_between(df["queue_size"],
                     (df["mean_utilization"] - df["ci95_utilization"])*100,
                     (df["mean_utilization"] + df["ci95_utilization"])*100,
@@ -193,6 +315,8 @@ if run_btn:
      # График доли отклоненных
     fig3, ax3 = plt.subplots(figsize=(8,4))
     ax3.plot(df["queue_size"], df["mean_drop_rate"]*100, marker='o', color='green', label="Доля отклоненных запросов")
+    if show_analytic:
+        ax3.plot(df["queue_size"], df["analytic_drop_rate"]*100, linestyle='--', color='black', label="M/M/c/K (аналитически)")
     ax3.fill_between(df["queue_size"],
                     (df["mean_drop_rate"] - df["ci95_drop_rate"])*100,
                     (df["mean_drop_rate"] + df["ci95_drop_rate"])*100,
@@ -204,8 +328,33 @@ if run_btn:
     ax3.yaxis.set_major_formatter(mtick.PercentFormatter())
     st.pyplot(fig3)
 
+    if antithetic or controls:
+        st.subheader("Оценки со снижением дисперсии")
+        st.dataframe(df[['queue_size', 'mean_response', 'ci95', 'mean_response_adj', 'mean_response_ci95_adj',
+                         'mean_drop_rate', 'ci95_drop_rate', 'mean_drop_rate_adj', 'mean_drop_rate_ci95_adj',
+                         'mean_utilization', 'ci95_utilization', 'mean_utilization_adj', 'mean_utilization_ci95_adj']])
+
+    if steady_mode:
+        st.subheader("Стационарные оценки по длинному прогону")
+        if df["warmup_at_limit"].any():
+            st.warning("В части точек разгон занял половину прогона - увеличьте длительность длинного прогона")
+        st.dataframe(df[['queue_size', 'warmup_time', 'replicas', 'mean_response', 'ci95', 'lag1_response',
+                         'mean_drop_rate', 'ci95_drop_rate', 'mean_utilization', 'ci95_utilization']].rename(
+            columns={"warmup_time": "Отброшенный разгон (сек)", "replicas": "Групп",
+                     "lag1_response": "Автокорреляция групп (отклик)"}))
+
+    if show_analytic:
+        # Встроенная проверка модели: стационарное значение должно попадать в ДИ
+        # (при коротком прогоне модель, начинающая с пустой системы, занижает очередь)
+        st.subheader("Сравнение с аналитической моделью")
+        df_check = df[['queue_size', 'mean_response', 'ci95', 'analytic_response']].copy()
+        df_check["within_ci"] = (df_check["mean_response"] - df_check["analytic_response"]).abs() <= df_check["ci95"]
+        st.dataframe(df_check.rename(columns={"queue_size": "Размер очереди", "mean_response": "Модель (сек)",
+                                              "ci95": "Полуширина ДИ", "analytic_response": "M/M/c/K (сек)",
+                                              "within_ci": "В пределах ДИ"}))
+
     st.subheader("Таблица с результатами")
-    st.dataframe(df[['queue_size', 'mean_response', 'mean_drop_rate', 'mean_utilization']].rename(columns={"queue_size": "Размер очереди", "mean_response": "Среднее время отклика (сек)", "mean_drop_rate": "Доля отклоненных запросов", "mean_utilization": "Средняя загруженность серверов"}))
+    st.dataframe(df[['queue_size', 'replicas', 'mean_response', 'mean_p99', 'mean_drop_rate', 'mean_utilization']].rename(columns={"queue_size": "Размер очереди", "replicas": "Реплик", "mean_response": "Среднее время отклика (сек)", "mean_p99": "Время отклика p99 (сек)", "mean_drop_rate": "Доля отклоненных запросов", "mean_utilization": "Средняя загруженность серверов"}))
     st.download_button("Скачать результаты (CSV)", df.to_csv(index=False), file_name="exp1_queue_size_results.csv")
 
 
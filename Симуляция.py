@@ -2,7 +2,11 @@ import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
 import exper_cloud as mdl
+import exper_events as ev
+import exper_cache
+import exper_load
 import numpy as np
+import io
 
 st.set_page_config(page_title="Модель регулирования нагрузки", layout="wide")
 st.title("Модель регулирования нагрузки на облачное приложение")
@@ -13,7 +17,8 @@ st.subheader("Параметры стратегии")
 strategy_map = {
     "Постановка в очередь": "queue",
     "Отклонение": "reject",
-    "Ограничение скорости": "rate_limit"
+    "Ограничение скорости": "rate_limit",
+    "Автомасштабирование": "autoscale"
 }
 
 strategy_display = st.selectbox("Стратегия регулирования", list(strategy_map.keys()))
@@ -28,13 +33,84 @@ if strategy == "queue":
 elif strategy == "rate_limit":
     rate_limit_rps = st.number_input("Максимальная скорость (запросы/сек)", value=20.0)
     params["rate_limit_rps"] = rate_limit_rps
+    limiter_map = {
+        "Ведро токенов": "token_bucket",
+        "GCRA": "gcra",
+        "Дырявое ведро": "leaky_bucket",
+        "Скользящее окно": "sliding_window"
+    }
+    params["rate_limiter"] = limiter_map[st.selectbox("Ограничитель", list(limiter_map.keys()))]
+    if params["rate_limiter"] == "sliding_window":
+        params["rate_limit_window"] = st.number_input("Длина окна (сек)", value=1.0, min_value=0.001)
+    else:
+        burst = st.number_input("Емкость ведра (запросов, 0 - две секунды нагрузки)", value=0.0, min_value=0.0)
+        params["rate_limit_burst"] = burst if burst >= 1 else None
+    mode_map = {"Отклонять": "police", "Задерживать (формирование трафика)": "shape"}
+    params["rate_limit_mode"] = mode_map[st.selectbox("Запрос без токена", list(mode_map.keys()))]
+    if params["rate_limit_mode"] == "shape":
+        params["rate_limit_max_delay"] = st.number_input("Наибольшая задержка (сек)", value=1.0, min_value=0.0)
+elif strategy == "autoscale":
+    # Начальное число серверов задается ниже, в общих параметрах
+    queue_size = st.number_input("Размер очереди (-1 для неограниченной)", value=200)
+    params["queue_size"] = int(queue_size) if queue_size >= 0 else None
+    metric_map = {"Загруженность серверов": "utilization", "Средняя очередь на сервер": "queue"}
+    params["autoscale_metric"] = metric_map[st.selectbox("Сигнал масштабирования", list(metric_map.keys()))]
+    cols = st.columns(2)
+    params["autoscale_up"] = cols[0].number_input("Порог добавления серверов", value=0.8)
+    params["autoscale_down"] = cols[1].number_input("Порог удаления серверов", value=0.3)
+    params["autoscale_min"] = int(cols[0].number_input("Минимум серверов", value=1, min_value=1))
+    params["autoscale_max"] = int(cols[1].number_input("Максимум серверов", value=10, min_value=1))
+    params["autoscale_step"] = int(cols[0].number_input("Серверов за одно действие", value=1, min_value=1))
+    params["autoscale_interval"] = cols[1].number_input("Период оценки сигнала (сек)", value=5.0, min_value=0.1)
+    params["autoscale_delay"] = cols[0].number_input("Задержка запуска сервера (сек)", value=30.0, min_value=0.0)
+    params["autoscale_cooldown"] = cols[1].number_input("Пауза после масштабирования (сек)", value=60.0, min_value=0.0)
+
+# Таймауты и повторы клиента (моделируются только событийной моделью)
+st.subheader("Поведение клиента")
+client = st.checkbox("Таймауты и повторы клиента", value=False)
+if client:
+    cols = st.columns(2)
+    timeout_queue = cols[0].number_input("Таймаут ожидания в очереди (сек, 0 - нет)", value=0.0, min_value=0.0)
+    timeout_total = cols[1].number_input("Общий таймаут попытки (сек, 0 - нет)", value=1.0, min_value=0.0)
+    params["timeout_queue"] = timeout_queue or None
+    params["timeout_total"] = timeout_total or None
+    params["retries"] = int(cols[0].number_input("Число повторов", value=3, min_value=0))
+    jitter_map = {"Полный [0, d]": "full", "Половинный [d/2, d]": "equal", "Без разброса": "none"}
+    params["retry_jitter"] = jitter_map[cols[1].selectbox("Разброс задержки повтора", list(jitter_map.keys()))]
+    params["retry_backoff"] = cols[0].number_input("Задержка первого повтора (сек)", value=0.1, min_value=0.0)
+    params["retry_multiplier"] = cols[1].number_input("Множитель задержки", value=2.0, min_value=1.0)
+    params["retry_backoff_max"] = cols[0].number_input("Наибольшая задержка (сек)", value=10.0, min_value=0.0)
+    retry_budget = cols[1].number_input("Бюджет повторов на исходный запрос (0 - без бюджета)", value=0.0,
+                                        min_value=0.0, help="Например, 0.1 - не больше 10% повторов")
+    params["retry_budget"] = retry_budget or None
 
 # Общие параметры моделирования
 st.subheader("Общие параметры моделирования")
 sim_time = st.number_input("Время моделирования (сек)", value=60.0, min_value=1.0)
 num_servers = st.slider("Количество параллельных серверов", 1, 10, 2)
-monitor_interval = st.number_input("Интервал мониторинга (сек)", value=0.5)
+monitor_interval = st.number_input("Шаг временных рядов (сек)", value=0.5)
 seed = st.number_input("Seed для генератора случайных чисел", value=1234)
+use_cache = st.checkbox("Использовать кэш результатов", value=True)
+event_log = st.checkbox("Вести журнал событий", value=True)
+event_log_every = st.number_input("Журналировать каждый N-й запрос", value=1, min_value=1, disabled=not event_log)
+plot_bins = st.number_input("Разрешение графиков (интервалов по времени)", value=600, min_value=10, max_value=5000,
+                            help="Графики строятся по сводкам модели, а не по журналу событий")
+
+engine = "simpy"
+if strategy in mdl.exper_numpy.SUPPORTED_STRATEGIES and not client:
+    engine_map = {
+        "Событийная модель (SimPy)": "simpy",
+        "Векторизованная рекурсия Линдли (NumPy)": "numpy",
+        "Аналитическая модель (M/M/c, Эрланг)": "analytic"
+    }
+    engine_display = st.selectbox("Движок моделирования", list(engine_map.keys()))
+    engine = engine_map[engine_display]
+
+# Потоковый режим доступен только событийной модели
+stream = False
+if engine == "simpy":
+    stream = st.checkbox("Потоковый режим (графики обновляются по ходу моделирования)", value=False)
+    stream_window = st.number_input("Длина окна (сек)", value=60.0, min_value=0.1, disabled=not stream)
 
 # Распределение входящей нагрузки
 st.subheader("Входящая нагрузка")
@@ -43,7 +119,9 @@ arrival_map = {
     "Экспоненциальное": "exponential",
     "Постоянное": "deterministic",
     "Равномерное": "uniform",
-    "Пуассоновское (всплески)": "poisson_burst"
+    "Пуассоновское (всплески)": "poisson_burst",
+    "Трасса из журнала (CSV/Parquet/NPY)": "trace",
+    "Профиль нагрузки (суточный цикл, наплыв)": "profile"
 }
 arrival_display = st.selectbox("Распределение входящей нагрузки", list(arrival_map.keys()))
 arrival_dist = arrival_map[arrival_display] 
@@ -60,6 +138,52 @@ elif arrival_dist == "uniform":
 
     params["arrival_low"] = arrival_low
     params["arrival_high"] = arrival_high
+elif arrival_dist == "trace":
+    # Журнал читается порциями, поэтому подходит и для очень больших файлов
+    params["trace_path"] = st.text_input("Путь к журналу запросов", value="")
+    params["trace_time_column"] = st.text_input("Столбец моментов поступления", value="timestamp")
+    trace_service_column = st.text_input("Столбец времен обработки (пусто - по распределению)", value="")
+    params["trace_service_column"] = trace_service_column or None
+    params["trace_offset"] = st.number_input("Сдвиг окна от начала журнала (сек)", value=0.0, min_value=0.0)
+    params["trace_rate_scale"] = st.number_input("Множитель интенсивности", value=1.0, min_value=0.01)
+elif arrival_dist == "profile":
+    # Интенсивность меняется во времени (exper_load)
+    profile_map = {
+        "Ломаная по точкам": "piecewise",
+        "Сплайн по точкам": "spline",
+        "Линейный рост": "ramp",
+        "Ступень": "step",
+        "Синусоида (суточный цикл)": "sinusoidal",
+        "Наплыв (flash crowd)": "flash_crowd"
+    }
+    load_profile = profile_map[st.selectbox("Профиль нагрузки", list(profile_map.keys()))]
+    params["load_profile"] = load_profile
+    if load_profile in ("piecewise", "spline"):
+        points = st.data_editor(pd.DataFrame({"Время (сек)": [0.0, 20.0, 40.0, 60.0],
+                                              "Запросов в секунду": [5.0, 30.0, 10.0, 5.0]}),
+                                num_rows="dynamic")
+        load_path = st.text_input("Или путь к CSV профиля (столбцы time, rate)", value="")
+        params["load_points"] = points.dropna().to_numpy().tolist()
+        params["load_path"] = load_path or None
+        params["load_time_scale"] = st.number_input("Сжатие времени профиля (раз)", value=1.0, min_value=1e-6)
+        params["load_rate_scale"] = st.number_input("Множитель интенсивности", value=1.0, min_value=0.0)
+    else:
+        params["arrival_rate"] = st.number_input("Базовое количество запросов в секунду", value=10.0, min_value=0.0)
+        if load_profile == "sinusoidal":
+            params["load_amplitude"] = st.number_input("Амплитуда (запросов в секунду)", value=5.0)
+        else:
+            params["load_peak_rate"] = st.number_input("Количество запросов в секунду на пике", value=40.0, min_value=0.0)
+        params["load_start"] = st.number_input("Начало изменения нагрузки (сек)", value=10.0, min_value=0.0)
+        if load_profile in ("ramp", "step", "flash_crowd"):
+            params["load_duration"] = st.number_input("Длительность роста, ступени или пика (сек)", value=10.0, min_value=0.0)
+        if load_profile == "flash_crowd":
+            params["load_rise"] = st.number_input("Время нарастания (сек)", value=2.0, min_value=0.0)
+            params["load_decay"] = st.number_input("Постоянная спада (сек)", value=5.0, min_value=0.01)
+    period = st.number_input("Период повторения профиля (сек, 0 - без повторения)", value=30.0 if load_profile == "sinusoidal" else 0.0,
+                             min_value=0.0)
+    params["load_period"] = period or None
+    sampling_map = {"Прореживание": "thinning", "Обращение накопленной интенсивности": "inversion"}
+    params["load_sampling"] = sampling_map[st.selectbox("Способ генерации", list(sampling_map.keys()))]
 else:
     burst_size = st.number_input("Размер всплеска (количество запросов)", value=20, min_value=1)
     interburst_interval = st.number_input("Интервал между всплесками (сек)", value=5.0, min_value=0.1)
@@ -93,14 +217,82 @@ if st.button("Запустить симуляцию"):
         "num_servers": num_servers,
         "monitor_interval": monitor_interval,
         "seed": int(seed),
+        "event_log": event_log,
+        "event_log_every": int(event_log_every),
+        "plot_bins": int(plot_bins),
         "arrival_dist": arrival_dist,
         "service_dist": service_dist,
         "service_mean": service_mean
     })
 
+    if arrival_dist == "trace" and not params["trace_path"]:
+        st.error("Укажите путь к журналу запросов")
+        st.stop()
+    if arrival_dist == "profile":
+        try:
+            exper_load.make_profile({**mdl.DEFAULTS, **params})
+        except (ValueError, OSError, KeyError) as e:
+            st.error(f"Ошибка в профиле нагрузки: {e}")
+            st.stop()
+
+    # Потоковый режим: сводки по окнам, память не растет с временем моделирования
+    if stream:
+        st.header("Результаты по окнам")
+        progress = st.progress(0.0)
+        totals_box = st.empty()
+        st.subheader("Запросы за окно")
+        counts_chart = st.empty()
+        st.subheader("Время отклика в окне (сек)")
+        latency_chart = st.empty()
+        st.subheader("Очередь и загруженность в окне")
+        queue_chart = st.empty()
+
+        rows = []
+        for w in mdl.iter_model_env({**params, "event_log": False}, window=stream_window):
+            rows.append({
+                "Время (сек)": w["end"],
+                "Пришло": w["arrivals"],
+                "Обработано": w["processed"],
+                "Отклонено": w["dropped"],
+                "Успешно": w["goodput"] * (w["end"] - w["start"]),
+                "Повторов": w["retries"],
+                **w["response_quantiles"],
+                "Средняя длина очереди": w["mean_queue_len"],
+                "Максимальная длина очереди": w["max_queue_len"],
+                "Загруженность": w["utilization"],
+            })
+            df_w = pd.DataFrame(rows).set_index("Время (сек)")
+            progress.progress(min(1.0, w["end"] / sim_time))
+            totals_box.write(f"Модельное время {w['end']:.0f} из {sim_time:.0f} сек: "
+                             f"пришло {w['total_arrivals']}, обработано {w['total_processed']}, "
+                             f"отклонено {w['total_dropped']}")
+            counts_chart.line_chart(df_w[["Пришло", "Обработано", "Отклонено", "Успешно", "Повторов"]])
+            latency_chart.line_chart(df_w[list(w["response_quantiles"])])
+            queue_chart.line_chart(df_w[["Средняя длина очереди", "Максимальная длина очереди", "Загруженность"]])
+
+        st.download_button("Скачать сводки по окнам (CSV)", df_w.to_csv(), file_name="windows.csv")
+        st.sidebar.subheader("Использованная конфигурация")
+        st.sidebar.json({**mdl.DEFAULTS, **params})
+        st.stop()
+
+    if engine == "analytic" and not mdl.exper_analytic.supported({**mdl.DEFAULTS, **params}):
+        st.error("Аналитическая модель требует экспоненциальных интервалов и времен обработки")
+        st.stop()
+
     # Запуск модели
     with st.spinner("Запуск модели..."):
-        res = mdl.model_env(params)
+        if use_cache:
+            res = exper_cache.cached_model_env(params, engine=engine)
+        else:
+            res = mdl.model_env(params, engine=engine)
+    # Результат сохраняется в сессии: листание журнала перезапускает страницу без нового прогона
+    st.session_state["sim_result"] = res
+    st.session_state["event_page"] = 1
+    st.session_state.pop("events_parquet", None)
+
+if "sim_result" in st.session_state:
+    res = st.session_state["sim_result"]
+    cfg = res["config"]
 
     st.header("Результаты")
     # Итоговые метрики
@@ -109,7 +301,24 @@ if st.button("Запустить симуляцию"):
     st.metric("Обработано", res["processed"])
     st.metric("Отклонено", res["dropped"])
     st.metric("Среднее время отклика (сек)", round(res["avg_response_time"], 6))
+    q = res["response_quantiles"]
+    st.metric("Время отклика p50 / p90 / p99 (сек)", f"{q['p50']:.4f} / {q['p90']:.4f} / {q['p99']:.4f}")
     st.metric("Загруженность серверов", f"{round(res['utilization']*100,2)}%")
+    # Аналитическая модель не дает максимумов
+    max_q = "-" if res["max_queue_len"] is None else res["max_queue_len"]
+    max_b = "-" if res["max_busy_servers"] is None else res["max_busy_servers"]
+    st.metric("Средняя / максимальная длина очереди", f"{res['mean_queue_len']:.3f} / {max_q}")
+    st.metric("Среднее / максимальное число занятых серверов", f"{res['mean_busy_servers']:.3f} / {max_b}")
+    st.metric("Среднее число серверов / стоимость (сервер-секунды)",
+              f"{res['mean_servers']:.2f} / {res['server_seconds']:.0f}")
+    st.metric("Полезная / полная пропускная способность (запросы/сек)",
+              f"{res['goodput']:.2f} / {res['throughput']:.2f}")
+    st.metric("Исходных запросов / неуспешных / таймаутов / повторов",
+              f"{res['requests']:.0f} / {res['failed']:.0f} / {res['timeouts']} / {res['retries']}")
+    st.metric("Попыток на исходный запрос", f"{res['retry_amplification']:.3f}")
+    if res.get("shaped"):
+        st.metric("Задержано ограничителем / среднее ожидание токена (сек)",
+                  f"{res['shaped']} / {res['avg_shaping_delay']:.4f}")
 
     # Скачать результаты
     st.subheader("Скачать результаты")
@@ -118,113 +327,143 @@ if st.button("Запустить симуляцию"):
         "processed": res["processed"],
         "dropped": res["dropped"],
         "avg_response": res["avg_response_time"],
+        "std_response": res["response_std"],
+        **{f"{k}_response": v for k, v in res["response_quantiles"].items()},
         "utilization": res["utilization"],
+        "mean_queue_len": res["mean_queue_len"],
+        "max_queue_len": res["max_queue_len"],
+        "mean_busy_servers": res["mean_busy_servers"],
+        "mean_servers": res["mean_servers"],
+        "server_seconds": res["server_seconds"],
+        **{k: res[k] for k in ("requests", "succeeded", "failed", "timeouts", "retries", "goodput", "throughput",
+                               "retry_amplification")},
     }])
     st.download_button("Скачать метрики (CSV)", df_metrics.to_csv(index=False), file_name="metrics.csv")
 
-    # Графики приходящих и обрабатываемых запросов
-    st.subheader("Динамика приходящих и обрабатываемых запросов по времени")
+    # Графики строятся по сводкам модели: число точек задается разрешением,
+    # а не числом событий
+    agg = res.get("aggregates")
+    if agg:
+        edges = np.array(agg["edges"])
+        centers = (edges[:-1] + edges[1:]) / 2
+        width = edges[1] - edges[0]
+        counts = agg["counts"]
+        dropped_counts = np.sum([counts[ev.EVENT_NAMES[c]] for c in ev.DROP_CODES], axis=0)
 
-    if res["events"]:
-        df_ev = pd.DataFrame(res["events"], columns=["time", "event", "id"])
-        
-        # Фильтруем события
-        arrivals_times = df_ev[df_ev["event"]=="ARRIVAL"]["time"].values
-        ended_times    = df_ev[df_ev["event"]=="SERVICE_END"]["time"].values
-        dropped_times  = df_ev[df_ev["event"].isin(["DROPPED_QUEUE_FULL","DROPPED_RATE","DROPPED_RATE_TIMEOUT", "DROPPED_REJECT"])]["time"].values
-        
-        # Настройка интервалов
-        bin_width = 1.0 
-        t_min = 0.0
-        t_max = max(np.max(arrivals_times, initial=0),
-                    np.max(ended_times, initial=0),
-                    np.max(dropped_times, initial=0),
-                    res["config"]["sim_time"])
-        
-        bin_edges = np.arange(t_min, t_max + bin_width, bin_width)
-        bin_centers = (bin_edges[:-1] + bin_edges[1:]) / 2
-
-        # Считаем количество событий в каждом интервале
-        arrivals_counts, _ = np.histogram(arrivals_times, bins=bin_edges)
-        ended_counts, _    = np.histogram(ended_times, bins=bin_edges)
-        dropped_counts, _  = np.histogram(dropped_times, bins=bin_edges)
-
-        # Рисуем линии
+    st.subheader("Динамика приходящих и обрабатываемых запросов по времени")
+    if agg:
         fig4, ax4 = plt.subplots(figsize=(8,3))
-        ax4.plot(bin_centers, arrivals_counts, label="Пришло запросов")
-        ax4.plot(bin_centers, ended_counts, label="Обработано")
-        ax4.plot(bin_centers, dropped_counts, label="Отклонено")
+        ax4.plot(centers, np.array(counts["ARRIVAL"]) / width, label="Пришло запросов")
+        if cfg["arrival_dist"] == "profile":
+            ax4.plot(centers, exper_load.make_profile(cfg).rate(centers), color="black", linestyle="--",
+                     label="Заданная интенсивность")
+        ax4.plot(centers, np.array(counts["SERVICE_END"]) / width, label="Обработано")
+        ax4.plot(centers, dropped_counts / width, label="Отклонено")
+        # Таймауты и повторы клиента: при «шторме повторов» растут вместе с поступлением
+        if res["timeouts"] or res["retries"]:
+            ax4.plot(centers, np.array(counts["TIMEOUT"]) / width, label="Таймауты клиента")
+            ax4.plot(centers, np.array(counts["RETRY"]) / width, label="Повторы")
         ax4.set_xlabel("Время (сек)")
-        ax4.set_ylabel("Количество запросов")
+        ax4.set_ylabel("Запросов в секунду")
         ax4.legend()
         st.pyplot(fig4)
     else:
-        st.write("Нет событий для построения графика.")
-
+        st.write("Нет данных для построения графика.")
 
     st.subheader("Общее количество пришедших и обработанных запросов по времени")
-
-    if res["events"]:
-        df_ev = pd.DataFrame(res["events"], columns=["time", "event", "id"])
-        
-        arrivals = df_ev[df_ev["event"]=="ARRIVAL"].groupby("time").size().cumsum()
-        ended = df_ev[df_ev["event"]=="SERVICE_END"].groupby("time").size().cumsum()
-        dropped = df_ev[df_ev["event"].isin(["DROPPED_QUEUE_FULL","DROPPED_RATE","DROPPED_RATE_TIMEOUT", "DROPPED_REJECT"])].groupby("time").size().cumsum()
-        
+    if agg:
+        cumulative = agg["cumulative"]
         fig3, ax3 = plt.subplots(figsize=(8,3))
-        ax3.step(arrivals.index, arrivals.values, where='post', label="Пришло запросов")
-        ax3.step(ended.index, ended.values, where='post', label="Обработано")
-        ax3.step(dropped.index, dropped.values, where='post', label="Отклонено")
+        ax3.plot(edges[1:], cumulative["arrivals"], label="Пришло запросов")
+        ax3.plot(edges[1:], cumulative["processed"], label="Обработано")
+        ax3.plot(edges[1:], cumulative["dropped"], label="Отклонено")
         ax3.set_xlabel("Время (с)")
         ax3.set_ylabel("Количество запросов")
         ax3.legend()
         st.pyplot(fig3)
     else:
-        st.write("Нет событий для построения графика.")
+        st.write("Нет данных для построения графика.")
+
+    # Среднее по интервалу и максимум (если модель его дает)
+    def level_chart(level, ylabel):
+        fig, ax = plt.subplots(figsize=(8,3))
+        ax.stairs(level["mean"], edges, label="Среднее за интервал")
+        if level["max"]:
+            ax.stairs(level["max"], edges, linestyle="--", label="Максимум за интервал")
+        ax.set_xlabel("Время (сек)")
+        ax.set_ylabel(ylabel)
+        ax.legend()
+        return fig
 
     st.subheader("Занятость серверов во времени")
-    if res["events"]:
-        df_srv = pd.DataFrame(res["server_busy_time_series"], columns=["time", "busy"]).set_index("time")
-        fig, ax5 = plt.subplots(figsize=(8,3))
-        ax5.step(df_srv.index, df_srv["busy"], where='post')
-        ax5.set_xlabel("Время (сек)")
-        ax5.set_ylabel("Количество занятых серверов")
-        ax5.set_ylim(0, params["num_servers"] + 0.5)
+    if agg and agg["busy"]["mean"]:
+        fig = level_chart(agg["busy"], "Количество занятых серверов")
+        top = cfg["autoscale_max"] if cfg["strategy"] == "autoscale" else cfg["num_servers"]
+        if cfg["strategy"] == "autoscale" and agg["servers"]["mean"]:
+            fig.axes[0].stairs(agg["servers"]["mean"], edges, color="black", label="Работающих серверов")
+            fig.axes[0].legend()
+        fig.axes[0].set_ylim(0, top + 0.5)
         st.pyplot(fig)
     else:
-        st.write("Нет событий для построения графика.")
+        st.write("Нет данных для построения графика (включите историю состояний).")
+
+    if cfg["strategy"] == "autoscale" and res["scaling_events"]:
+        st.subheader("Действия автомасштабирования")
+        actions = {"scale_out": "Запуск серверов", "ready": "Серверы готовы", "scale_in": "Вывод серверов"}
+        st.dataframe(pd.DataFrame([{"Время (сек)": t, "Действие": actions[a], "Серверов": n}
+                                   for t, a, n in res["scaling_events"]]))
 
-    # График размера очереди только для стратегии queue
-    if strategy == "queue" and res["queue_time_series"]:
+    # График размера очереди только для стратегий с очередью
+    if cfg["strategy"] in ("queue", "autoscale") and agg and agg["queue"]["mean"]:
         st.subheader("Динамика длины очереди")
-        df_q = pd.DataFrame(res["queue_time_series"], columns=["time", "qlen"]).set_index("time")
-        fig, ax = plt.subplots(figsize=(8,3))
-        ax.step(df_q.index, df_q["qlen"], where='post')
-        ax.set_xlabel("Время (сек)")
-        ax.set_ylabel("Длина очереди")
-        st.pyplot(fig)
-    elif strategy == "queue":
+        st.pyplot(level_chart(agg["queue"], "Длина очереди"))
+    elif cfg["strategy"] in ("queue", "autoscale"):
         st.write("Нет данных очереди.")
 
     # Гистограмма времени отклика
     st.subheader("Распределение времени отклика")
-    rts = res["response_times"]
-    if rts:
+    hist = res["response_hist"]
+    if res["processed"] and any(hist["counts"]):
+        # Потоковая гистограмма из модели, без хранения всех времен отклика
+        counts = np.array(hist["counts"])
+        edges = np.array(hist["edges"])
+        last = int(np.nonzero(counts)[0][-1]) + 1
         fig2, ax2 = plt.subplots(figsize=(6,3))
-        ax2.hist(rts, bins=min(50, max(5, int(len(rts)/5))))
+        ax2.stairs(counts[:last], edges[:last + 1], fill=True)
         ax2.set_xlabel("Время отклика (сек)")
         ax2.set_ylabel("Количество запросов")
         st.pyplot(fig2)
     else:
         st.write("Нет обработанных запросов - нет данных о времени отклика.")
 
-    # Журнал событий
+    # Журнал событий: таблица строится только для текущей страницы
     st.subheader("Журнал событий")
-    ev = res["events"]
-    if ev:
-        df_ev = pd.DataFrame(ev, columns=["time", "event", "id"]).sort_values("time")
+    events = res["events"]
+    if events:
+        cols = st.columns(3)
+        selected = cols[0].multiselect("Типы событий", list(ev.EVENT_NAMES), default=[])
+        codes = [ev.EVENT_CODES[name] for name in selected] or None
+        page_size = cols[1].selectbox("Событий на странице", [50, 100, 500, 1000], index=1)
+        total = events.count(codes)
+        pages = max(1, -(-total // page_size))
+        # Фильтр мог уменьшить число страниц: сохраненная страница не должна выйти за предел
+        st.session_state["event_page"] = min(st.session_state.get("event_page", 1), pages)
+        page = int(cols[2].number_input(f"Страница (из {pages})", min_value=1, max_value=pages, key="event_page"))
+        start = (page - 1) * page_size
+        st.write(f"События {start + 1 if total else 0}-{min(total, start + page_size)} из {total}")
+        df_ev = events.to_pandas(start, start + page_size, codes)
         df_ev = df_ev.rename(columns={"time": "Время (сек)", "event": "Событие", "id": "ID"})
         st.dataframe(df_ev)
+
+        # Весь журнал сериализуется только по запросу, а не при каждом листании
+        if "events_parquet" not in st.session_state:
+            if st.button("Подготовить журнал событий (Parquet)"):
+                buf = io.BytesIO()
+                events.to_parquet(buf)
+                st.session_state["events_parquet"] = buf.getvalue()
+        if "events_parquet" in st.session_state:
+            st.download_button("Скачать журнал событий (Parquet)", st.session_state["events_parquet"],
+                               file_name="events.parquet")
     else:
         st.write("Нет событий")
 